@@ -1,9 +1,12 @@
 from logging.config import fileConfig
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
 from alembic import context
 import asyncio
+import re
 
 from app.core.config import DATABASE_URL
+from app.db.migrations import MIGRATION_LOCK_KEY
 from app.db.base import Base
 from app.models import *  # Import all your models here
 
@@ -15,6 +18,16 @@ if config.config_file_name is not None:
 config.set_main_option("sqlalchemy.url", DATABASE_URL)
 target_metadata = Base.metadata
 
+# Секции subscriptions создает create_subscription_partitions во время работы, в моделях
+# их нет: без фильтра autogenerate и alembic check предлагали бы удалить их вместе с данными
+PARTITION_TABLE_RE = re.compile(r"subscriptions_(\d{4}_\d{2}|default)")
+
+
+def include_name(name, type_, parent_names) -> bool:
+    if type_ == "table":
+        return PARTITION_TABLE_RE.fullmatch(name) is None
+    return True
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
@@ -23,6 +36,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -33,6 +47,7 @@ def do_run_migrations(connection):
         connection=connection,
         target_metadata=target_metadata,
         compare_type=True,
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -40,16 +55,28 @@ def do_run_migrations(connection):
 
 async def run_async_migrations():
     url = config.get_main_option("sqlalchemy.url")
-    print("DATABASE_URL repr:", repr(DATABASE_URL), type(DATABASE_URL))
 
     connectable = create_async_engine(url, future=True)
 
     async with connectable.connect() as connection:
-        await connection.run_sync(do_run_migrations)
+        # Та же блокировка, что у приложения при старте: CLI и воркеры не мигрируют одновременно
+        await connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        await connection.commit()
+        try:
+            await connection.run_sync(do_run_migrations)
+        finally:
+            await connection.rollback()
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            await connection.commit()
 
 
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode."""
+    # Соединение передает приложение при старте (app.db.migrations), уже под advisory lock
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
     asyncio.run(run_async_migrations())
 
 if context.is_offline_mode():
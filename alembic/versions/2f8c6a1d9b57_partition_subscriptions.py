@@ -0,0 +1,345 @@
+"""partition subscriptions
+
+Revision ID: 2f8c6a1d9b57
+Revises: e91f3b6d2a48
+Create Date: 2026-10-18 21:42:05.118364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f8c6a1d9b57'
+down_revision: Union[str, Sequence[str], None] = 'e91f3b6d2a48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблица переписывается целиком в одной транзакции под ACCESS EXCLUSIVE:
+# на больших базах миграцию выполняют в окно обслуживания
+
+# Секций на месяцы вперед при миграции (дальше их создает app.core.partitions)
+MONTHS_AHEAD = 3
+# Более старые выдачи (ошибки ввода, древний импорт) остаются в секции по умолчанию
+HISTORY_YEARS = 10
+
+COLUMNS = "subscription_id, library_id, book_id, reader_id, issue_date, return_date, deposit, due_date, overdue_days, copy_id"
+
+PARTITIONED_TABLE_SQL = """
+    CREATE TABLE subscriptions (
+        subscription_id integer NOT NULL DEFAULT nextval('subscriptions_subscription_id_seq'::regclass),
+        library_id integer NOT NULL,
+        book_id integer NOT NULL,
+        reader_id integer NOT NULL,
+        issue_date date NOT NULL DEFAULT CURRENT_DATE,
+        return_date date,
+        deposit numeric(10, 2),
+        due_date date,
+        overdue_days integer NOT NULL DEFAULT 0,
+        copy_id integer
+    ) PARTITION BY RANGE (issue_date)
+"""
+
+PLAIN_TABLE_SQL = """
+    CREATE TABLE subscriptions (
+        subscription_id integer NOT NULL DEFAULT nextval('subscriptions_subscription_id_seq'::regclass),
+        library_id integer NOT NULL,
+        book_id integer NOT NULL,
+        reader_id integer NOT NULL,
+        issue_date date DEFAULT CURRENT_DATE,
+        return_date date,
+        deposit numeric(10, 2),
+        due_date date,
+        overdue_days integer NOT NULL DEFAULT 0,
+        copy_id integer
+    )
+"""
+
+# Помесячные секции subscriptions_YYYY_MM; месяц, строки которого уже лежат в секции
+# по умолчанию, пропускается (CREATE ... PARTITION OF для него завершился бы ошибкой)
+CREATE_PARTITIONS_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION create_subscription_partitions(from_month date, to_month date)
+    RETURNS integer AS $$
+    DECLARE
+        bound date := date_trunc('month', from_month)::date;
+        next_bound date;
+        partition_name text;
+        created integer := 0;
+    BEGIN
+        WHILE bound <= to_month LOOP
+            next_bound := (bound + interval '1 month')::date;
+            partition_name := 'subscriptions_' || to_char(bound, 'YYYY_MM');
+            IF to_regclass(partition_name) IS NULL THEN
+                IF EXISTS (
+                    SELECT 1 FROM subscriptions_default
+                    WHERE issue_date >= bound AND issue_date < next_bound
+                ) THEN
+                    RAISE WARNING 'Partition % skipped: subscriptions_default has rows for this month', partition_name;
+                ELSE
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF subscriptions FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, bound, next_bound
+                    );
+                    created := created + 1;
+                END IF;
+            END IF;
+            bound := next_bound;
+        END LOOP;
+        RETURN created;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+OPEN_SINCE_FUNCTIONS_SQL = [
+    # Точный минимум issue_date открытых выдач. SHARE дожидается незавершенных выдач
+    # и не пускает новые, пока считается минимум: граница не поднимется выше выдачи,
+    # которая еще не была видна
+    """
+    CREATE OR REPLACE FUNCTION refresh_subscriptions_open_since()
+    RETURNS date AS $$
+    DECLARE
+        since date;
+    BEGIN
+        LOCK TABLE subscriptions IN SHARE MODE;
+        SELECT COALESCE(min(issue_date), current_date) INTO since
+        FROM subscriptions
+        WHERE return_date IS NULL;
+        UPDATE subscriptions_open_since SET open_since = since;
+        RETURN since;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    # Выдача задним числом (импорт, отмена возврата) опускает границу; обычная выдача
+    # сегодняшним числом строку не блокирует — UPDATE не находит строк
+    """
+    CREATE OR REPLACE FUNCTION lower_subscriptions_open_since()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE subscriptions_open_since
+        SET open_since = NEW.issue_date
+        WHERE open_since > NEW.issue_date;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    # Перенос открытой выдачи в другую секцию выполняется как DELETE + INSERT,
+    # и триггеры экземпляров освободили бы и снова заняли ее экземпляр
+    """
+    CREATE OR REPLACE FUNCTION guard_subscription_issue_date()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF date_trunc('month', NEW.issue_date) IS DISTINCT FROM date_trunc('month', OLD.issue_date)
+           AND (OLD.return_date IS NULL OR NEW.return_date IS NULL) THEN
+            RAISE EXCEPTION 'Issue month of active subscription % cannot be changed', OLD.subscription_id
+                USING ERRCODE = 'LB002';
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    # Замена ON DELETE SET NULL внешнего ключа holds.subscription_id. Перенос возвращенной
+    # выдачи в другую секцию — тоже DELETE: ссылку сохраняем, если строка с тем же id осталась
+    """
+    CREATE OR REPLACE FUNCTION unlink_subscription_holds()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE holds
+        SET subscription_id = NULL
+        WHERE subscription_id = OLD.subscription_id
+          AND NOT EXISTS (SELECT 1 FROM subscriptions WHERE subscription_id = OLD.subscription_id);
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+]
+
+OPEN_SINCE_FUNCTIONS = [
+    "refresh_subscriptions_open_since", "lower_subscriptions_open_since",
+    "guard_subscription_issue_date", "unlink_subscription_holds",
+]
+
+# В триггерах, клонированных на секции, TG_TABLE_NAME — имя секции:
+# таблицу версии можно передать аргументом триггера
+VERSION_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION bump_table_version()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM nextval(('table_version_' || COALESCE(TG_ARGV[0], TG_TABLE_NAME))::regclass);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Триггеры subscriptions из прошлых миграций: пересоздаются на новой таблице
+# (функции переживают DROP TABLE)
+SUBSCRIPTION_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER trg_set_due_date
+    BEFORE INSERT ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION set_due_date();
+    """,
+    """
+    CREATE TRIGGER trg_claim_book_copy
+    BEFORE INSERT ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION claim_book_copy();
+    """,
+    """
+    CREATE TRIGGER trg_return_book_copy
+    BEFORE UPDATE OF return_date ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION return_book_copy();
+    """,
+    """
+    CREATE TRIGGER trg_release_book_copy
+    AFTER DELETE ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION release_book_copy();
+    """,
+    """
+    CREATE CONSTRAINT TRIGGER trg_version_subscriptions
+    AFTER INSERT OR UPDATE OR DELETE ON subscriptions
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_table_version('subscriptions');
+    """,
+]
+
+PARTITION_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER trg_subscriptions_open_since
+    BEFORE INSERT OR UPDATE OF return_date, issue_date ON subscriptions
+    FOR EACH ROW
+    WHEN (NEW.return_date IS NULL)
+    EXECUTE FUNCTION lower_subscriptions_open_since();
+    """,
+    """
+    CREATE TRIGGER trg_guard_issue_date
+    BEFORE UPDATE OF issue_date ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION guard_subscription_issue_date();
+    """,
+    """
+    CREATE TRIGGER trg_unlink_subscription_holds
+    AFTER DELETE ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION unlink_subscription_holds();
+    """,
+]
+
+ACTIVE_SUBSCRIPTIONS_VIEW_SQL = """
+    CREATE OR REPLACE VIEW vw_active_subscriptions AS
+    SELECT
+        s.subscription_id,
+        r.full_name AS reader_name,
+        b.title AS book_title,
+        l.name AS library_name,
+        s.issue_date,
+        s.return_date,
+        s.deposit
+    FROM subscriptions s
+    JOIN readers r ON s.reader_id = r.reader_id
+    JOIN books b ON s.book_id = b.book_id
+    JOIN libraries l ON s.library_id = l.library_id
+    WHERE s.return_date IS NULL{open_since};
+"""
+
+OPEN_SINCE_CONDITION = "\n      AND s.issue_date >= (SELECT open_since FROM subscriptions_open_since)"
+
+
+def _create_indexes_and_constraints(primary_key: Sequence[str]) -> None:
+    op.create_primary_key('subscriptions_pkey', 'subscriptions', list(primary_key))
+    op.create_foreign_key('subscriptions_library_id_fkey', 'subscriptions', 'libraries', ['library_id'], ['library_id'], ondelete='CASCADE')
+    op.create_foreign_key('subscriptions_book_id_fkey', 'subscriptions', 'books', ['book_id'], ['book_id'], ondelete='CASCADE')
+    op.create_foreign_key('subscriptions_reader_id_fkey', 'subscriptions', 'readers', ['reader_id'], ['reader_id'], ondelete='CASCADE')
+    op.create_foreign_key('subscriptions_copy_id_fkey', 'subscriptions', 'book_copies', ['copy_id'], ['copy_id'], ondelete='SET NULL')
+    op.create_check_constraint('check_deposit', 'subscriptions', 'deposit >= 0')
+    op.create_index('ix_subscriptions_book_id_return_date', 'subscriptions', ['book_id', 'return_date'], unique=False)
+    op.create_index('ix_subscriptions_reader_id_return_date', 'subscriptions', ['reader_id', 'return_date'], unique=False)
+    op.create_index('ix_subscriptions_library_id_return_date', 'subscriptions', ['library_id', 'return_date'], unique=False)
+    op.create_index('ix_subscriptions_active', 'subscriptions', ['library_id', 'issue_date'], unique=False, postgresql_where=sa.text('return_date IS NULL'))
+    op.create_index('ix_subscriptions_copy_id', 'subscriptions', ['copy_id'], unique=False)
+    op.create_index('ix_subscriptions_open_due_date', 'subscriptions', ['due_date', 'subscription_id'], unique=False, postgresql_where=sa.text('return_date IS NULL'))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('holds_subscription_id_fkey', 'holds', type_='foreignkey')
+    op.create_index('ix_holds_subscription_id', 'holds', ['subscription_id'], unique=False, postgresql_where=sa.text('subscription_id IS NOT NULL'))
+
+    op.execute("DROP VIEW IF EXISTS vw_active_subscriptions")
+    op.execute("ALTER TABLE subscriptions RENAME TO subscriptions_old")
+    op.execute(PARTITIONED_TABLE_SQL)
+    # Строки вне помесячных секций (импорт с давними или далекими датами)
+    op.execute("CREATE TABLE subscriptions_default PARTITION OF subscriptions DEFAULT")
+    op.execute(CREATE_PARTITIONS_FUNCTION_SQL)
+    op.execute(
+        f"""
+        SELECT create_subscription_partitions(
+            GREATEST(
+                COALESCE((SELECT min(issue_date) FROM subscriptions_old), current_date),
+                (current_date - interval '{HISTORY_YEARS} years')::date
+            ),
+            (current_date + interval '{MONTHS_AHEAD} months')::date
+        )
+        """
+    )
+    # Триггеров на новой таблице еще нет: перенос не трогает экземпляры и версии
+    op.execute(
+        f"""
+        INSERT INTO subscriptions ({COLUMNS})
+        SELECT subscription_id, library_id, book_id, reader_id,
+               COALESCE(issue_date, return_date, current_date),
+               return_date, deposit, due_date, overdue_days, copy_id
+        FROM subscriptions_old
+        """
+    )
+    op.execute("ALTER SEQUENCE subscriptions_subscription_id_seq OWNED BY subscriptions.subscription_id")
+    op.execute("DROP TABLE subscriptions_old")
+
+    _create_indexes_and_constraints(['subscription_id', 'issue_date'])
+    op.execute(VERSION_FUNCTION_SQL)
+    for sql in SUBSCRIPTION_TRIGGERS_SQL:
+        op.execute(sql)
+
+    op.create_table('subscriptions_open_since',
+    sa.Column('id', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('open_since', sa.Date(), server_default=sa.text('CURRENT_DATE'), nullable=False),
+    sa.CheckConstraint('id = 1', name='check_single_row'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO subscriptions_open_since (id) VALUES (1)")
+    for sql in OPEN_SINCE_FUNCTIONS_SQL + PARTITION_TRIGGERS_SQL:
+        op.execute(sql)
+    op.execute("SELECT refresh_subscriptions_open_since()")
+
+    op.execute(ACTIVE_SUBSCRIPTIONS_VIEW_SQL.format(open_since=OPEN_SINCE_CONDITION))
+    op.execute("ANALYZE subscriptions")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP VIEW IF EXISTS vw_active_subscriptions")
+    op.execute("ALTER TABLE subscriptions RENAME TO subscriptions_old")
+    op.execute(PLAIN_TABLE_SQL)
+    op.execute(f"INSERT INTO subscriptions ({COLUMNS}) SELECT {COLUMNS} FROM subscriptions_old")
+    op.execute("ALTER SEQUENCE subscriptions_subscription_id_seq OWNED BY subscriptions.subscription_id")
+    # Вместе с секциями и их триггерами
+    op.execute("DROP TABLE subscriptions_old")
+
+    _create_indexes_and_constraints(['subscription_id'])
+    op.create_index(op.f('ix_subscriptions_subscription_id'), 'subscriptions', ['subscription_id'], unique=False)
+    for sql in SUBSCRIPTION_TRIGGERS_SQL:
+        op.execute(sql)
+
+    op.drop_table('subscriptions_open_since')
+    for function in OPEN_SINCE_FUNCTIONS:
+        op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+    op.execute("DROP FUNCTION IF EXISTS create_subscription_partitions(date, date)")
+
+    op.execute(ACTIVE_SUBSCRIPTIONS_VIEW_SQL.format(open_since=""))
+    op.drop_index('ix_holds_subscription_id', table_name='holds')
+    op.create_foreign_key('holds_subscription_id_fkey', 'holds', 'subscriptions', ['subscription_id'], ['subscription_id'], ondelete='SET NULL')
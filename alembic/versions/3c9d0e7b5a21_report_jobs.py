@@ -0,0 +1,49 @@
+"""report jobs
+
+Revision ID: 3c9d0e7b5a21
+Revises: ff6f6cc854e1
+Create Date: 2026-10-18 14:05:19.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9d0e7b5a21'
+down_revision: Union[str, Sequence[str], None] = 'ff6f6cc854e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Таблицу мог создать create_all при старте приложения (до управления схемой через alembic)
+    op.create_table('report_jobs',
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('report', sa.String(length=50), nullable=False),
+    sa.Column('params', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='queued', nullable=False),
+    sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('job_id'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_report_jobs_job_id'), 'report_jobs', ['job_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_report_jobs_status_job_id', 'report_jobs', ['status', 'job_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_report_jobs_finished_at', 'report_jobs', ['finished_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_report_jobs_finished_at', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_status_job_id', table_name='report_jobs')
+    op.drop_index(op.f('ix_report_jobs_job_id'), table_name='report_jobs')
+    op.drop_table('report_jobs')
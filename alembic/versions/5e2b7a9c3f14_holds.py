@@ -0,0 +1,50 @@
+"""holds
+
+Revision ID: 5e2b7a9c3f14
+Revises: c4a8e2f61d37
+Create Date: 2026-10-18 19:03:36.870412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b7a9c3f14'
+down_revision: Union[str, Sequence[str], None] = 'c4a8e2f61d37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('holds',
+    sa.Column('hold_id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('reader_id', sa.Integer(), nullable=False),
+    sa.Column('library_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='waiting', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('fulfilled_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('subscription_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.book_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['library_id'], ['libraries.library_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['reader_id'], ['readers.reader_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['subscription_id'], ['subscriptions.subscription_id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('hold_id')
+    )
+    op.create_index(op.f('ix_holds_hold_id'), 'holds', ['hold_id'], unique=False)
+    op.create_index('ix_holds_queue', 'holds', ['book_id', 'created_at', 'hold_id'], unique=False, postgresql_where=sa.text("status = 'waiting'"))
+    op.create_index('ux_holds_waiting_reader', 'holds', ['book_id', 'reader_id'], unique=True, postgresql_where=sa.text("status = 'waiting'"))
+    op.create_index('ix_holds_reader_id', 'holds', ['reader_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_holds_reader_id', table_name='holds')
+    op.drop_index('ux_holds_waiting_reader', table_name='holds')
+    op.drop_index('ix_holds_queue', table_name='holds')
+    op.drop_index(op.f('ix_holds_hold_id'), table_name='holds')
+    op.drop_table('holds')
@@ -0,0 +1,270 @@
+"""views and triggers
+
+Revision ID: 7b1e4d2c9f60
+Revises: 3c9d0e7b5a21
+Create Date: 2026-10-18 16:42:11.208356
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e4d2c9f60'
+down_revision: Union[str, Sequence[str], None] = '3c9d0e7b5a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Раньше создавались при каждом старте приложения (app.db.session.VIEWS_AND_TRIGGERS_SQL),
+# поэтому в существующих базах объекты уже есть: все команды идемпотентны
+
+VIEWS_SQL = [
+    # Представление для списка книг
+    """
+    CREATE OR REPLACE VIEW vw_books_list AS
+    SELECT book_id, title, quantity, price
+    FROM books;
+    """,
+
+    # Подробное представление книг
+    """
+    CREATE OR REPLACE VIEW vw_books_detailed AS
+    SELECT
+        b.book_id,
+        b.title,
+        a.full_name AS author,
+        t.name AS topic,
+        l.name AS library_name,
+        b.quantity,
+        b.price
+    FROM books b
+    JOIN authors a ON b.author_id = a.author_id
+    JOIN topics t ON b.topic_id = t.topic_id
+    JOIN libraries l ON b.library_id = l.library_id;
+    """,
+
+    # Статистика по библиотекам
+    """
+    CREATE OR REPLACE VIEW vw_library_stats AS
+    SELECT
+        l.name AS library_name,
+        COUNT(b.book_id) AS total_books,
+        SUM(b.quantity) AS total_copies,
+        SUM(b.quantity * b.price) AS total_value
+    FROM libraries l
+    LEFT JOIN books b ON l.library_id = b.library_id
+    GROUP BY l.library_id, l.name
+    HAVING COUNT(b.book_id) > 0;
+    """,
+
+    # Статистика по авторам
+    """
+    CREATE OR REPLACE VIEW vw_author_stats AS
+    SELECT
+        a.full_name AS author_name,
+        COUNT(b.book_id) AS total_books,
+        SUM(b.quantity) AS total_copies,
+        AVG(b.price) AS avg_price
+    FROM authors a
+    LEFT JOIN books b ON a.author_id = b.author_id
+    GROUP BY a.author_id, a.full_name
+    HAVING COUNT(b.book_id) > 0;
+    """,
+
+    # Материализованная статистика по библиотекам (обновляется refresh_stats_views)
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_library_stats AS
+    SELECT
+        l.library_id,
+        l.name AS library_name,
+        COUNT(b.book_id) AS total_books,
+        SUM(b.quantity) AS total_copies,
+        SUM(b.quantity * b.price) AS total_value,
+        now() AS refreshed_at
+    FROM libraries l
+    LEFT JOIN books b ON l.library_id = b.library_id
+    GROUP BY l.library_id, l.name
+    HAVING COUNT(b.book_id) > 0;
+    """,
+    # Уникальный индекс обязателен для REFRESH ... CONCURRENTLY
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_library_stats ON mv_library_stats (library_id);",
+
+    # Материализованная статистика по авторам
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_author_stats AS
+    SELECT
+        a.author_id,
+        a.full_name AS author_name,
+        a.country,
+        COUNT(b.book_id) AS total_books,
+        SUM(b.quantity) AS total_copies,
+        AVG(b.price) AS avg_price,
+        now() AS refreshed_at
+    FROM authors a
+    LEFT JOIN books b ON a.author_id = b.author_id
+    GROUP BY a.author_id, a.full_name, a.country
+    HAVING COUNT(b.book_id) > 0;
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_author_stats ON mv_author_stats (author_id);",
+
+    # Активные подписки
+    """
+    CREATE OR REPLACE VIEW vw_active_subscriptions AS
+    SELECT
+        s.subscription_id,
+        r.full_name AS reader_name,
+        b.title AS book_title,
+        l.name AS library_name,
+        s.issue_date,
+        s.return_date,
+        s.deposit
+    FROM subscriptions s
+    JOIN readers r ON s.reader_id = r.reader_id
+    JOIN books b ON s.book_id = b.book_id
+    JOIN libraries l ON s.library_id = l.library_id
+    WHERE s.return_date IS NULL;
+    """,
+]
+
+QUANTITY_TRIGGERS_SQL = [
+    # Триггер для уменьшения количества книг при выдаче.
+    # Условный UPDATE берет блокировку строки книги, поэтому параллельные выдачи
+    # не могут уйти в минус; при нехватке выдача отменяется (SQLSTATE LB001)
+    """
+    CREATE OR REPLACE FUNCTION decrease_book_quantity()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.return_date IS NULL THEN
+            UPDATE books
+            SET quantity = quantity - 1
+            WHERE book_id = NEW.book_id AND quantity > 0;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Book % not available', NEW.book_id USING ERRCODE = 'LB001';
+            END IF;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS trg_decrease_quantity ON subscriptions;",
+    """
+    CREATE TRIGGER trg_decrease_quantity
+    AFTER INSERT ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION decrease_book_quantity();
+    """,
+
+    # Триггер для увеличения количества книг при удалении активной подписки
+    """
+    CREATE OR REPLACE FUNCTION increase_book_quantity()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF OLD.return_date IS NULL THEN
+            UPDATE books
+            SET quantity = quantity + 1
+            WHERE book_id = OLD.book_id;
+        END IF;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS trg_increase_quantity ON subscriptions;",
+    """
+    CREATE TRIGGER trg_increase_quantity
+    AFTER DELETE ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION increase_book_quantity();
+    """,
+
+    # Триггер для возврата (и отмены возврата) через UPDATE return_date
+    """
+    CREATE OR REPLACE FUNCTION return_book_quantity()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF OLD.return_date IS NULL AND NEW.return_date IS NOT NULL THEN
+            UPDATE books
+            SET quantity = quantity + 1
+            WHERE book_id = OLD.book_id;
+        ELSIF OLD.return_date IS NOT NULL AND NEW.return_date IS NULL THEN
+            UPDATE books
+            SET quantity = quantity - 1
+            WHERE book_id = NEW.book_id AND quantity > 0;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Book % not available', NEW.book_id USING ERRCODE = 'LB001';
+            END IF;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS trg_return_quantity ON subscriptions;",
+    """
+    CREATE TRIGGER trg_return_quantity
+    AFTER UPDATE OF return_date ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION return_book_quantity();
+    """,
+]
+
+# Версия таблицы для ETag: последовательность не берет блокировок,
+# отложенный триггер увеличивает ее перед самым коммитом
+VERSION_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION bump_table_version()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM nextval(('table_version_' || TG_TABLE_NAME)::regclass);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Должно совпадать с app.db.session.VERSIONED_TABLES
+VERSIONED_TABLES = ["libraries", "topics", "authors", "books", "readers", "subscriptions"]
+
+VIEWS = ["vw_active_subscriptions", "vw_author_stats", "vw_library_stats", "vw_books_detailed", "vw_books_list"]
+MATERIALIZED_VIEWS = ["mv_author_stats", "mv_library_stats"]
+QUANTITY_TRIGGERS = {
+    "trg_decrease_quantity": "decrease_book_quantity",
+    "trg_increase_quantity": "increase_book_quantity",
+    "trg_return_quantity": "return_book_quantity",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for sql in VIEWS_SQL + QUANTITY_TRIGGERS_SQL:
+        op.execute(sql)
+
+    op.execute(VERSION_FUNCTION_SQL)
+    op.execute("CREATE SEQUENCE IF NOT EXISTS table_version_stats")
+    for table in VERSIONED_TABLES:
+        op.execute(f"CREATE SEQUENCE IF NOT EXISTS table_version_{table}")
+        op.execute(f"DROP TRIGGER IF EXISTS trg_version_{table} ON {table}")
+        op.execute(
+            f"""
+            CREATE CONSTRAINT TRIGGER trg_version_{table}
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW
+            EXECUTE FUNCTION bump_table_version();
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_version_{table} ON {table}")
+        op.execute(f"DROP SEQUENCE IF EXISTS table_version_{table}")
+    op.execute("DROP SEQUENCE IF EXISTS table_version_stats")
+    op.execute("DROP FUNCTION IF EXISTS bump_table_version()")
+
+    for trigger, function in QUANTITY_TRIGGERS.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON subscriptions")
+        op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+
+    for view in MATERIALIZED_VIEWS:
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view}")
+    for view in VIEWS:
+        op.execute(f"DROP VIEW IF EXISTS {view}")
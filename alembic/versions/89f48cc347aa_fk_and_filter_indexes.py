@@ -0,0 +1,43 @@
+"""fk and filter indexes
+
+Revision ID: 89f48cc347aa
+Revises: a525d14f5b8f
+Create Date: 2026-10-18 10:12:41.208316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '89f48cc347aa'
+down_revision: Union[str, Sequence[str], None] = 'a525d14f5b8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_books_library_id_book_id', 'books', ['library_id', 'book_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_books_topic_id', 'books', ['topic_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_books_author_id', 'books', ['author_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_subscriptions_book_id_return_date', 'subscriptions', ['book_id', 'return_date'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_subscriptions_reader_id_return_date', 'subscriptions', ['reader_id', 'return_date'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_subscriptions_library_id_return_date', 'subscriptions', ['library_id', 'return_date'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_subscriptions_active', 'subscriptions', ['library_id', 'issue_date'], unique=False, postgresql_where=sa.text('return_date IS NULL'), postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_subscriptions_active', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_subscriptions_library_id_return_date', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_subscriptions_reader_id_return_date', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_subscriptions_book_id_return_date', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_books_author_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_books_topic_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_books_library_id_book_id', table_name='books', postgresql_concurrently=True, if_exists=True)
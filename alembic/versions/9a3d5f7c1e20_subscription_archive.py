@@ -0,0 +1,49 @@
+"""subscription archive
+
+Revision ID: 9a3d5f7c1e20
+Revises: 2f8c6a1d9b57
+Create Date: 2026-10-18 23:05:37.640912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3d5f7c1e20'
+down_revision: Union[str, Sequence[str], None] = '2f8c6a1d9b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('subscription_archive_files',
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('library_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('path', sa.String(length=512), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('first_subscription_id', sa.Integer(), nullable=False),
+    sa.Column('last_subscription_id', sa.Integer(), nullable=False),
+    sa.Column('reader_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+    sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('file_id')
+    )
+    op.create_index(op.f('ix_subscription_archive_files_file_id'), 'subscription_archive_files', ['file_id'], unique=False)
+    op.create_index('ux_subscription_archive_files_path', 'subscription_archive_files', ['path'], unique=True)
+    op.create_index('ix_subscription_archive_files_library_month', 'subscription_archive_files', ['library_id', 'month'], unique=False)
+    op.create_index('ix_subscription_archive_files_reader_ids', 'subscription_archive_files', ['reader_ids'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_subscription_archive_files_reader_ids', table_name='subscription_archive_files')
+    op.drop_index('ix_subscription_archive_files_library_month', table_name='subscription_archive_files')
+    op.drop_index('ux_subscription_archive_files_path', table_name='subscription_archive_files')
+    op.drop_index(op.f('ix_subscription_archive_files_file_id'), table_name='subscription_archive_files')
+    op.drop_table('subscription_archive_files')
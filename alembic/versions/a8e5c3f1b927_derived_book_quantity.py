@@ -0,0 +1,248 @@
+"""derived book quantity
+
+Revision ID: a8e5c3f1b927
+Revises: d6a9c4e2f813
+Create Date: 2026-10-19 00:37:05.118420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8e5c3f1b927'
+down_revision: Union[str, Sequence[str], None] = 'd6a9c4e2f813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Число свободных экземпляров книги b — проход по частичному ix_book_copies_available.
+# Счетчик в строке books блокировал ее каждой выдачей и возвратом до коммита:
+# параллельные выдачи одной книги шли по очереди, а пакеты с книгами в разном порядке
+# взаимно блокировались на отложенном триггере
+AVAILABLE_COPIES_SQL = (
+    "(SELECT count(*) FROM book_copies c WHERE c.book_id = b.book_id AND c.status = 'available')::integer"
+)
+AVAILABLE_COPIES_JOIN_SQL = f"LEFT JOIN LATERAL (SELECT {AVAILABLE_COPIES_SQL} AS quantity) q ON true"
+
+VIEWS = ["vw_books_list", "vw_books_detailed", "vw_library_stats", "vw_author_stats"]
+MATERIALIZED_VIEWS = ["mv_library_stats", "mv_author_stats"]
+
+
+def _views_sql(quantity: str, join: str) -> list:
+    """Представления 7b1e4d2c9f60 и mv_* из b3f7a2c8d415; quantity — выражение, join — откуда оно берется"""
+    return [
+        f"""
+        CREATE VIEW vw_books_list AS
+        SELECT b.book_id, b.title, {quantity} AS quantity, b.price
+        FROM books b {join};
+        """,
+        f"""
+        CREATE VIEW vw_books_detailed AS
+        SELECT
+            b.book_id,
+            b.title,
+            a.full_name AS author,
+            t.name AS topic,
+            l.name AS library_name,
+            {quantity} AS quantity,
+            b.price
+        FROM books b
+        JOIN authors a ON b.author_id = a.author_id
+        JOIN topics t ON b.topic_id = t.topic_id
+        JOIN libraries l ON b.library_id = l.library_id
+        {join};
+        """,
+        f"""
+        CREATE VIEW vw_library_stats AS
+        SELECT
+            l.name AS library_name,
+            COUNT(b.book_id) AS total_books,
+            SUM({quantity}) AS total_copies,
+            SUM({quantity} * b.price) AS total_value
+        FROM libraries l
+        LEFT JOIN books b ON l.library_id = b.library_id
+        {join}
+        GROUP BY l.library_id, l.name
+        HAVING COUNT(b.book_id) > 0;
+        """,
+        f"""
+        CREATE VIEW vw_author_stats AS
+        SELECT
+            a.full_name AS author_name,
+            COUNT(b.book_id) AS total_books,
+            SUM({quantity}) AS total_copies,
+            AVG(b.price) AS avg_price
+        FROM authors a
+        LEFT JOIN books b ON a.author_id = b.author_id
+        {join}
+        GROUP BY a.author_id, a.full_name
+        HAVING COUNT(b.book_id) > 0;
+        """,
+        f"""
+        CREATE MATERIALIZED VIEW mv_library_stats AS
+        SELECT
+            l.library_id,
+            l.name AS library_name,
+            COUNT(b.book_id) AS total_books,
+            SUM({quantity}) AS total_copies,
+            SUM({quantity} * b.price) AS total_value
+        FROM libraries l
+        LEFT JOIN books b ON l.library_id = b.library_id
+        {join}
+        GROUP BY l.library_id, l.name
+        HAVING COUNT(b.book_id) > 0;
+        """,
+        "CREATE UNIQUE INDEX ux_mv_library_stats ON mv_library_stats (library_id);",
+        f"""
+        CREATE MATERIALIZED VIEW mv_author_stats AS
+        SELECT
+            a.author_id,
+            a.full_name AS author_name,
+            a.country,
+            COUNT(b.book_id) AS total_books,
+            SUM({quantity}) AS total_copies,
+            AVG(b.price) AS avg_price
+        FROM authors a
+        LEFT JOIN books b ON a.author_id = b.author_id
+        {join}
+        GROUP BY a.author_id, a.full_name, a.country
+        HAVING COUNT(b.book_id) > 0;
+        """,
+        "CREATE UNIQUE INDEX ux_mv_author_stats ON mv_author_stats (author_id);",
+    ]
+
+
+def _drop_views() -> None:
+    for view in MATERIALIZED_VIEWS:
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view}")
+    for view in VIEWS:
+        op.execute(f"DROP VIEW IF EXISTS {view}")
+
+
+# Экземпляры выдаются и возвращаются без записи в books: версию "books" для ETag
+# увеличивают изменения book_copies
+BOOK_COPIES_VERSION_TRIGGER_SQL = """
+    CREATE TRIGGER trg_version_book_copies
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON book_copies
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_table_version('books');
+"""
+
+# Триггеры счетчика books.quantity из e91f3b6d2a48 (восстанавливаются при откате)
+COUNTER_TRIGGERS_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION book_copies_available_delta()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        delta integer := 0;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            IF OLD.status = 'available' THEN
+                delta := delta - 1;
+            END IF;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            IF NEW.status = 'available' THEN
+                delta := delta + 1;
+            END IF;
+        END IF;
+        IF delta <> 0 THEN
+            UPDATE books
+            SET quantity = quantity + delta
+            WHERE book_id = CASE WHEN TG_OP = 'DELETE' THEN OLD.book_id ELSE NEW.book_id END;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE CONSTRAINT TRIGGER trg_book_copies_available
+    AFTER INSERT OR UPDATE OF status OR DELETE ON book_copies
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION book_copies_available_delta();
+    """,
+    """
+    CREATE OR REPLACE FUNCTION sync_book_copies()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        diff integer := COALESCE(NEW.quantity, 0);
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            diff := diff - COALESCE(OLD.quantity, 0);
+        END IF;
+        IF diff > 0 THEN
+            INSERT INTO book_copies (book_id)
+            SELECT NEW.book_id FROM generate_series(1, diff);
+        ELSIF diff < 0 THEN
+            UPDATE book_copies
+            SET status = 'withdrawn'
+            WHERE copy_id IN (
+                SELECT copy_id FROM book_copies
+                WHERE book_id = NEW.book_id AND status = 'available'
+                ORDER BY copy_id DESC
+                LIMIT -diff
+                FOR UPDATE SKIP LOCKED
+            );
+        END IF;
+        IF diff <> 0 THEN
+            UPDATE books SET quantity = quantity - diff WHERE book_id = NEW.book_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_sync_book_copies
+    AFTER INSERT OR UPDATE OF quantity ON books
+    FOR EACH ROW
+    WHEN (pg_trigger_depth() = 0)
+    EXECUTE FUNCTION sync_book_copies();
+    """,
+]
+
+COUNTER_TRIGGERS = {
+    "trg_book_copies_available": ("book_copies", "book_copies_available_delta"),
+    "trg_sync_book_copies": ("books", "sync_book_copies"),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for trigger, (table, function) in COUNTER_TRIGGERS.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+
+    _drop_views()
+    op.drop_constraint('check_quantity', 'books', type_='check')
+    op.drop_column('books', 'quantity')
+    for sql in _views_sql("q.quantity", AVAILABLE_COPIES_JOIN_SQL):
+        op.execute(sql)
+    op.execute(
+        "UPDATE stats_view_refreshes SET refreshed_at = now() WHERE view_name IN ("
+        + ", ".join(f"'{view}'" for view in MATERIALIZED_VIEWS) + ")"
+    )
+
+    op.execute(BOOK_COPIES_VERSION_TRIGGER_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_version_book_copies ON book_copies")
+
+    _drop_views()
+    op.add_column('books', sa.Column('quantity', sa.Integer(), nullable=True))
+    op.execute(f"UPDATE books b SET quantity = {AVAILABLE_COPIES_SQL}")
+    op.create_check_constraint('check_quantity', 'books', 'quantity >= 0')
+    for sql in _views_sql("b.quantity", ""):
+        op.execute(sql)
+    op.execute(
+        "UPDATE stats_view_refreshes SET refreshed_at = now() WHERE view_name IN ("
+        + ", ".join(f"'{view}'" for view in MATERIALIZED_VIEWS) + ")"
+    )
+
+    for sql in COUNTER_TRIGGERS_SQL:
+        op.execute(sql)
@@ -0,0 +1,83 @@
+"""stats view refreshes
+
+Revision ID: b3f7a2c8d415
+Revises: 9a3d5f7c1e20
+Create Date: 2026-10-18 23:41:12.301746
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f7a2c8d415'
+down_revision: Union[str, Sequence[str], None] = '9a3d5f7c1e20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MATERIALIZED_VIEWS = ["mv_library_stats", "mv_author_stats"]
+
+
+def _views_sql(refreshed_at: str) -> list:
+    """mv_* из 7b1e4d2c9f60; refreshed_at — колонка представления или пусто"""
+    return [
+        f"""
+        CREATE MATERIALIZED VIEW mv_library_stats AS
+        SELECT
+            l.library_id,
+            l.name AS library_name,
+            COUNT(b.book_id) AS total_books,
+            SUM(b.quantity) AS total_copies,
+            SUM(b.quantity * b.price) AS total_value{refreshed_at}
+        FROM libraries l
+        LEFT JOIN books b ON l.library_id = b.library_id
+        GROUP BY l.library_id, l.name
+        HAVING COUNT(b.book_id) > 0;
+        """,
+        "CREATE UNIQUE INDEX ux_mv_library_stats ON mv_library_stats (library_id);",
+        f"""
+        CREATE MATERIALIZED VIEW mv_author_stats AS
+        SELECT
+            a.author_id,
+            a.full_name AS author_name,
+            a.country,
+            COUNT(b.book_id) AS total_books,
+            SUM(b.quantity) AS total_copies,
+            AVG(b.price) AS avg_price{refreshed_at}
+        FROM authors a
+        LEFT JOIN books b ON a.author_id = b.author_id
+        GROUP BY a.author_id, a.full_name, a.country
+        HAVING COUNT(b.book_id) > 0;
+        """,
+        "CREATE UNIQUE INDEX ux_mv_author_stats ON mv_author_stats (author_id);",
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stats_view_refreshes',
+    sa.Column('view_name', sa.String(length=63), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('view_name')
+    )
+    # Без now() в строках: REFRESH ... CONCURRENTLY переписывает только изменившиеся строки
+    for view in MATERIALIZED_VIEWS:
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view}")
+    for sql in _views_sql(""):
+        op.execute(sql)
+    op.execute(
+        "INSERT INTO stats_view_refreshes (view_name) VALUES "
+        + ", ".join(f"('{view}')" for view in MATERIALIZED_VIEWS)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for view in MATERIALIZED_VIEWS:
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view}")
+    for sql in _views_sql(",\n            now() AS refreshed_at"):
+        op.execute(sql)
+    op.drop_table('stats_view_refreshes')
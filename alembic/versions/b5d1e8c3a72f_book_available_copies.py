@@ -0,0 +1,158 @@
+"""book available copies
+
+Revision ID: b5d1e8c3a72f
+Revises: e7b2d9f4a1c6
+Create Date: 2026-10-19 03:02:14.381906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d1e8c3a72f'
+down_revision: Union[str, Sequence[str], None] = 'e7b2d9f4a1c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Признак транзакции, для которой перенос book_copy_deltas в books уже запланирован
+PENDING_SETTING = "library.book_copy_deltas"
+
+# Изменения числа свободных экземпляров копятся в book_copy_deltas — по строке на книгу
+# за оператор, только INSERT: выдачи и возвраты строки books не блокируют.
+# Первая запись транзакции (apply) планирует отложенный перенос в books
+RECORD_DELTAS_SQL = f"""
+    CREATE OR REPLACE FUNCTION record_book_copy_deltas()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        schedule boolean := current_setting('{PENDING_SETTING}', true) IS DISTINCT FROM 'pending';
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO book_copy_deltas (book_id, delta, apply)
+            SELECT book_id, count(*), schedule AND row_number() OVER () = 1
+            FROM new_copies
+            WHERE status = 'available'
+            GROUP BY book_id;
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO book_copy_deltas (book_id, delta, apply)
+            SELECT book_id, sum(delta), schedule AND row_number() OVER () = 1
+            FROM (
+                SELECT book_id, 1 AS delta FROM new_copies WHERE status = 'available'
+                UNION ALL
+                SELECT book_id, -1 AS delta FROM old_copies WHERE status = 'available'
+            ) changes
+            GROUP BY book_id
+            HAVING sum(delta) <> 0;
+        ELSE
+            INSERT INTO book_copy_deltas (book_id, delta, apply)
+            SELECT book_id, -count(*), schedule AND row_number() OVER () = 1
+            FROM old_copies
+            WHERE status = 'available'
+            GROUP BY book_id;
+        END IF;
+        IF FOUND AND schedule THEN
+            PERFORM set_config('{PENDING_SETTING}', 'pending', true);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Перенос при коммите: суммы по книгам, строки books блокируются по порядку book_id —
+# и только на время коммита. Параллельные коммиты с общими книгами не ждут друг друга по кругу.
+# FOR NO KEY UPDATE, как и сам UPDATE: с FOR KEY SHARE проверок внешних ключей
+# (выдачи и экземпляры этих книг в других транзакциях) не конфликтует
+APPLY_DELTAS_SQL = f"""
+    CREATE OR REPLACE FUNCTION apply_book_copy_deltas()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        book_ids integer[];
+        deltas integer[];
+    BEGIN
+        PERFORM set_config('{PENDING_SETTING}', '', true);
+        WITH applied AS (
+            DELETE FROM book_copy_deltas
+            WHERE xact_id = txid_current()
+            RETURNING book_id, delta
+        )
+        SELECT array_agg(book_id ORDER BY book_id), array_agg(delta ORDER BY book_id)
+        INTO book_ids, deltas
+        FROM (
+            SELECT book_id, sum(delta)::integer AS delta
+            FROM applied
+            GROUP BY book_id
+            HAVING sum(delta) <> 0
+        ) totals;
+        IF book_ids IS NOT NULL THEN
+            PERFORM 1 FROM books WHERE book_id = ANY(book_ids) ORDER BY book_id FOR NO KEY UPDATE;
+            UPDATE books b
+            SET available_copies = b.available_copies + totals.delta
+            FROM unnest(book_ids, deltas) AS totals(book_id, delta)
+            WHERE b.book_id = totals.book_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Переходные таблицы допустимы только у триггера на одно событие
+RECORD_TRIGGERS_SQL = {
+    "trg_book_copies_inserted": "AFTER INSERT ON book_copies REFERENCING NEW TABLE AS new_copies",
+    "trg_book_copies_updated": "AFTER UPDATE ON book_copies REFERENCING OLD TABLE AS old_copies NEW TABLE AS new_copies",
+    "trg_book_copies_deleted": "AFTER DELETE ON book_copies REFERENCING OLD TABLE AS old_copies",
+}
+
+APPLY_TRIGGER_SQL = """
+    CREATE CONSTRAINT TRIGGER trg_apply_book_copy_deltas
+    AFTER INSERT ON book_copy_deltas
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    WHEN (NEW.apply)
+    EXECUTE FUNCTION apply_book_copy_deltas();
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Константное значение по умолчанию: колонка добавляется без перезаписи таблицы
+    op.add_column('books', sa.Column('available_copies', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE books b SET available_copies = "
+        "(SELECT count(*) FROM book_copies c WHERE c.book_id = b.book_id AND c.status = 'available')"
+    )
+    op.create_check_constraint('check_available_copies', 'books', 'available_copies >= 0')
+    # sort_by=quantity и курсоры по нему
+    op.create_index('ix_books_available_copies_book_id', 'books', ['available_copies', 'book_id'], unique=False)
+
+    op.create_table('book_copy_deltas',
+    sa.Column('xact_id', sa.BigInteger(), server_default=sa.text('txid_current()'), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('apply', sa.Boolean(), server_default='false', nullable=False)
+    )
+    op.create_index('ix_book_copy_deltas_xact_id', 'book_copy_deltas', ['xact_id'], unique=False)
+
+    op.execute(RECORD_DELTAS_SQL)
+    op.execute(APPLY_DELTAS_SQL)
+    for trigger, definition in RECORD_TRIGGERS_SQL.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON book_copies")
+        op.execute(
+            f"CREATE TRIGGER {trigger} {definition} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION record_book_copy_deltas()"
+        )
+    op.execute(APPLY_TRIGGER_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger in RECORD_TRIGGERS_SQL:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON book_copies")
+    op.drop_table('book_copy_deltas')
+    op.execute("DROP FUNCTION IF EXISTS apply_book_copy_deltas()")
+    op.execute("DROP FUNCTION IF EXISTS record_book_copy_deltas()")
+    op.drop_index('ix_books_available_copies_book_id', table_name='books')
+    op.drop_constraint('check_available_copies', 'books', type_='check')
+    op.drop_column('books', 'available_copies')
@@ -0,0 +1,120 @@
+"""version overflow shards
+
+Revision ID: c1f4e8a2d6b3
+Revises: a8e5c3f1b927
+Create Date: 2026-10-19 01:24:51.772093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1f4e8a2d6b3'
+down_revision: Union[str, Sequence[str], None] = 'a8e5c3f1b927'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Основные счетчики из d6a9c4e2f813
+VERSION_SHARDS = 16
+
+# Счетчик держится до коммита записавшей транзакции: при VERSION_SHARDS одновременных
+# транзакциях записи следующие ждали бы. Тогда берется счетчик процесса
+# (VERSION_SHARDS + pid): pid работающих процессов различны, его никто другой не держит
+BUMP_VERSION_SQL = f"""
+    CREATE OR REPLACE FUNCTION bump_version(name text)
+    RETURNS void AS $$
+    DECLARE
+        target integer;
+    BEGIN
+        SELECT shard INTO target
+        FROM table_versions
+        WHERE table_name = name AND shard < {VERSION_SHARDS}
+        ORDER BY shard <> pg_backend_pid() % {VERSION_SHARDS}, shard
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED;
+        IF FOUND THEN
+            UPDATE table_versions SET version = version + 1
+            WHERE table_name = name AND shard = target;
+        ELSE
+            INSERT INTO table_versions (table_name, shard, version)
+            VALUES (name, {VERSION_SHARDS} + pg_backend_pid(), 1)
+            ON CONFLICT (table_name, shard) DO UPDATE SET version = table_versions.version + 1;
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Перенос счетчиков процессов в основной счетчик 0 (сумма, а значит и версия, не меняется).
+# Занятые сейчас счетчики пропускаются; возвращает число перенесенных
+COMPACT_VERSIONS_SQL = f"""
+    CREATE OR REPLACE FUNCTION compact_table_versions()
+    RETURNS integer AS $$
+    DECLARE
+        moved integer;
+    BEGIN
+        WITH overflow AS (
+            DELETE FROM table_versions
+            WHERE (table_name, shard) IN (
+                SELECT table_name, shard FROM table_versions
+                WHERE shard >= {VERSION_SHARDS}
+                ORDER BY table_name, shard
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING table_name, version
+        ), totals AS (
+            SELECT table_name, sum(version) AS version, count(*) AS shards
+            FROM overflow
+            GROUP BY table_name
+        ), folded AS (
+            UPDATE table_versions v
+            SET version = v.version + totals.version
+            FROM totals
+            WHERE v.table_name = totals.table_name AND v.shard = 0
+        )
+        SELECT COALESCE(sum(shards), 0) INTO moved FROM totals;
+        RETURN moved;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Функция из d6a9c4e2f813 (восстанавливается при откате)
+PREVIOUS_BUMP_VERSION_SQL = f"""
+    CREATE OR REPLACE FUNCTION bump_version(name text)
+    RETURNS void AS $$
+    DECLARE
+        target smallint;
+    BEGIN
+        SELECT shard INTO target
+        FROM table_versions
+        WHERE table_name = name
+        ORDER BY shard <> pg_backend_pid() % {VERSION_SHARDS}, shard
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED;
+        IF NOT FOUND THEN
+            target := pg_backend_pid() % {VERSION_SHARDS};
+        END IF;
+        UPDATE table_versions SET version = version + 1
+        WHERE table_name = name AND shard = target;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # pid не помещается в smallint
+    op.alter_column('table_versions', 'shard', existing_type=sa.SmallInteger(), type_=sa.Integer(), existing_nullable=False)
+    op.execute(BUMP_VERSION_SQL)
+    op.execute(COMPACT_VERSIONS_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(PREVIOUS_BUMP_VERSION_SQL)
+    op.execute("SELECT compact_table_versions()")
+    op.execute("DROP FUNCTION IF EXISTS compact_table_versions()")
+    op.alter_column('table_versions', 'shard', existing_type=sa.Integer(), type_=sa.SmallInteger(), existing_nullable=False)
@@ -0,0 +1,84 @@
+"""subscription due date
+
+Revision ID: c4a8e2f61d37
+Revises: 7b1e4d2c9f60
+Create Date: 2026-10-18 18:20:47.551903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e2f61d37'
+down_revision: Union[str, Sequence[str], None] = '7b1e4d2c9f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Колонки с константным значением по умолчанию добавляются без перезаписи таблицы
+    op.add_column('libraries', sa.Column('loan_period_days', sa.Integer(), server_default='14', nullable=False))
+    op.create_check_constraint('check_loan_period_days', 'libraries', 'loan_period_days > 0')
+    op.add_column('subscriptions', sa.Column('due_date', sa.Date(), nullable=True))
+    op.add_column('subscriptions', sa.Column('overdue_days', sa.Integer(), server_default='0', nullable=False))
+
+    # Срок нужен только открытым выдачам: возвращенные не перезаписываем
+    op.execute(
+        """
+        UPDATE subscriptions s
+        SET due_date = s.issue_date + l.loan_period_days,
+            overdue_days = GREATEST(current_date - (s.issue_date + l.loan_period_days), 0)
+        FROM libraries l
+        WHERE l.library_id = s.library_id AND s.return_date IS NULL AND s.due_date IS NULL
+        """
+    )
+
+    # Срок по политике библиотеки для любых INSERT: одиночная и пакетная выдача, импорт
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION set_due_date()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF NEW.due_date IS NULL THEN
+                SELECT COALESCE(NEW.issue_date, current_date) + loan_period_days
+                INTO NEW.due_date
+                FROM libraries
+                WHERE library_id = NEW.library_id;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_set_due_date ON subscriptions")
+    op.execute(
+        """
+        CREATE TRIGGER trg_set_due_date
+        BEFORE INSERT ON subscriptions
+        FOR EACH ROW
+        EXECUTE FUNCTION set_due_date();
+        """
+    )
+
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_subscriptions_open_due_date', 'subscriptions', ['due_date', 'subscription_id'], unique=False,
+            postgresql_where=sa.text('return_date IS NULL'), postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_subscriptions_open_due_date', table_name='subscriptions', postgresql_concurrently=True, if_exists=True)
+    op.execute("DROP TRIGGER IF EXISTS trg_set_due_date ON subscriptions")
+    op.execute("DROP FUNCTION IF EXISTS set_due_date()")
+    op.drop_column('subscriptions', 'overdue_days')
+    op.drop_column('subscriptions', 'due_date')
+    op.drop_constraint('check_loan_period_days', 'libraries', type_='check')
+    op.drop_column('libraries', 'loan_period_days')
@@ -0,0 +1,134 @@
+"""table versions
+
+Revision ID: d6a9c4e2f813
+Revises: b3f7a2c8d415
+Create Date: 2026-10-18 23:58:40.517203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6a9c4e2f813'
+down_revision: Union[str, Sequence[str], None] = 'b3f7a2c8d415'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Должно совпадать с app.db.session.VERSIONED_TABLES
+VERSIONED_TABLES = ["libraries", "topics", "authors", "books", "readers", "subscriptions"]
+# Версия "stats" увеличивается при обновлении материализованной статистики
+VERSION_NAMES = VERSIONED_TABLES + ["stats"]
+
+# Строк-счетчиков на таблицу: строка заблокирована до коммита изменившей таблицу
+# транзакции, с одной строкой все записи в таблицу шли бы по очереди
+VERSION_SHARDS = 16
+
+# Версия — сумма счетчиков таблицы. Строка обновляется в транзакции записи:
+# новая версия видна (и доходит до реплик) вместе с данными, а не раньше них.
+# Берется свободный счетчик, начиная со своего (по pid): ожидания нет, пока
+# все VERSION_SHARDS строк не заняты другими транзакциями
+BUMP_VERSION_SQL = f"""
+    CREATE OR REPLACE FUNCTION bump_version(name text)
+    RETURNS void AS $$
+    DECLARE
+        target smallint;
+    BEGIN
+        SELECT shard INTO target
+        FROM table_versions
+        WHERE table_name = name
+        ORDER BY shard <> pg_backend_pid() % {VERSION_SHARDS}, shard
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED;
+        IF NOT FOUND THEN
+            target := pg_backend_pid() % {VERSION_SHARDS};
+        END IF;
+        UPDATE table_versions SET version = version + 1
+        WHERE table_name = name AND shard = target;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Один раз на оператор: массовая загрузка или UPDATE по миллиону строк — одно увеличение
+VERSION_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION bump_table_version()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM bump_version(TG_ARGV[0]);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Прежняя функция (2f8c6a1d9b57) для downgrade
+SEQUENCE_VERSION_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION bump_table_version()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM nextval(('table_version_' || COALESCE(TG_ARGV[0], TG_TABLE_NAME))::regclass);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=63), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('table_name', 'shard')
+    )
+    # Счетчик 0 продолжает последовательность: ETag неизмененных таблиц не меняется
+    for name in VERSION_NAMES:
+        op.execute(
+            f"""
+            INSERT INTO table_versions (table_name, shard, version)
+            SELECT '{name}', shard, CASE WHEN shard = 0 THEN (SELECT last_value FROM table_version_{name}) ELSE 0 END
+            FROM generate_series(0, {VERSION_SHARDS - 1}) AS shard
+            """
+        )
+
+    op.execute(BUMP_VERSION_SQL)
+    op.execute(VERSION_FUNCTION_SQL)
+    for table in VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_version_{table} ON {table}")
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_version_{table}
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION bump_table_version('{table}');
+            """
+        )
+    for name in VERSION_NAMES:
+        op.execute(f"DROP SEQUENCE IF EXISTS table_version_{name}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in VERSION_NAMES:
+        op.execute(f"CREATE SEQUENCE IF NOT EXISTS table_version_{name}")
+        op.execute(
+            f"SELECT setval('table_version_{name}', "
+            f"GREATEST((SELECT sum(version) FROM table_versions WHERE table_name = '{name}')::bigint, 1))"
+        )
+
+    op.execute(SEQUENCE_VERSION_FUNCTION_SQL)
+    for table in VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_version_{table} ON {table}")
+        op.execute(
+            f"""
+            CREATE CONSTRAINT TRIGGER trg_version_{table}
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW
+            EXECUTE FUNCTION bump_table_version('{table}');
+            """
+        )
+    op.execute("DROP FUNCTION IF EXISTS bump_version(text)")
+    op.drop_table('table_versions')
@@ -0,0 +1,63 @@
+"""update due date
+
+Revision ID: e7b2d9f4a1c6
+Revises: c1f4e8a2d6b3
+Create Date: 2026-10-19 02:10:37.604815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2d9f4a1c6'
+down_revision: Union[str, Sequence[str], None] = 'c1f4e8a2d6b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# trg_set_due_date считает срок только при INSERT: после смены даты выдачи или
+# библиотеки срок пересчитывается, если клиент не задал новый due_date сам.
+# NULL, как и при INSERT, — срок по политике библиотеки.
+# overdue_days открытой выдачи обновляется сразу: задание просрочки обходит только
+# выдачи с прошедшим сроком и продленную выдачу не обнулило бы
+UPDATE_DUE_DATE_SQL = """
+    CREATE OR REPLACE FUNCTION update_due_date()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.due_date IS NULL
+           OR (NEW.due_date IS NOT DISTINCT FROM OLD.due_date
+               AND (NEW.issue_date IS DISTINCT FROM OLD.issue_date OR NEW.library_id IS DISTINCT FROM OLD.library_id)) THEN
+            SELECT NEW.issue_date + loan_period_days
+            INTO NEW.due_date
+            FROM libraries
+            WHERE library_id = NEW.library_id;
+        END IF;
+        IF NEW.return_date IS NULL AND NEW.due_date IS DISTINCT FROM OLD.due_date THEN
+            NEW.overdue_days := GREATEST(current_date - NEW.due_date, 0);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+UPDATE_DUE_DATE_TRIGGER_SQL = """
+    CREATE TRIGGER trg_update_due_date
+    BEFORE UPDATE OF issue_date, library_id, due_date ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION update_due_date();
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(UPDATE_DUE_DATE_SQL)
+    op.execute("DROP TRIGGER IF EXISTS trg_update_due_date ON subscriptions")
+    op.execute(UPDATE_DUE_DATE_TRIGGER_SQL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS trg_update_due_date ON subscriptions")
+    op.execute("DROP FUNCTION IF EXISTS update_due_date()")
@@ -0,0 +1,339 @@
+"""book copies
+
+Revision ID: e91f3b6d2a48
+Revises: 5e2b7a9c3f14
+Create Date: 2026-10-18 20:11:52.394017
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91f3b6d2a48'
+down_revision: Union[str, Sequence[str], None] = '5e2b7a9c3f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Экземпляры для существующих данных: выданные (по одному на активную подписку) и свободные (books.quantity)
+BACKFILL_SQL = [
+    """
+    INSERT INTO book_copies (book_id, barcode, status)
+    SELECT book_id, 'LS' || subscription_id, 'on_loan'
+    FROM subscriptions
+    WHERE return_date IS NULL
+    """,
+    """
+    UPDATE subscriptions s
+    SET copy_id = c.copy_id
+    FROM book_copies c
+    WHERE c.barcode = 'LS' || s.subscription_id AND s.return_date IS NULL
+    """,
+    """
+    INSERT INTO book_copies (book_id, barcode, status)
+    SELECT b.book_id, 'LB' || b.book_id || '-' || n, 'available'
+    FROM books b, generate_series(1, b.quantity) AS n
+    WHERE b.quantity > 0
+    """,
+]
+
+COPY_TRIGGERS_SQL = [
+    # books.quantity — число свободных экземпляров. Отложенный триггер меняет его при коммите,
+    # поэтому строка книги блокируется на мгновение коммита, а не на всю транзакцию выдачи
+    """
+    CREATE OR REPLACE FUNCTION book_copies_available_delta()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        delta integer := 0;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            IF OLD.status = 'available' THEN
+                delta := delta - 1;
+            END IF;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            IF NEW.status = 'available' THEN
+                delta := delta + 1;
+            END IF;
+        END IF;
+        IF delta <> 0 THEN
+            UPDATE books
+            SET quantity = quantity + delta
+            WHERE book_id = CASE WHEN TG_OP = 'DELETE' THEN OLD.book_id ELSE NEW.book_id END;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE CONSTRAINT TRIGGER trg_book_copies_available
+    AFTER INSERT OR UPDATE OF status OR DELETE ON book_copies
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW
+    EXECUTE FUNCTION book_copies_available_delta();
+    """,
+
+    # Запись quantity клиентом (создание книги, PUT, импорт) превращается в добавление
+    # или списание свободных экземпляров; сам счетчик досчитают триггеры экземпляров при коммите.
+    # pg_trigger_depth() = 0 — только прямые команды, не UPDATE из триггера выше
+    """
+    CREATE OR REPLACE FUNCTION sync_book_copies()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        diff integer := COALESCE(NEW.quantity, 0);
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            diff := diff - COALESCE(OLD.quantity, 0);
+        END IF;
+        IF diff > 0 THEN
+            INSERT INTO book_copies (book_id)
+            SELECT NEW.book_id FROM generate_series(1, diff);
+        ELSIF diff < 0 THEN
+            UPDATE book_copies
+            SET status = 'withdrawn'
+            WHERE copy_id IN (
+                SELECT copy_id FROM book_copies
+                WHERE book_id = NEW.book_id AND status = 'available'
+                ORDER BY copy_id DESC
+                LIMIT -diff
+                FOR UPDATE SKIP LOCKED
+            );
+        END IF;
+        IF diff <> 0 THEN
+            UPDATE books SET quantity = quantity - diff WHERE book_id = NEW.book_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_sync_book_copies
+    AFTER INSERT OR UPDATE OF quantity ON books
+    FOR EACH ROW
+    WHEN (pg_trigger_depth() = 0)
+    EXECUTE FUNCTION sync_book_copies();
+    """,
+
+    # Выдача берет свободный экземпляр; SKIP LOCKED — параллельные выдачи одной книги
+    # берут разные экземпляры, не дожидаясь друг друга. Нет свободных — SQLSTATE LB001
+    """
+    CREATE OR REPLACE FUNCTION claim_book_copy()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.return_date IS NULL THEN
+            IF NEW.copy_id IS NULL THEN
+                SELECT copy_id INTO NEW.copy_id
+                FROM book_copies
+                WHERE book_id = NEW.book_id AND status = 'available'
+                ORDER BY copy_id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED;
+            END IF;
+            UPDATE book_copies
+            SET status = 'on_loan'
+            WHERE copy_id = NEW.copy_id AND book_id = NEW.book_id AND status = 'available';
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Book % not available', NEW.book_id USING ERRCODE = 'LB001';
+            END IF;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_claim_book_copy
+    BEFORE INSERT ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION claim_book_copy();
+    """,
+
+    # Возврат освобождает экземпляр, отмена возврата берет свободный заново
+    """
+    CREATE OR REPLACE FUNCTION return_book_copy()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF OLD.return_date IS NULL AND NEW.return_date IS NOT NULL THEN
+            UPDATE book_copies SET status = 'available'
+            WHERE copy_id = OLD.copy_id AND status = 'on_loan';
+        ELSIF OLD.return_date IS NOT NULL AND NEW.return_date IS NULL THEN
+            NEW.copy_id := NULL;
+            SELECT copy_id INTO NEW.copy_id
+            FROM book_copies
+            WHERE book_id = NEW.book_id AND status = 'available'
+            ORDER BY copy_id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED;
+            UPDATE book_copies SET status = 'on_loan' WHERE copy_id = NEW.copy_id;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Book % not available', NEW.book_id USING ERRCODE = 'LB001';
+            END IF;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_return_book_copy
+    BEFORE UPDATE OF return_date ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION return_book_copy();
+    """,
+
+    # Удаление активной подписки освобождает экземпляр
+    """
+    CREATE OR REPLACE FUNCTION release_book_copy()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF OLD.return_date IS NULL THEN
+            UPDATE book_copies SET status = 'available'
+            WHERE copy_id = OLD.copy_id AND status = 'on_loan';
+        END IF;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_release_book_copy
+    AFTER DELETE ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION release_book_copy();
+    """,
+]
+
+COPY_TRIGGERS = {
+    "trg_book_copies_available": ("book_copies", "book_copies_available_delta"),
+    "trg_sync_book_copies": ("books", "sync_book_copies"),
+    "trg_claim_book_copy": ("subscriptions", "claim_book_copy"),
+    "trg_return_book_copy": ("subscriptions", "return_book_copy"),
+    "trg_release_book_copy": ("subscriptions", "release_book_copy"),
+}
+
+# Триггеры счетчика books.quantity из 7b1e4d2c9f60 (восстанавливаются при откате)
+QUANTITY_TRIGGERS_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION decrease_book_quantity()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.return_date IS NULL THEN
+            UPDATE books
+            SET quantity = quantity - 1
+            WHERE book_id = NEW.book_id AND quantity > 0;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Book % not available', NEW.book_id USING ERRCODE = 'LB001';
+            END IF;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_decrease_quantity
+    AFTER INSERT ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION decrease_book_quantity();
+    """,
+    """
+    CREATE OR REPLACE FUNCTION increase_book_quantity()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF OLD.return_date IS NULL THEN
+            UPDATE books
+            SET quantity = quantity + 1
+            WHERE book_id = OLD.book_id;
+        END IF;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_increase_quantity
+    AFTER DELETE ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION increase_book_quantity();
+    """,
+    """
+    CREATE OR REPLACE FUNCTION return_book_quantity()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF OLD.return_date IS NULL AND NEW.return_date IS NOT NULL THEN
+            UPDATE books
+            SET quantity = quantity + 1
+            WHERE book_id = OLD.book_id;
+        ELSIF OLD.return_date IS NOT NULL AND NEW.return_date IS NULL THEN
+            UPDATE books
+            SET quantity = quantity - 1
+            WHERE book_id = NEW.book_id AND quantity > 0;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Book % not available', NEW.book_id USING ERRCODE = 'LB001';
+            END IF;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER trg_return_quantity
+    AFTER UPDATE OF return_date ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION return_book_quantity();
+    """,
+]
+
+QUANTITY_TRIGGERS = {
+    "trg_decrease_quantity": "decrease_book_quantity",
+    "trg_increase_quantity": "increase_book_quantity",
+    "trg_return_quantity": "return_book_quantity",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE SEQUENCE IF NOT EXISTS book_copies_barcode_seq")
+    op.create_table('book_copies',
+    sa.Column('copy_id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('barcode', sa.String(length=32), server_default=sa.text("'BC' || lpad(nextval('book_copies_barcode_seq')::text, 10, '0')"), nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='available', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.book_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('copy_id')
+    )
+    op.create_index(op.f('ix_book_copies_copy_id'), 'book_copies', ['copy_id'], unique=False)
+    op.create_index('ux_book_copies_barcode', 'book_copies', ['barcode'], unique=True)
+    op.create_index('ix_book_copies_book_id', 'book_copies', ['book_id'], unique=False)
+    op.create_index('ix_book_copies_available', 'book_copies', ['book_id', 'copy_id'], unique=False, postgresql_where=sa.text("status = 'available'"))
+
+    op.add_column('subscriptions', sa.Column('copy_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('subscriptions_copy_id_fkey', 'subscriptions', 'book_copies', ['copy_id'], ['copy_id'], ondelete='SET NULL')
+    op.create_index('ix_subscriptions_copy_id', 'subscriptions', ['copy_id'], unique=False)
+
+    # До новых триггеров: quantity уже учитывает и выданные, и свободные экземпляры
+    for sql in BACKFILL_SQL:
+        op.execute(sql)
+
+    for trigger, function in QUANTITY_TRIGGERS.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON subscriptions")
+        op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+    for sql in COPY_TRIGGERS_SQL:
+        op.execute(sql)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for trigger, (table, function) in COPY_TRIGGERS.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+    for sql in QUANTITY_TRIGGERS_SQL:
+        op.execute(sql)
+
+    op.drop_index('ix_subscriptions_copy_id', table_name='subscriptions')
+    op.drop_constraint('subscriptions_copy_id_fkey', 'subscriptions', type_='foreignkey')
+    op.drop_column('subscriptions', 'copy_id')
+    op.drop_index('ix_book_copies_available', table_name='book_copies')
+    op.drop_index('ix_book_copies_book_id', table_name='book_copies')
+    op.drop_index('ux_book_copies_barcode', table_name='book_copies')
+    op.drop_index(op.f('ix_book_copies_copy_id'), table_name='book_copies')
+    op.drop_table('book_copies')
+    op.execute("DROP SEQUENCE IF EXISTS book_copies_barcode_seq")
@@ -0,0 +1,58 @@
+"""search indexes
+
+Revision ID: ff6f6cc854e1
+Revises: 89f48cc347aa
+Create Date: 2026-10-18 11:03:27.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ff6f6cc854e1'
+down_revision: Union[str, Sequence[str], None] = '89f48cc347aa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Колонки параметра search в роутерах (app/api/routes/*_SEARCH_COLUMNS)
+SEARCH_COLUMNS = {
+    'books': ['title', 'publisher', 'publish_place'],
+    'authors': ['full_name', 'country'],
+    'readers': ['full_name', 'address', 'phone'],
+    'libraries': ['name', 'address', 'phone'],
+}
+
+
+def _document(columns):
+    # Должно совпадать с app.api.search.search_document
+    return " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    with op.get_context().autocommit_block():
+        for table, columns in SEARCH_COLUMNS.items():
+            for column in columns:
+                op.create_index(
+                    f'ix_{table}_{column}_trgm', table, [column], unique=False,
+                    postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                    postgresql_concurrently=True, if_not_exists=True,
+                )
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search_tsv ON {table} "
+                f"USING gin (to_tsvector('simple'::regconfig, {_document(columns)}))"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table, columns in SEARCH_COLUMNS.items():
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_search_tsv")
+            for column in columns:
+                op.drop_index(f'ix_{table}_{column}_trgm', table_name=table, postgresql_concurrently=True, if_exists=True)
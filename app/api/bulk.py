@@ -0,0 +1,115 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, Tuple, Union
+
+BULK_FORMATS = ("csv", "ndjson")
+
+Record = Union[Dict[str, Any], ValueError]
+
+
+# Предел длины строки и записи CSV (с переносами в кавычках): незакрытая кавычка
+# или файл без переводов строк не копятся в памяти до конца тела
+MAX_RECORD_LENGTH = 1024 * 1024
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Union[str, LineTooLong]]:
+    """Строки из потока байтов тела запроса без чтения его целиком.
+
+    Строка длиннее MAX_RECORD_LENGTH пропускается до перевода строки, вместо нее — LineTooLong.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    skipping = False
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            yield line.rstrip("\r")
+        if len(buffer) > MAX_RECORD_LENGTH:
+            if not skipping:
+                skipping = True
+                yield LineTooLong(f"Line exceeds {MAX_RECORD_LENGTH} characters")
+            buffer = ""
+    buffer += decoder.decode(b"", final=True)
+    if buffer and not skipping:
+        yield buffer.rstrip("\r")
+
+
+async def _iter_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Record]]:
+    header = None
+    row_number = 0
+    line_number = 0
+    pending = ""
+    pending_start = 0
+    async for line in iter_lines(stream):
+        line_number += 1
+        if isinstance(line, LineTooLong):
+            pending = ""
+            row_number += 1
+            yield row_number, ValueError(f"{line} (line {line_number})")
+            continue
+        if not pending:
+            pending_start = line_number
+        pending = f"{pending}\n{line}" if pending else line
+        # Незакрытая кавычка: поле продолжается на следующей строке
+        if pending.count('"') % 2:
+            if len(pending) > MAX_RECORD_LENGTH:
+                # Запись отбрасывается, разбор продолжается со следующей строки
+                pending = ""
+                row_number += 1
+                yield row_number, ValueError(f"Unterminated quoted field starting at line {pending_start}")
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        # Пустое поле — значение по умолчанию из схемы
+        yield row_number, {name: value for name, value in zip(header, values) if value != ""}
+
+    if pending:
+        yield row_number + 1, ValueError(f"Unterminated quoted field starting at line {pending_start}")
+
+
+async def _iter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Record]]:
+    row_number = 0
+    async for line in iter_lines(stream):
+        if isinstance(line, LineTooLong):
+            row_number += 1
+            yield row_number, line
+            continue
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield row_number, ValueError("Expected a JSON object")
+            continue
+        yield row_number, record
+
+
+def parse_records(stream: AsyncIterator[bytes], file_format: str) -> AsyncIterator[Tuple[int, Record]]:
+    """(номер строки данных, запись или ошибка разбора) из CSV с заголовком или NDJSON"""
+    if file_format == "ndjson":
+        return _iter_ndjson(stream)
+    return _iter_csv(stream)
@@ -1,15 +1,39 @@
+import time
 from typing import Annotated, AsyncGenerator
-from fastapi import Depends
+from fastapi import Depends, Request, Response
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import Session
+from app.core.config import REPLICA_STICKY_SECONDS
+from app.db.session import ReadSession, Session, choose_read_engine
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+# Cookie: до какого момента клиент читает с основного сервера после своей записи
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+async def get_db(request: Request, response: Response) -> AsyncGenerator[AsyncSession, None]:
+    if request.method not in ("GET", "HEAD") and REPLICA_STICKY_SECONDS:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            str(int(time.time()) + REPLICA_STICKY_SECONDS),
+            max_age=REPLICA_STICKY_SECONDS,
+            httponly=True,
+        )
     async with Session() as session:
         yield session
 
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Сессия для чтения: реплика, либо основной сервер сразу после записи этого клиента"""
+    try:
+        read_primary = int(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        read_primary = False
+
+    session = Session() if read_primary else ReadSession(bind=choose_read_engine())
+    async with session:
+        yield session
+
 
 
 # Для аннотаций в роутерах
-DBSession = Annotated[AsyncSession, Depends(get_db)]
\ No newline at end of file
+DBSession = Annotated[AsyncSession, Depends(get_db)]
+ReadDBSession = Annotated[AsyncSession, Depends(get_read_db)]
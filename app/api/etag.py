@@ -0,0 +1,52 @@
+import hashlib
+from typing import Sequence
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import ReadDBSession
+from app.core.cache import bind_cache_versions
+from app.db.session import VERSIONED_TABLES
+
+ETAG_TABLES = set(VERSIONED_TABLES) | {"stats"}
+
+
+async def get_table_versions(db: AsyncSession, tables: Sequence[str]) -> str:
+    """Текущие версии таблиц (суммы счетчиков table_versions) одним запросом.
+
+    Счетчики меняются в транзакциях записи, поэтому на реплике версия
+    не обгоняет и не отстает от воспроизведенных данных.
+    """
+    result = await db.execute(
+        text("SELECT table_name, sum(version) FROM table_versions WHERE table_name = ANY(:tables) GROUP BY table_name"),
+        {"tables": list(tables)}
+    )
+    versions = dict(result.all())
+    return ".".join(str(versions.get(table, 0)) for table in tables)
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def etag_dependency(*tables: str):
+    """ETag по версиям таблиц; при совпадении If-None-Match отвечает 304 до выполнения обработчика"""
+    unknown = set(tables) - ETAG_TABLES
+    if unknown:
+        raise ValueError(f"Unknown ETag tables: {', '.join(sorted(unknown))}")
+
+    async def check_etag(request: Request, response: Response, db: ReadDBSession) -> None:
+        versions = await get_table_versions(db, tables)
+        # Тело из кэша процесса — только прочитанное не раньше этих версий
+        bind_cache_versions(versions)
+        digest = hashlib.sha1(f"{request.url.path}?{request.url.query}|{versions}".encode()).hexdigest()
+        etag = f'"{digest}"'
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+    return Depends(check_etag)
@@ -0,0 +1,43 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import InstrumentedAttribute, joinedload
+
+# имя в expand= -> (связь многие-к-одному, схема вложенного объекта)
+Relations = Dict[str, Tuple[InstrumentedAttribute, Type[BaseModel]]]
+
+
+def parse_expand(expand: Optional[str], relations: Relations) -> List[str]:
+    if not expand:
+        return []
+    names = [name.strip() for name in expand.split(",") if name.strip()]
+    unknown = [name for name in names if name not in relations]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown expand: {', '.join(unknown)}. Allowed: {', '.join(relations)}"
+        )
+    return list(dict.fromkeys(names))
+
+
+def expand_options(names: Sequence[str], relations: Relations) -> list:
+    """joinedload для запрошенных связей: связанные объекты приходят тем же запросом"""
+    return [joinedload(relations[name][0]) for name in names]
+
+
+def serialize_expanded(
+    items: Sequence[Any],
+    schema: Type[BaseModel],
+    names: Sequence[str],
+    relations: Relations,
+) -> List[Dict[str, Any]]:
+    """Объекты в схеме списка плюс вложенные связанные объекты (только запрошенные ключи)"""
+    result = []
+    for item in items:
+        data = schema.model_validate(item).model_dump()
+        for name in names:
+            related = getattr(item, name)
+            data[name] = relations[name][1].model_validate(related).model_dump() if related is not None else None
+        result.append(data)
+    return result
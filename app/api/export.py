@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from app.db.session import ReadSession, choose_read_engine
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Строк на одну выборку из серверного курсора и на один кусок ответа
+EXPORT_BATCH_SIZE = 1000
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+async def _stream_rows(query: Select, file_format: str) -> AsyncIterator[bytes]:
+    # Своя сессия: тело ответа отдается уже после выхода из обработчика
+    async with ReadSession(bind=choose_read_engine()) as session:
+        result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+
+        if file_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            async for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+            return
+
+        async for rows in result.partitions():
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n"
+                for row in rows
+            ).encode()
+
+
+def export_response(query: Select, file_format: str, filename: str) -> StreamingResponse:
+    """Потоковая выгрузка результата запроса в NDJSON/CSV через серверный курсор"""
+    return StreamingResponse(
+        _stream_rows(query, file_format),
+        media_type=EXPORT_FORMATS[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{file_format}"'},
+    )
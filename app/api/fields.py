@@ -0,0 +1,42 @@
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql import Select
+
+from app.db.base_class import Base
+
+# Строка ответа с ?fields=: только запрошенные поля, без валидации полной схемой
+PartialRow = Dict[str, Any]
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel], model: Type[Base]) -> List[str]:
+    """Разобрать fields=a,b,c; допустимы поля схемы ответа, которые являются колонками модели"""
+    if not fields:
+        return []
+    allowed = [name for name in schema.model_fields if name in model.__mapper__.column_attrs]
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return list(dict.fromkeys(names))
+
+
+def select_fields(query: Select, model: Type[Base], names: List[str], *extra: InstrumentedAttribute) -> Select:
+    """Тот же запрос, но только с нужными колонками: строки вместо ORM-объектов в identity map.
+
+    extra — колонки, нужные обработчику помимо полей ответа (например, для курсора).
+    """
+    columns = {name: getattr(model, name) for name in names}
+    for column in extra:
+        columns.setdefault(column.key, column)
+    return query.with_only_columns(*columns.values())
+
+
+def project_row(row: Row, names: List[str]) -> PartialRow:
+    return {name: getattr(row, name) for name in names}
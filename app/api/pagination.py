@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql import Select
+
+# sort_by -> (колонка, по убыванию)
+SortSpec = Dict[str, Tuple[InstrumentedAttribute, bool]]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load_value(column: InstrumentedAttribute, value: Any) -> Any:
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(sort_by: str, value: Any, pk: int) -> str:
+    payload = json.dumps({"s": sort_by, "v": _dump_value(value), "id": pk}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, column: InstrumentedAttribute) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["s"] != sort_by:
+            raise ValueError("sort mismatch")
+        return _load_value(column, payload["v"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def resolve_sort(sort_specs: SortSpec, sort_by: Optional[str], default: str) -> str:
+    return sort_by if sort_by in sort_specs else default
+
+
+def _after(column, pk, descending: bool, value: Any, last_pk: int):
+    """Условие "строго после (value, last_pk)" с учетом NULL (Postgres: NULLS LAST для ASC, NULLS FIRST для DESC)"""
+    if column is pk:
+        return pk < last_pk if descending else pk > last_pk
+
+    if not column.expression.nullable and value is not None:
+        # Сравнение строк: индекс по колонке читается с позиции курсора, без OR по всему хвосту
+        row = tuple_(column, pk)
+        return row < (value, last_pk) if descending else row > (value, last_pk)
+
+    pk_after = pk < last_pk if descending else pk > last_pk
+    if descending:
+        if value is None:
+            return or_(and_(column.is_(None), pk_after), column.is_not(None))
+        return or_(column < value, and_(column == value, pk_after))
+    if value is None:
+        return and_(column.is_(None), pk_after)
+    return or_(column > value, and_(column == value, pk_after), column.is_(None))
+
+
+def paginate(
+    query: Select,
+    sort_specs: SortSpec,
+    sort_by: str,
+    pk: InstrumentedAttribute,
+    skip: int,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Select:
+    """Сортировка с уникальным ключом и постраничная выборка: по курсору (keyset) или по смещению"""
+    column, descending = sort_specs[sort_by]
+
+    if cursor:
+        value, last_pk = decode_cursor(cursor, sort_by, column)
+        query = query.where(_after(column, pk, descending, value, last_pk))
+
+    if column is pk:
+        query = query.order_by(pk.desc() if descending else pk)
+    else:
+        query = query.order_by(
+            column.desc() if descending else column,
+            pk.desc() if descending else pk,
+        )
+
+    if not cursor:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def paginate_ranked(query: Select, rank, pk: InstrumentedAttribute, skip: int, limit: int) -> Select:
+    """Сортировка по релевантности поиска; курсор не поддерживается, только смещение"""
+    return query.order_by(rank.desc(), pk).offset(skip).limit(limit)
+
+
+def cursor_columns(sort_specs: SortSpec, sort_by: Optional[str], pk: InstrumentedAttribute) -> List[InstrumentedAttribute]:
+    """Колонки, которые set_next_cursor читает с последней строки"""
+    if sort_by in sort_specs:
+        return [sort_specs[sort_by][0], pk]
+    return [pk]
+
+
+def set_next_cursor(
+    response: Response,
+    items: Sequence[Any],
+    sort_specs: SortSpec,
+    sort_by: Optional[str],
+    pk: InstrumentedAttribute,
+    limit: int,
+) -> None:
+    """Передать курсор следующей страницы в заголовке X-Next-Cursor"""
+    if sort_by not in sort_specs or not items or len(items) < limit:
+        return
+    column, _ = sort_specs[sort_by]
+    last = items[-1]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+        sort_by, getattr(last, column.key), getattr(last, pk.key)
+    )
@@ -1,60 +1,116 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from app.api.deps import DBSession
+from app.api.bulk import BULK_FORMATS, parse_records
+from app.api.deps import DBSession, ReadDBSession
+from app.api.etag import etag_dependency
+from app.api.fields import PartialRow, parse_fields, project_row, select_fields
+from app.api.pagination import cursor_columns, paginate, paginate_ranked, resolve_sort, set_next_cursor
+from app.api.search import apply_search
+from app.core.cache import cached, invalidate
+from app.core.config import CACHE_REFERENCE_TTL
+from app.core.query_budget import query_budget
 from app.crud import author as author_crud
+from app.crud.bulk import bulk_import
 from app.schemas import author as author_schemas
 from app.models.author import Author
 
 router = APIRouter(prefix="/api/authors", tags=["authors"])
 
+AUTHOR_SEARCH_COLUMNS = (Author.full_name, Author.country)
+
+AUTHOR_SORTS = {
+    "full_name": (Author.full_name, False),
+    "birth_year": (Author.birth_year, True),
+    "country": (Author.country, False),
+    "author_id": (Author.author_id, False),
+}
+
 @router.post("/", response_model=author_schemas.Author)
 async def create_author(author: author_schemas.AuthorCreate, db: DBSession):
-    return await author_crud.create_author(db=db, author=author)
+    db_author = await author_crud.create_author(db=db, author=author)
+    invalidate("authors")
+    return db_author
 
-@router.get("/", response_model=List[author_schemas.Author])
-async def read_authors(
+@router.post("/bulk")
+async def bulk_import_authors(
+    request: Request,
     db: DBSession,
+    file_format: str = Query("csv", alias="format", description="csv (с заголовком) или ndjson"),
+    max_errors: int = Query(1000, description="Сколько ошибок строк вернуть в отчете"),
+):
+    """Массовая загрузка авторов из CSV/NDJSON в теле запроса (потоково, пакетами)"""
+    if file_format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
+    
+    report = await bulk_import(
+        db, parse_records(request.stream(), file_format), author_schemas.AuthorCreate, Author, conflict_columns=("full_name",),
+        max_errors=max_errors
+    )
+    invalidate("authors")
+    return report
+
+@router.get("/", response_model=List[Union[author_schemas.Author, PartialRow]], dependencies=[etag_dependency("authors")])
+@query_budget(2)
+@cached("authors", CACHE_REFERENCE_TTL)
+async def read_authors(
+    db: ReadDBSession,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     search: Optional[str] = Query(None),
+    search_mode: Optional[str] = Query("contains", description="Режим поиска: contains, prefix, fuzzy, fulltext"),
     sort_by: Optional[str] = Query(None),
     country: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
     
 ):
+    field_names = parse_fields(fields, author_schemas.Author, Author)
     query = select(Author)
     
-    if search:
-        query = query.where(
-            Author.full_name.ilike(f"%{search}%") |
-            Author.country.ilike(f"%{search}%")
-        )
+    query, rank = apply_search(query, AUTHOR_SEARCH_COLUMNS, search, search_mode)
     
     if country:
         query = query.where(Author.country.ilike(f"%{country}%"))
     
-    if sort_by:
-        if sort_by == "full_name":
-            query = query.order_by(Author.full_name)
-        elif sort_by == "birth_year":
-            query = query.order_by(Author.birth_year.desc())
-        elif sort_by == "country":
-            query = query.order_by(Author.country)
-        elif sort_by == "author_id":
-            query = query.order_by(Author.author_id)
+    if rank is not None and not sort_by:
+        query = paginate_ranked(query, rank, Author.author_id, skip, limit)
     else:
-        query = query.order_by(Author.author_id)
+        sort_by = resolve_sort(AUTHOR_SORTS, sort_by, "author_id")
+        query = paginate(query, AUTHOR_SORTS, sort_by, Author.author_id, skip, limit, cursor)
     
-    query = query.offset(skip).limit(limit)
+    if field_names:
+        query = select_fields(query, Author, field_names, *cursor_columns(AUTHOR_SORTS, sort_by, Author.author_id))
+        result = await db.execute(query)
+        rows = result.all()
+        set_next_cursor(response, rows, AUTHOR_SORTS, sort_by, Author.author_id, limit)
+        return [project_row(row, field_names) for row in rows]
     
     result = await db.execute(query)
     authors = result.scalars().all()
+    set_next_cursor(response, authors, AUTHOR_SORTS, sort_by, Author.author_id, limit)
     return authors
 
-@router.get("/{author_id}", response_model=author_schemas.Author)
-async def read_author(author_id: int, db: DBSession):
+@router.get("/{author_id}", response_model=Union[author_schemas.Author, PartialRow], dependencies=[etag_dependency("authors")])
+@query_budget(2)
+@cached("authors", CACHE_REFERENCE_TTL)
+async def read_author(
+    author_id: int,
+    db: ReadDBSession,
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
+):
+    field_names = parse_fields(fields, author_schemas.Author, Author)
+    if field_names:
+        query = select_fields(select(Author).where(Author.author_id == author_id), Author, field_names)
+        result = await db.execute(query)
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Author not found")
+        return project_row(row, field_names)
+    
     db_author = await author_crud.get_author(db, author_id=author_id)
     if db_author is None:
         raise HTTPException(status_code=404, detail="Author not found")
@@ -76,6 +132,7 @@ async def update_author(
     
     await db.commit()
     await db.refresh(db_author)
+    invalidate("authors", "books", "reports")
     return db_author
 
 @router.delete("/{author_id}")
@@ -86,4 +143,5 @@ async def delete_author(author_id: int, db: DBSession):
     
     await db.delete(db_author)
     await db.commit()
+    invalidate("authors", "books", "reports")
     return {"message": "Author deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+
+from app.api.deps import DBSession, ReadDBSession
+from app.core.cache import invalidate
+from app.core.query_budget import query_budget
+from app.crud import book_copy as book_copy_crud
+from app.crud import hold as hold_crud
+from app.schemas import book_copy as book_copy_schemas
+
+router = APIRouter(prefix="/api/books", tags=["copies"])
+
+@router.get("/{book_id}/copies", response_model=List[book_copy_schemas.BookCopy])
+@query_budget(1)
+async def read_book_copies(
+    book_id: int,
+    db: ReadDBSession,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    """Экземпляры книги (status: available, on_loan, withdrawn)"""
+    return await book_copy_crud.get_book_copies(db, book_id, status, skip, limit)
+
+@router.post("/{book_id}/copies", response_model=List[book_copy_schemas.BookCopy])
+async def add_book_copies(book_id: int, copies: book_copy_schemas.BookCopiesCreate, db: DBSession):
+    """Поступление экземпляров; quantity книги растет на их число.
+    Ожидающим в очереди броней новые экземпляры выдаются сразу, по порядку очереди"""
+    try:
+        created = await book_copy_crud.add_book_copies(
+            db, book_id, copies, after_insert=hold_crud.allocate_available_copies
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404 if str(e) == "Book not found" else 400, detail=str(e))
+    invalidate("books", "reports")
+    return created
+
+@router.post("/copies/{copy_id}/withdraw", response_model=book_copy_schemas.BookCopy)
+async def withdraw_book_copy(copy_id: int, db: DBSession):
+    """Списать свободный экземпляр"""
+    withdrawn = await book_copy_crud.withdraw_book_copy(db, copy_id)
+    if withdrawn is None:
+        if await book_copy_crud.get_book_copy(db, copy_id) is None:
+            raise HTTPException(status_code=404, detail="Copy not found")
+        raise HTTPException(status_code=400, detail="Copy is not available")
+    invalidate("books", "reports")
+    return withdrawn
@@ -1,58 +1,120 @@
-from fastapi import APIRouter, HTTPException, Query
+import logging
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from app.api.deps import DBSession
+from app.api.bulk import BULK_FORMATS, parse_records
+from app.api.deps import DBSession, ReadDBSession
+from app.api.etag import etag_dependency
+from app.api.expand import expand_options, parse_expand, serialize_expanded
+from app.api.export import EXPORT_FORMATS, export_response
+from app.api.fields import PartialRow, parse_fields, project_row, select_fields
+from app.api.pagination import cursor_columns, paginate, paginate_ranked, resolve_sort, set_next_cursor
+from app.api.search import apply_search
+from app.api.serialization import json_rows_response
+from app.core.cache import cached, invalidate
+from app.core.config import CACHE_BOOKS_TTL
+from app.core.query_budget import query_budget
 from app.crud import book as book_crud
+from app.crud import book_copy as book_copy_crud
+from app.crud import hold as hold_crud
+from app.crud.bulk import bulk_import
+from app.schemas import author as author_schemas
 from app.schemas import book as book_schemas
+from app.schemas import library as library_schemas
+from app.schemas import topic as topic_schemas
 from app.models.book import Book
+from app.models.author import Author
+from app.models.library import Library
+from app.models.topic import Topic
 
 router = APIRouter(prefix="/api/books", tags=["books"])
 
+logger = logging.getLogger(__name__)
+
+BOOK_SEARCH_COLUMNS = (Book.title, Book.publisher, Book.publish_place)
+
+BOOK_SORTS = {
+    "title": (Book.title, False),
+    "price": (Book.price, True),
+    "publish_year": (Book.publish_year, True),
+    "quantity": (Book.quantity, True),
+    "book_id": (Book.book_id, False),
+}
+
+BOOK_EXPAND = {
+    "author": (Book.author, author_schemas.Author),
+    "topic": (Book.topic, topic_schemas.Topic),
+    "library": (Book.library, library_schemas.Library),
+}
+
 @router.post("/", response_model=book_schemas.Book)
 async def create_book(book: book_schemas.BookCreate, db: DBSession):
-    print("🎯 Received book creation request")
-    print(f"📖 Book data: {book.dict()}")
-    
-    # Валидация обязательных полей
-    if not book.library_id:
-        print("❌ Missing library_id")
-    if not book.topic_id:
-        print("❌ Missing topic_id") 
-    if not book.author_id:
-        print("❌ Missing author_id")
+    logger.debug("Book creation request: %s", book.dict())
     
     try:
         result = await book_crud.create_book(db=db, book=book)
-        print("✅ Book created successfully")
+        invalidate("books", "reports")
         return result
     except Exception as e:
-        print(f"❌ Error creating book: {str(e)}")
+        logger.warning("Error creating book: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/", response_model=List[book_schemas.Book])
-async def read_books(
+@router.post("/bulk")
+async def bulk_import_books(
+    request: Request,
     db: DBSession,
+    file_format: str = Query("csv", alias="format", description="csv (с заголовком) или ndjson"),
+    max_errors: int = Query(1000, description="Сколько ошибок строк вернуть в отчете"),
+):
+    """Массовая загрузка книг из CSV/NDJSON в теле запроса (потоково, пакетами)"""
+    if file_format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
+    
+    report = await bulk_import(
+        db, parse_records(request.stream(), file_format), book_schemas.BookCreate, Book,
+        foreign_keys={"library_id": Library.library_id, "topic_id": Topic.topic_id, "author_id": Author.author_id},
+        max_errors=max_errors,
+        after_insert=book_crud.add_initial_copies
+    )
+    invalidate("books", "reports")
+    return report
+
+@router.get(
+    "/",
+    response_model=List[Union[book_schemas.BookExpanded, PartialRow]],
+    response_model_exclude_unset=True,
+    dependencies=[etag_dependency("books", "authors", "topics", "libraries")],
+)
+@query_budget(2)
+@cached("books", CACHE_BOOKS_TTL)
+async def read_books(
+    db: ReadDBSession,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     search: Optional[str] = Query(None),
+    search_mode: Optional[str] = Query("contains", description="Режим поиска: contains, prefix, fuzzy, fulltext"),
     sort_by: Optional[str] = Query(None),
     library_id: Optional[int] = Query(None),
     topic_id: Optional[int] = Query(None),
     author_id: Optional[int] = Query(None),
     min_price: Optional[float] = Query(None),
     max_price: Optional[float] = Query(None),
+    expand: Optional[str] = Query(None, description="Вложить связанные объекты: author, topic, library (через запятую)"),
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
     
 ):
-    query = select(Book)
+    field_names = parse_fields(fields, book_schemas.Book, Book)
+    if field_names and expand:
+        raise HTTPException(status_code=400, detail="fields cannot be combined with expand")
+    expand_names = parse_expand(expand, BOOK_EXPAND)
+    query = select(Book).options(*expand_options(expand_names, BOOK_EXPAND))
     
-    if search:
-        query = query.where(
-            Book.title.ilike(f"%{search}%") |
-            Book.publisher.ilike(f"%{search}%") |
-            Book.publish_place.ilike(f"%{search}%")
-        )
+    query, rank = apply_search(query, BOOK_SEARCH_COLUMNS, search, search_mode)
     
     if library_id:
         query = query.where(Book.library_id == library_id)
@@ -69,28 +131,41 @@ async def read_books(
     if max_price is not None:
         query = query.where(Book.price <= max_price)
     
-    if sort_by:
-        if sort_by == "title":
-            query = query.order_by(Book.title)
-        elif sort_by == "price":
-            query = query.order_by(Book.price.desc())
-        elif sort_by == "publish_year":
-            query = query.order_by(Book.publish_year.desc())
-        elif sort_by == "quantity":
-            query = query.order_by(Book.quantity.desc())
-        elif sort_by == "book_id":
-            query = query.order_by(Book.book_id)
+    if rank is not None and not sort_by:
+        query = paginate_ranked(query, rank, Book.book_id, skip, limit)
     else:
-        query = query.order_by(Book.book_id)
+        sort_by = resolve_sort(BOOK_SORTS, sort_by, "book_id")
+        query = paginate(query, BOOK_SORTS, sort_by, Book.book_id, skip, limit, cursor)
     
-    query = query.offset(skip).limit(limit)
+    if field_names:
+        query = select_fields(query, Book, field_names, *cursor_columns(BOOK_SORTS, sort_by, Book.book_id))
+        result = await db.execute(query)
+        rows = result.all()
+        set_next_cursor(response, rows, BOOK_SORTS, sort_by, Book.book_id, limit)
+        return [project_row(row, field_names) for row in rows]
     
     result = await db.execute(query)
     books = result.scalars().all()
-    return books
+    set_next_cursor(response, books, BOOK_SORTS, sort_by, Book.book_id, limit)
+    return serialize_expanded(books, book_schemas.Book, expand_names, BOOK_EXPAND)
 
-@router.get("/{book_id}", response_model=book_schemas.Book)
-async def read_book(book_id: int, db: DBSession):
+@router.get("/{book_id}", response_model=Union[book_schemas.Book, PartialRow], dependencies=[etag_dependency("books")])
+@query_budget(2)
+@cached("books", CACHE_BOOKS_TTL)
+async def read_book(
+    book_id: int,
+    db: ReadDBSession,
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
+):
+    field_names = parse_fields(fields, book_schemas.Book, Book)
+    if field_names:
+        query = select_fields(select(Book).where(Book.book_id == book_id), Book, field_names)
+        result = await db.execute(query)
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return project_row(row, field_names)
+    
     db_book = await book_crud.get_book(db, book_id=book_id)
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
@@ -106,12 +181,18 @@ async def update_book(
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
     
-    # Обновление полей
-    for field, value in book.dict().items():
+    # Обновление полей; quantity — через поступление или списание экземпляров
+    data = book.dict()
+    quantity = data.pop("quantity")
+    for field, value in data.items():
         setattr(db_book, field, value)
+    await book_copy_crud.set_available_copies(db, book_id, quantity)
+    # Поступившие экземпляры — сначала очереди броней
+    await hold_crud.allocate_available_copies(db, book_id)
     
     await db.commit()
     await db.refresh(db_book)
+    invalidate("books", "reports")
     return db_book
 
 @router.delete("/{book_id}")
@@ -122,12 +203,35 @@ async def delete_book(book_id: int, db: DBSession):
     
     await db.delete(db_book)
     await db.commit()
+    invalidate("books", "reports")
     return {"message": "Book deleted successfully"}
 
-@router.get("/detailed/", response_model=List[book_schemas.BookDetailed])
-async def read_books_detailed(db: DBSession):
-    return await book_crud.get_books_detailed(db)
+@router.get("/detailed/", response_model=List[book_schemas.BookDetailed], dependencies=[etag_dependency("books", "authors", "topics", "libraries")])
+@query_budget(2)
+@cached("books", CACHE_BOOKS_TTL)
+async def read_books_detailed(db: ReadDBSession, response: Response):
+    return json_rows_response(await book_crud.get_books_detailed(db), response)
 
-@router.get("/list/", response_model=List[book_schemas.BooksList])
-async def read_books_list(db: DBSession):
-    return await book_crud.get_books_list(db)
\ No newline at end of file
+@router.get("/list/", response_model=List[book_schemas.BooksList], dependencies=[etag_dependency("books")])
+@query_budget(2)
+@cached("books", CACHE_BOOKS_TTL)
+async def read_books_list(db: ReadDBSession, response: Response):
+    return json_rows_response(await book_crud.get_books_list(db), response)
+
+@router.get("/detailed/export")
+async def export_books_detailed(
+    file_format: str = Query("ndjson", alias="format", description="ndjson или csv")
+):
+    """Потоковая выгрузка подробного списка книг"""
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
+    return export_response(book_crud.books_detailed_query(), file_format, "books_detailed")
+
+@router.get("/list/export")
+async def export_books_list(
+    file_format: str = Query("ndjson", alias="format", description="ndjson или csv")
+):
+    """Потоковая выгрузка краткого списка книг"""
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
+    return export_response(book_crud.books_list_query(), file_format, "books_list")
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException
+from typing import List
+
+from app.api.deps import DBSession, ReadDBSession
+from app.core.query_budget import query_budget
+from app.crud import hold as hold_crud
+from app.schemas import hold as hold_schemas
+
+router = APIRouter(prefix="/api/holds", tags=["holds"])
+
+@router.post("/", response_model=hold_schemas.Hold)
+async def create_hold(hold: hold_schemas.HoldCreate, db: DBSession):
+    """Встать в очередь на книгу.
+
+    Свободный экземпляр выдается первому в очереди автоматически — сразу,
+    при возврате или поступлении новых экземпляров; повторять попытки выдачи
+    не нужно, статус брони станет fulfilled.
+    """
+    try:
+        return await hold_crud.create_hold(db, hold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{hold_id}", response_model=hold_schemas.Hold)
+@query_budget(2)
+async def read_hold(hold_id: int, db: ReadDBSession):
+    """Бронь и ее место в очереди"""
+    db_hold = await hold_crud.get_hold(db, hold_id)
+    if db_hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    return db_hold
+
+@router.post("/{hold_id}/cancel", response_model=hold_schemas.Hold)
+async def cancel_hold(hold_id: int, db: DBSession):
+    db_hold = await hold_crud.cancel_hold(db, hold_id)
+    if db_hold is None:
+        if await hold_crud.get_hold(db, hold_id) is None:
+            raise HTTPException(status_code=404, detail="Hold not found")
+        raise HTTPException(status_code=400, detail="Hold is not waiting")
+    return db_hold
+
+@router.get("/book/{book_id}", response_model=List[hold_schemas.Hold])
+@query_budget(2)
+async def read_book_queue(book_id: int, db: ReadDBSession, skip: int = 0, limit: int = 100):
+    """Очередь броней книги по порядку"""
+    return await hold_crud.get_book_queue(db, book_id, skip, limit)
+
+@router.get("/reader/{reader_id}", response_model=List[hold_schemas.Hold])
+@query_budget(2)
+async def read_reader_holds(reader_id: int, db: ReadDBSession, waiting_only: bool = True):
+    """Брони читателя с местами в очередях"""
+    return await hold_crud.get_reader_holds(db, reader_id, waiting_only)
@@ -1,55 +1,92 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from app.api.deps import DBSession
+from app.api.deps import DBSession, ReadDBSession
+from app.api.etag import etag_dependency
+from app.api.fields import PartialRow, parse_fields, project_row, select_fields
+from app.api.pagination import cursor_columns, paginate, paginate_ranked, resolve_sort, set_next_cursor
+from app.api.search import apply_search
+from app.core.cache import cached, invalidate
+from app.core.config import CACHE_REFERENCE_TTL
+from app.core.query_budget import query_budget
 from app.crud import library as library_crud
 from app.schemas import library as library_schemas
 from app.models.library import Library
 
 router = APIRouter(prefix="/api/libraries", tags=["libraries"])
 
+LIBRARY_SEARCH_COLUMNS = (Library.name, Library.address, Library.phone)
+
+LIBRARY_SORTS = {
+    "name": (Library.name, False),
+    "created_at": (Library.created_at, True),
+    "address": (Library.address, False),
+    "library_id": (Library.library_id, False),
+}
+
 @router.post("/", response_model=library_schemas.Library)
 async def create_library(library: library_schemas.LibraryCreate, db: DBSession):
-    return await library_crud.create_library(db=db, library=library)
+    db_library = await library_crud.create_library(db=db, library=library)
+    invalidate("libraries")
+    return db_library
 
-@router.get("/", response_model=List[library_schemas.Library])
+@router.get("/", response_model=List[Union[library_schemas.Library, PartialRow]], dependencies=[etag_dependency("libraries")])
+@query_budget(2)
+@cached("libraries", CACHE_REFERENCE_TTL)
 async def read_libraries(
-    db: DBSession,
+    db: ReadDBSession,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     search: Optional[str] = Query(None),
+    search_mode: Optional[str] = Query("contains", description="Режим поиска: contains, prefix, fuzzy, fulltext"),
     sort_by: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
     
 ):
+    field_names = parse_fields(fields, library_schemas.Library, Library)
     query = select(Library)
     
-    if search:
-        query = query.where(
-            Library.name.ilike(f"%{search}%") |
-            Library.address.ilike(f"%{search}%") |
-            Library.phone.ilike(f"%{search}%")
-        )
+    query, rank = apply_search(query, LIBRARY_SEARCH_COLUMNS, search, search_mode)
     
-    if sort_by:
-        if sort_by == "name":
-            query = query.order_by(Library.name)
-        elif sort_by == "created_at":
-            query = query.order_by(Library.created_at.desc())
-        elif sort_by == "address":
-            query = query.order_by(Library.address)
+    if rank is not None and not sort_by:
+        query = paginate_ranked(query, rank, Library.library_id, skip, limit)
     else:
-        query = query.order_by(Library.library_id)
+        sort_by = resolve_sort(LIBRARY_SORTS, sort_by, "library_id")
+        query = paginate(query, LIBRARY_SORTS, sort_by, Library.library_id, skip, limit, cursor)
     
-    query = query.offset(skip).limit(limit)
+    if field_names:
+        query = select_fields(query, Library, field_names, *cursor_columns(LIBRARY_SORTS, sort_by, Library.library_id))
+        result = await db.execute(query)
+        rows = result.all()
+        set_next_cursor(response, rows, LIBRARY_SORTS, sort_by, Library.library_id, limit)
+        return [project_row(row, field_names) for row in rows]
     
     result = await db.execute(query)
     libraries = result.scalars().all()
+    set_next_cursor(response, libraries, LIBRARY_SORTS, sort_by, Library.library_id, limit)
     return libraries
 
-@router.get("/{library_id}", response_model=library_schemas.Library)
-async def read_library(library_id: int, db: DBSession):
+@router.get("/{library_id}", response_model=Union[library_schemas.Library, PartialRow], dependencies=[etag_dependency("libraries")])
+@query_budget(2)
+@cached("libraries", CACHE_REFERENCE_TTL)
+async def read_library(
+    library_id: int,
+    db: ReadDBSession,
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
+):
+    field_names = parse_fields(fields, library_schemas.Library, Library)
+    if field_names:
+        query = select_fields(select(Library).where(Library.library_id == library_id), Library, field_names)
+        result = await db.execute(query)
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Library not found")
+        return project_row(row, field_names)
+    
     db_library = await library_crud.get_library(db, library_id=library_id)
     if db_library is None:
         raise HTTPException(status_code=404, detail="Library not found")
@@ -71,6 +108,7 @@ async def update_library(
     
     await db.commit()
     await db.refresh(db_library)
+    invalidate("libraries", "books", "reports")
     return db_library
 
 @router.delete("/{library_id}")
@@ -81,4 +119,5 @@ async def delete_library(library_id: int, db: DBSession):
     
     await db.delete(db_library)
     await db.commit()
+    invalidate("libraries", "books", "reports")
     return {"message": "Library deleted successfully"}
\ No newline at end of file
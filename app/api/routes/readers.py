@@ -1,55 +1,105 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from app.api.deps import DBSession
+from app.api.bulk import BULK_FORMATS, parse_records
+from app.api.deps import DBSession, ReadDBSession
+from app.api.etag import etag_dependency
+from app.api.fields import PartialRow, parse_fields, project_row, select_fields
+from app.api.pagination import cursor_columns, paginate, paginate_ranked, resolve_sort, set_next_cursor
+from app.api.search import apply_search
+from app.core.cache import invalidate
+from app.core.query_budget import query_budget
 from app.crud import reader as reader_crud
+from app.crud.bulk import bulk_import
 from app.schemas import reader as reader_schemas
 from app.models.reader import Reader
 
 router = APIRouter(prefix="/api/readers", tags=["readers"])
 
+READER_SEARCH_COLUMNS = (Reader.full_name, Reader.address, Reader.phone)
+
+READER_SORTS = {
+    "full_name": (Reader.full_name, False),
+    "reg_date": (Reader.reg_date, True),
+    "reader_id": (Reader.reader_id, False),
+}
+
 @router.post("/", response_model=reader_schemas.Reader)
 async def create_reader(reader: reader_schemas.ReaderCreate, db: DBSession):
     return await reader_crud.create_reader(db=db, reader=reader)
 
-@router.get("/", response_model=List[reader_schemas.Reader])
-async def read_readers(
+@router.post("/bulk")
+async def bulk_import_readers(
+    request: Request,
     db: DBSession,
+    file_format: str = Query("csv", alias="format", description="csv (с заголовком) или ndjson"),
+    max_errors: int = Query(1000, description="Сколько ошибок строк вернуть в отчете"),
+):
+    """Массовая загрузка читателей из CSV/NDJSON в теле запроса (потоково, пакетами)"""
+    if file_format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
+    
+    report = await bulk_import(
+        db, parse_records(request.stream(), file_format), reader_schemas.ReaderCreate, Reader, conflict_columns=("phone",),
+        max_errors=max_errors
+    )
+    return report
+
+@router.get("/", response_model=List[Union[reader_schemas.Reader, PartialRow]], dependencies=[etag_dependency("readers")])
+@query_budget(2)
+async def read_readers(
+    db: ReadDBSession,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     search: Optional[str] = Query(None),
+    search_mode: Optional[str] = Query("contains", description="Режим поиска: contains, prefix, fuzzy, fulltext"),
     sort_by: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
     
 ):
+    field_names = parse_fields(fields, reader_schemas.Reader, Reader)
     query = select(Reader)
     
-    if search:
-        query = query.where(
-            Reader.full_name.ilike(f"%{search}%") |
-            Reader.address.ilike(f"%{search}%") |
-            Reader.phone.ilike(f"%{search}%")
-        )
+    query, rank = apply_search(query, READER_SEARCH_COLUMNS, search, search_mode)
     
-    if sort_by:
-        if sort_by == "full_name":
-            query = query.order_by(Reader.full_name)
-        elif sort_by == "reg_date":
-            query = query.order_by(Reader.reg_date.desc())
-        elif sort_by == "reader_id":
-            query = query.order_by(Reader.reader_id)
+    if rank is not None and not sort_by:
+        query = paginate_ranked(query, rank, Reader.reader_id, skip, limit)
     else:
-        query = query.order_by(Reader.reader_id)
+        sort_by = resolve_sort(READER_SORTS, sort_by, "reader_id")
+        query = paginate(query, READER_SORTS, sort_by, Reader.reader_id, skip, limit, cursor)
     
-    query = query.offset(skip).limit(limit)
+    if field_names:
+        query = select_fields(query, Reader, field_names, *cursor_columns(READER_SORTS, sort_by, Reader.reader_id))
+        result = await db.execute(query)
+        rows = result.all()
+        set_next_cursor(response, rows, READER_SORTS, sort_by, Reader.reader_id, limit)
+        return [project_row(row, field_names) for row in rows]
     
     result = await db.execute(query)
     readers = result.scalars().all()
+    set_next_cursor(response, readers, READER_SORTS, sort_by, Reader.reader_id, limit)
     return readers
 
-@router.get("/{reader_id}", response_model=reader_schemas.Reader)
-async def read_reader(reader_id: int, db: DBSession):
+@router.get("/{reader_id}", response_model=Union[reader_schemas.Reader, PartialRow], dependencies=[etag_dependency("readers")])
+@query_budget(2)
+async def read_reader(
+    reader_id: int,
+    db: ReadDBSession,
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
+):
+    field_names = parse_fields(fields, reader_schemas.Reader, Reader)
+    if field_names:
+        query = select_fields(select(Reader).where(Reader.reader_id == reader_id), Reader, field_names)
+        result = await db.execute(query)
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Reader not found")
+        return project_row(row, field_names)
+    
     db_reader = await reader_crud.get_reader(db, reader_id=reader_id)
     if db_reader is None:
         raise HTTPException(status_code=404, detail="Reader not found")
@@ -71,6 +121,7 @@ async def update_reader(
     
     await db.commit()
     await db.refresh(db_reader)
+    invalidate("books", "reports")
     return db_reader
 
 @router.delete("/{reader_id}")
@@ -81,4 +132,5 @@ async def delete_reader(reader_id: int, db: DBSession):
     
     await db.delete(db_reader)
     await db.commit()
+    invalidate("books", "reports")
     return {"message": "Reader deleted successfully"}
\ No newline at end of file
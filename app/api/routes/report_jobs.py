@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Body, HTTPException
+from typing import Any, Dict, Optional
+
+from app.api.deps import DBSession
+from app.core.jobs import REPORT_JOBS, check_job_params, notify_job_queued
+from app.crud import report_job as report_job_crud
+from app.schemas import report_job as report_job_schemas
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+@router.post("/{report}/jobs", response_model=report_job_schemas.ReportJob, status_code=202)
+async def create_report_job(
+    report: str,
+    db: DBSession,
+    params: Optional[Dict[str, Any]] = Body(None, description="Параметры отчета, как у синхронного эндпоинта"),
+):
+    """Поставить отчет в очередь фоновых заданий; результат — через GET /reports/jobs/{job_id}"""
+    if report not in REPORT_JOBS:
+        raise HTTPException(status_code=404, detail=f"Unknown report: {report}. Available: {', '.join(REPORT_JOBS)}")
+    params = params or {}
+    try:
+        check_job_params(report, params)
+    except TypeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid report parameters: {e}")
+    
+    db_job = await report_job_crud.create_job(db, report, params)
+    notify_job_queued()
+    return db_job
+
+@router.get("/jobs/{job_id}", response_model=report_job_schemas.ReportJob)
+async def read_report_job(job_id: int, db: DBSession):
+    """Статус задания и результат, когда status == done"""
+    # Основной сервер: на реплике статус может отставать
+    db_job = await report_job_crud.get_job(db, job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return db_job
+
+@router.post("/jobs/{job_id}/cancel", response_model=report_job_schemas.ReportJob)
+async def cancel_report_job(job_id: int, db: DBSession):
+    """Отменить задание в очереди или прервать выполняющееся"""
+    db_job = await report_job_crud.cancel_job(db, job_id)
+    if db_job is None:
+        if await report_job_crud.get_job(db, job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        raise HTTPException(status_code=400, detail="Job already finished")
+    return db_job
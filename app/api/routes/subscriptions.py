@@ -1,39 +1,113 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.attributes import flag_modified
+from typing import List, Optional, Union
 from datetime import date
 
-from app.api.deps import DBSession
+from app.api.deps import DBSession, ReadDBSession
+from app.api.etag import etag_dependency
+from app.api.expand import expand_options, parse_expand, serialize_expanded
+from app.api.export import EXPORT_FORMATS, export_response
+from app.api.fields import PartialRow, parse_fields, project_row, select_fields
+from app.api.pagination import NEXT_CURSOR_HEADER, cursor_columns, decode_cursor, encode_cursor, paginate, resolve_sort, set_next_cursor
+from app.api.serialization import json_rows_response
+from app.core.archive import archive_subscriptions
+from app.core.cache import invalidate
+from app.core.config import ARCHIVE_AFTER_MONTHS
+from app.core.overdue import flag_overdue
+from app.core.query_budget import query_budget
 from app.crud import subscription as subscription_crud
-from app.models.book import Book
+from app.crud import subscription_archive as subscription_archive_crud
+from app.schemas import book as book_schemas
+from app.schemas import library as library_schemas
+from app.schemas import reader as reader_schemas
 from app.schemas import subscription as subscription_schemas
 from app.models.subscription import Subscription
 
 router = APIRouter(prefix="/api/subscriptions", tags=["subscriptions"])
 
+SUBSCRIPTION_SORTS = {
+    "issue_date": (Subscription.issue_date, True),
+    "return_date": (Subscription.return_date, True),
+    "deposit": (Subscription.deposit, True),
+    "subscription_id": (Subscription.subscription_id, False),
+    "-subscription_id": (Subscription.subscription_id, True),
+}
+
+# Список просрочек: только по сроку, в порядке индекса ix_subscriptions_open_due_date
+OVERDUE_SORTS = {
+    "due_date": (Subscription.due_date, False),
+}
+
+SUBSCRIPTION_EXPAND = {
+    "book": (Subscription.book, book_schemas.Book),
+    "reader": (Subscription.reader, reader_schemas.Reader),
+    "library": (Subscription.library, library_schemas.Library),
+}
+
+MAX_BATCH_ITEMS = 500
+
+MAX_HISTORY_LIMIT = 500
+
 @router.post("/", response_model=subscription_schemas.Subscription)
 async def create_subscription(subscription: subscription_schemas.SubscriptionCreate, db: DBSession):
     try:
-        return await subscription_crud.create_subscription(db=db, subscription=subscription)
+        db_subscription = await subscription_crud.create_subscription(db=db, subscription=subscription)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    invalidate("books", "reports")
+    return db_subscription
+
+@router.post("/batch", response_model=List[subscription_schemas.SubscriptionBatchResult])
+async def create_subscriptions_batch(subscriptions: List[subscription_schemas.SubscriptionCreate], db: DBSession):
+    """Выдать несколько книг одной транзакцией (результат по каждой позиции)"""
+    if len(subscriptions) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {MAX_BATCH_ITEMS} items")
+    results = await subscription_crud.create_subscriptions_batch(db, subscriptions)
+    invalidate("books", "reports")
+    return results
 
-@router.get("/", response_model=List[subscription_schemas.Subscription])
+@router.post("/batch-return", response_model=List[subscription_schemas.SubscriptionBatchResult])
+async def return_subscriptions_batch(batch: subscription_schemas.SubscriptionBatchReturn, db: DBSession):
+    """Вернуть несколько книг одной транзакцией (результат по каждой позиции)"""
+    if len(batch.subscription_ids) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {MAX_BATCH_ITEMS} items")
+    results = await subscription_crud.return_books_batch(db, batch.subscription_ids)
+    invalidate("books", "reports")
+    return results
+
+@router.get(
+    "/",
+    response_model=List[Union[subscription_schemas.SubscriptionExpanded, PartialRow]],
+    response_model_exclude_unset=True,
+    dependencies=[etag_dependency("subscriptions", "books", "readers", "libraries")],
+)
+@query_budget(2)
 async def read_subscriptions(
-    db: DBSession,
+    db: ReadDBSession,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     search: Optional[str] = Query(None),
     sort_by: Optional[str] = Query(None),
     reader_id: Optional[int] = Query(None),
     book_id: Optional[int] = Query(None),
     library_id: Optional[int] = Query(None),
     active_only: Optional[bool] = Query(False),
+    issued_from: Optional[date] = Query(None, description="Выдачи с этой даты (включительно)"),
+    issued_to: Optional[date] = Query(None, description="Выдачи по эту дату (включительно)"),
+    expand: Optional[str] = Query(None, description="Вложить связанные объекты: book, reader, library (через запятую)"),
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
     
 ):
-    query = select(Subscription)
+    field_names = parse_fields(fields, subscription_schemas.Subscription, Subscription)
+    if field_names and expand:
+        raise HTTPException(status_code=400, detail="fields cannot be combined with expand")
+    expand_names = parse_expand(expand, SUBSCRIPTION_EXPAND)
+    query = select(Subscription).options(*expand_options(expand_names, SUBSCRIPTION_EXPAND))
     
     if reader_id:
         query = query.where(Subscription.reader_id == reader_id)
@@ -44,6 +118,13 @@ async def read_subscriptions(
     if library_id:
         query = query.where(Subscription.library_id == library_id)
     
+    # Диапазон issue_date — ключ секционирования: лишние секции отсекаются еще при планировании
+    if issued_from:
+        query = query.where(Subscription.issue_date >= issued_from)
+    
+    if issued_to:
+        query = query.where(Subscription.issue_date <= issued_to)
+    
     if active_only:
         # Активная подписка: return_date is NULL ИЛИ return_date > текущей даты
         from datetime import date
@@ -53,26 +134,87 @@ async def read_subscriptions(
             (Subscription.return_date > today)
         )
     
-    if sort_by:
-        if sort_by == "issue_date":
-            query = query.order_by(Subscription.issue_date.desc())
-        elif sort_by == "return_date":
-            query = query.order_by(Subscription.return_date.desc())
-        elif sort_by == "deposit":
-            query = query.order_by(Subscription.deposit.desc())
-        elif sort_by == "subscription_id":
-            query = query.order_by(Subscription.subscription_id)
-    else:
-        query = query.order_by(Subscription.subscription_id.desc())
+    sort_by = resolve_sort(SUBSCRIPTION_SORTS, sort_by, "-subscription_id")
+    query = paginate(query, SUBSCRIPTION_SORTS, sort_by, Subscription.subscription_id, skip, limit, cursor)
     
-    query = query.offset(skip).limit(limit)
+    if field_names:
+        query = select_fields(query, Subscription, field_names, *cursor_columns(SUBSCRIPTION_SORTS, sort_by, Subscription.subscription_id))
+        result = await db.execute(query)
+        rows = result.all()
+        set_next_cursor(response, rows, SUBSCRIPTION_SORTS, sort_by, Subscription.subscription_id, limit)
+        return [project_row(row, field_names) for row in rows]
     
     result = await db.execute(query)
     subscriptions = result.scalars().all()
-    return subscriptions
+    set_next_cursor(response, subscriptions, SUBSCRIPTION_SORTS, sort_by, Subscription.subscription_id, limit)
+    return serialize_expanded(subscriptions, subscription_schemas.Subscription, expand_names, SUBSCRIPTION_EXPAND)
+
+@router.get("/overdue", response_model=List[subscription_schemas.SubscriptionOverdue])
+@query_budget(2)
+async def get_overdue_subscriptions(
+    db: ReadDBSession,
+    response: Response,
+    library_id: Optional[int] = Query(None),
+    min_days: Optional[int] = Query(None, description="Не меньше стольких дней просрочки"),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+):
+    """Открытые выдачи с истекшим сроком, самые давние первыми.
 
-@router.get("/{subscription_id}", response_model=subscription_schemas.Subscription)
-async def read_subscription(subscription_id: int, db: DBSession):
+    Без ETag: список меняется со сменой даты, а не только с изменением таблиц.
+    """
+    query = subscription_crud.overdue_subscriptions_query()
+    
+    if library_id:
+        query = query.where(Subscription.library_id == library_id)
+    
+    if min_days:
+        query = query.where(Subscription.due_date <= func.current_date() - min_days)
+    
+    query = paginate(query, OVERDUE_SORTS, "due_date", Subscription.subscription_id, skip, limit, cursor)
+    result = await db.execute(query)
+    rows = result.all()
+    set_next_cursor(response, rows, OVERDUE_SORTS, "due_date", Subscription.subscription_id, limit)
+    return json_rows_response(rows, response)
+
+@router.post("/overdue/flag")
+async def flag_overdue_subscriptions():
+    """Внеочередная отметка просрочек (обычно выполняется ночью)"""
+    updated = await flag_overdue()
+    if updated is None:
+        raise HTTPException(status_code=409, detail="Overdue flagging is already running")
+    return {"updated": updated}
+
+@router.post("/archive/run")
+async def run_subscription_archive(
+    months: int = Query(ARCHIVE_AFTER_MONTHS, description="Архивировать возвращенные выдачи старше стольких месяцев")
+):
+    """Внеочередная архивация возвращенных выдач в холодный архив (обычно выполняется ночью)"""
+    if months <= 0:
+        raise HTTPException(status_code=400, detail="months must be positive (ARCHIVE_AFTER_MONTHS is not set)")
+    totals = await archive_subscriptions(months)
+    if totals is None:
+        raise HTTPException(status_code=409, detail="Archiving is already running")
+    invalidate("reports")
+    return totals
+
+@router.get("/{subscription_id}", response_model=Union[subscription_schemas.Subscription, PartialRow], dependencies=[etag_dependency("subscriptions")])
+@query_budget(2)
+async def read_subscription(
+    subscription_id: int,
+    db: ReadDBSession,
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
+):
+    field_names = parse_fields(fields, subscription_schemas.Subscription, Subscription)
+    if field_names:
+        query = select_fields(select(Subscription).where(Subscription.subscription_id == subscription_id), Subscription, field_names)
+        result = await db.execute(query)
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Subscription not found")
+        return project_row(row, field_names)
+    
     db_subscription = await subscription_crud.get_subscription(db, subscription_id=subscription_id)
     if db_subscription is None:
         raise HTTPException(status_code=404, detail="Subscription not found")
@@ -88,11 +230,30 @@ async def update_subscription(
     if db_subscription is None:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
-    # Обновление полей
-    for field, value in subscription.dict().items():
+    # Обновление полей; экземпляр выдачи меняют только триггеры выдачи и возврата.
+    # Срок при смене issue_date или library_id пересчитывает trg_update_due_date
+    for field, value in subscription.dict(exclude={"copy_id", "due_date"}).items():
+        # issue_date — ключ секционирования и часть первичного ключа, NULL недопустим
+        if field == "issue_date" and value is None:
+            continue
         setattr(db_subscription, field, value)
     
-    await db.commit()
+    try:
+        if subscription.due_date is not None:
+            # Срок клиента записывается после пересчета: триггер не отличит его от прежнего
+            await db.flush()
+            db_subscription.due_date = subscription.due_date
+            flag_modified(db_subscription, "due_date")
+        await db.commit()
+    except DBAPIError as e:
+        await db.rollback()
+        sqlstate = getattr(e.orig, "sqlstate", None)
+        if sqlstate == subscription_crud.BOOK_UNAVAILABLE_SQLSTATE:
+            raise HTTPException(status_code=400, detail="Book not available")
+        if sqlstate == subscription_crud.ISSUE_MONTH_LOCKED_SQLSTATE:
+            raise HTTPException(status_code=400, detail="Issue month of an active subscription cannot be changed")
+        raise
+    invalidate("books", "reports")
     await db.refresh(db_subscription)
     return db_subscription
 
@@ -103,152 +264,112 @@ async def delete_subscription(subscription_id: int, db: DBSession):
     if db_subscription is None:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
-    # Если подписка активна, увеличиваем количество книг
-    if not db_subscription.return_date:
-        book_result = await db.execute(
-            select(Book).where(Book.book_id == db_subscription.book_id)
-        )
-        book = book_result.scalar_one_or_none()
-        
-        if book:
-            book.quantity += 1
-            print(f"✅ Book quantity increased on delete: {book.title} now has {book.quantity} copies")
-    
+    # Экземпляр активной подписки освобождает триггер trg_release_book_copy
     await db.delete(db_subscription)
     await db.commit()
+    invalidate("books", "reports")
     return {"message": "Subscription deleted successfully"}
 
-@router.post("/{subscription_id}/return")
-async def return_subscription(subscription_id: int, db: DBSession):
-    db_subscription = await subscription_crud.get_subscription(db, subscription_id=subscription_id)
-    if db_subscription is None:
-        raise HTTPException(status_code=404, detail="Subscription not found")
-    
-    # Помечаем как возвращенную
-    db_subscription.return_date = date.today()
-    await db.commit()
-    
-    return {"message": "Book marked as returned"}
+@router.get("/detailed/", response_model=List[subscription_schemas.SubscriptionDetailed], dependencies=[etag_dependency("subscriptions", "books", "readers", "libraries")])
+@query_budget(2)
+async def read_subscriptions_detailed(db: ReadDBSession, response: Response):
+    return json_rows_response(await subscription_crud.get_subscriptions_detailed(db), response)
 
-@router.get("/detailed/", response_model=List[subscription_schemas.SubscriptionDetailed])
-async def read_subscriptions_detailed(db: DBSession):
-    return await subscription_crud.get_subscriptions_detailed(db)
+@router.get("/detailed/export")
+async def export_subscriptions_detailed(
+    file_format: str = Query("ndjson", alias="format", description="ndjson или csv")
+):
+    """Потоковая выгрузка подробного списка подписок"""
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
+    return export_response(subscription_crud.subscriptions_detailed_query(), file_format, "subscriptions_detailed")
 
-@router.get("/reader/{reader_id}/active")
-async def get_reader_active_subscriptions(reader_id: int, db: DBSession):
+@router.get("/reader/{reader_id}/active", dependencies=[etag_dependency("subscriptions")])
+@query_budget(2)
+async def get_reader_active_subscriptions(reader_id: int, db: ReadDBSession):
     """Получить активные подписки читателя"""
     result = await db.execute(
         select(Subscription)
-        .where(
-            Subscription.reader_id == reader_id,
-            Subscription.return_date.is_(None)
-        )
+        .where(Subscription.reader_id == reader_id, subscription_crud.is_open())
     )
     subscriptions = result.scalars().all()
     return subscriptions
 
+@router.get("/reader/{reader_id}/history", response_model=List[subscription_schemas.SubscriptionHistory])
+@query_budget(2)
+async def get_reader_history(
+    reader_id: int,
+    db: ReadDBSession,
+    response: Response,
+    issued_from: Optional[date] = Query(None, description="Выдачи с этой даты (включительно)"),
+    issued_to: Optional[date] = Query(None, description="Выдачи по эту дату (включительно)"),
+    limit: int = Query(100, gt=0, le=MAX_HISTORY_LIMIT),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+):
+    """История выдач читателя, от новых к старым, вместе с выдачами из холодного архива (archived)"""
+    before = decode_cursor(cursor, "issue_date", Subscription.issue_date) if cursor else None
+    history = await subscription_archive_crud.get_reader_history(db, reader_id, issued_from, issued_to, before, limit)
+    if len(history) == limit:
+        last = history[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor("issue_date", last["issue_date"], last["subscription_id"])
+    return history
+
 @router.post("/{subscription_id}/return")
 async def return_subscription(subscription_id: int, db: DBSession):
-    """Вернуть книгу (пометить подписку как возвращенную и увеличить количество книг)"""
-    db_subscription = await subscription_crud.get_subscription(db, subscription_id=subscription_id)
-    if db_subscription is None:
-        raise HTTPException(status_code=404, detail="Subscription not found")
-    
-    if db_subscription.return_date is not None:
+    """Вернуть книгу (пометить подписку как возвращенную и увеличить количество книг).
+
+    Если на книгу есть очередь броней, экземпляр сразу выдается первому в ней (allocated_hold).
+    """
+    returned = await subscription_crud.return_book(db, subscription_id=subscription_id)
+    if returned is None:
+        db_subscription = await subscription_crud.get_subscription(db, subscription_id=subscription_id)
+        if db_subscription is None:
+            raise HTTPException(status_code=404, detail="Subscription not found")
         raise HTTPException(status_code=400, detail="Book already returned")
     
-    # Увеличиваем количество книг
-    book_result = await db.execute(
-        select(Book).where(Book.book_id == db_subscription.book_id)
-    )
-    book = book_result.scalar_one_or_none()
-    
-    if book:
-        book.quantity += 1
-        print(f"✅ Book returned: {book.title} quantity increased to {book.quantity}")
-    else:
-        print("⚠️ Book not found when returning")
-    
-    # Помечаем как возвращенную
-    db_subscription.return_date = date.today()
-    await db.commit()
-    
-    return {"message": "Book returned successfully", "book_quantity": book.quantity if book else 0}
+    invalidate("books", "reports")
+    return {"message": "Book returned successfully", **returned}
 
 
-@router.get("/active/", response_model=List[subscription_schemas.SubscriptionDetailed])
+@router.get("/active/", response_model=List[subscription_schemas.SubscriptionDetailed], dependencies=[etag_dependency("subscriptions", "books", "readers", "libraries")])
+@query_budget(2)
 async def get_active_subscriptions(
-    db: DBSession,
+    db: ReadDBSession,
+    response: Response,
     library_id: Optional[int] = Query(None),
     skip: int = 0,
     limit: int = 100
 ):
     """Получить активные подписки (без даты возврата)"""
-    query = select(Subscription).where(Subscription.return_date.is_(None))
+    query = subscription_crud.subscriptions_detailed_query().where(subscription_crud.is_open())
     
     if library_id:
         query = query.where(Subscription.library_id == library_id)
     
-    query = query.offset(skip).limit(limit)
-    
-    result = await db.execute(
-        query.options(
-            selectinload(Subscription.book),
-            selectinload(Subscription.reader),
-            selectinload(Subscription.library)
-        )
-    )
-    subscriptions = result.scalars().all()
-    
-    # Преобразуем в детальный формат
-    subscriptions_detailed = []
-    for subscription in subscriptions:
-        subscriptions_detailed.append(subscription_schemas.SubscriptionDetailed(
-            subscription_id=subscription.subscription_id,
-            issue_date=subscription.issue_date,
-            return_date=subscription.return_date,
-            deposit=subscription.deposit,
-            book_title=subscription.book.title,
-            reader_name=subscription.reader.full_name,
-            library_name=subscription.library.name
-        ))
-    
-    return subscriptions_detailed
+    result = await db.execute(query.offset(skip).limit(limit))
+    return json_rows_response(result.all(), response)
 
 @router.get("/{subscription_id}/status")
-async def get_subscription_status(subscription_id: int, db: DBSession):
-    """Получить статус подписки"""
+async def get_subscription_status(subscription_id: int, db: ReadDBSession):
+    """Получить статус подписки (срок — due_date по политике библиотеки)"""
     db_subscription = await subscription_crud.get_subscription(db, subscription_id=subscription_id)
     if db_subscription is None:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
-    from datetime import date
     today = date.today()
-    
-    is_active = (
-        db_subscription.return_date is None or 
-        db_subscription.return_date > today
-    )
-    
-    is_overdue = (
-        db_subscription.return_date is not None and 
-        db_subscription.return_date < today
-    )
+    due_date = db_subscription.due_date
+    is_active = db_subscription.return_date is None
+    # Для возвращенной книги — просрочка на день возврата
+    checked_on = today if is_active else db_subscription.return_date
+    days_overdue = max((checked_on - due_date).days, 0) if due_date else 0
     
     return {
         "subscription_id": db_subscription.subscription_id,
         "is_active": is_active,
-        "is_overdue": is_overdue,
+        "is_overdue": days_overdue > 0,
         "issue_date": db_subscription.issue_date,
+        "due_date": due_date,
         "return_date": db_subscription.return_date,
-        "days_remaining": (
-            (db_subscription.return_date - today).days 
-            if db_subscription.return_date and db_subscription.return_date > today 
-            else 0
-        ),
-        "days_overdue": (
-            (today - db_subscription.return_date).days 
-            if db_subscription.return_date and db_subscription.return_date < today 
-            else 0
-        )
-    }
\ No newline at end of file
+        "days_remaining": max((due_date - today).days, 0) if is_active and due_date else 0,
+        "days_overdue": days_overdue,
+    }
@@ -1,28 +1,47 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from app.api.deps import DBSession
+from app.api.deps import DBSession, ReadDBSession
+from app.api.etag import etag_dependency
+from app.api.fields import PartialRow, parse_fields, project_row, select_fields
+from app.api.pagination import cursor_columns, paginate, resolve_sort, set_next_cursor
+from app.core.cache import cached, invalidate
+from app.core.config import CACHE_REFERENCE_TTL
+from app.core.query_budget import query_budget
 from app.crud import topic as topic_crud
 from app.schemas import topic as topic_schemas
 from app.models.topic import Topic
 
 router = APIRouter(prefix="/api/topics", tags=["topics"])
 
+TOPIC_SORTS = {
+    "name": (Topic.name, False),
+    "topic_id": (Topic.topic_id, False),
+}
+
 @router.post("/", response_model=topic_schemas.Topic)
 async def create_topic(topic: topic_schemas.TopicCreate, db: DBSession):
-    return await topic_crud.create_topic(db=db, topic=topic)
+    db_topic = await topic_crud.create_topic(db=db, topic=topic)
+    invalidate("topics")
+    return db_topic
 
-@router.get("/", response_model=List[topic_schemas.Topic])
+@router.get("/", response_model=List[Union[topic_schemas.Topic, PartialRow]], dependencies=[etag_dependency("topics")])
+@query_budget(2)
+@cached("topics", CACHE_REFERENCE_TTL)
 async def read_topics(
-    db: DBSession, 
+    db: ReadDBSession, 
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     search: Optional[str] = Query(None),
     sort_by: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
     
 ):
+    field_names = parse_fields(fields, topic_schemas.Topic, Topic)
     query = select(Topic)
     
     if search:
@@ -31,22 +50,38 @@ async def read_topics(
             Topic.description.ilike(f"%{search}%")
         )
     
-    if sort_by:
-        if sort_by == "name":
-            query = query.order_by(Topic.name)
-        elif sort_by == "topic_id":
-            query = query.order_by(Topic.topic_id)
-    else:
-        query = query.order_by(Topic.topic_id)
+    sort_by = resolve_sort(TOPIC_SORTS, sort_by, "topic_id")
+    query = paginate(query, TOPIC_SORTS, sort_by, Topic.topic_id, skip, limit, cursor)
     
-    query = query.offset(skip).limit(limit)
+    if field_names:
+        query = select_fields(query, Topic, field_names, *cursor_columns(TOPIC_SORTS, sort_by, Topic.topic_id))
+        result = await db.execute(query)
+        rows = result.all()
+        set_next_cursor(response, rows, TOPIC_SORTS, sort_by, Topic.topic_id, limit)
+        return [project_row(row, field_names) for row in rows]
     
     result = await db.execute(query)
     topics = result.scalars().all()
+    set_next_cursor(response, topics, TOPIC_SORTS, sort_by, Topic.topic_id, limit)
     return topics
 
-@router.get("/{topic_id}", response_model=topic_schemas.Topic)
-async def read_topic(topic_id: int, db: DBSession):
+@router.get("/{topic_id}", response_model=Union[topic_schemas.Topic, PartialRow], dependencies=[etag_dependency("topics")])
+@query_budget(2)
+@cached("topics", CACHE_REFERENCE_TTL)
+async def read_topic(
+    topic_id: int,
+    db: ReadDBSession,
+    fields: Optional[str] = Query(None, description="Только перечисленные поля (через запятую)"),
+):
+    field_names = parse_fields(fields, topic_schemas.Topic, Topic)
+    if field_names:
+        query = select_fields(select(Topic).where(Topic.topic_id == topic_id), Topic, field_names)
+        result = await db.execute(query)
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Topic not found")
+        return project_row(row, field_names)
+    
     db_topic = await topic_crud.get_topic(db, topic_id=topic_id)
     if db_topic is None:
         raise HTTPException(status_code=404, detail="Topic not found")
@@ -68,6 +103,7 @@ async def update_topic(
     
     await db.commit()
     await db.refresh(db_topic)
+    invalidate("topics", "books", "reports")
     return db_topic
 
 @router.delete("/{topic_id}")
@@ -78,4 +114,5 @@ async def delete_topic(topic_id: int, db: DBSession):
     
     await db.delete(db_topic)
     await db.commit()
+    invalidate("topics", "books", "reports")
     return {"message": "Topic deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,50 @@
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql import ColumnElement, Select
+
+SEARCH_MODES = ("contains", "prefix", "fuzzy", "fulltext")
+
+# Литералы, а не параметры: выражение должно совпадать с индексами ix_*_search_tsv
+_TS_CONFIG = literal_column("'simple'::regconfig")
+
+
+def search_document(columns: Sequence[InstrumentedAttribute]) -> ColumnElement:
+    """tsvector по колонкам поиска (то же выражение, что в GIN-индексе миграции)"""
+    document = func.coalesce(columns[0], literal_column("''"))
+    for column in columns[1:]:
+        document = document.op("||")(literal_column("' '")).op("||")(
+            func.coalesce(column, literal_column("''"))
+        )
+    return func.to_tsvector(_TS_CONFIG, document)
+
+
+def apply_search(
+    query: Select,
+    columns: Sequence[InstrumentedAttribute],
+    search: Optional[str],
+    search_mode: Optional[str] = "contains",
+) -> Tuple[Select, Optional[ColumnElement]]:
+    """Фильтр поиска по колонкам; для fuzzy/fulltext также возвращает выражение релевантности"""
+    if search_mode is not None and search_mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported search_mode: {search_mode}")
+    if not search:
+        return query, None
+
+    if search_mode == "prefix":
+        return query.where(or_(*(column.ilike(f"{search}%") for column in columns))), None
+
+    if search_mode == "fuzzy":
+        # column %> term == term <% column (word_similarity), использует gin_trgm_ops
+        query = query.where(or_(*(column.op("%>")(search) for column in columns)))
+        rank = func.greatest(*(func.word_similarity(search, column) for column in columns))
+        return query, rank
+
+    if search_mode == "fulltext":
+        document = search_document(columns)
+        ts_query = func.websearch_to_tsquery(_TS_CONFIG, search)
+        return query.where(document.op("@@")(ts_query)), func.ts_rank(document, ts_query)
+
+    return query.where(or_(*(column.ilike(f"%{search}%") for column in columns))), None
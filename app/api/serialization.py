@@ -0,0 +1,24 @@
+from typing import Optional, Sequence
+
+from fastapi import Response
+from pydantic_core import to_json
+from sqlalchemy.engine import Row
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def rows_to_json(rows: Sequence[Row]) -> bytes:
+    """JSON-массив строк запроса: Decimal — строкой, даты — ISO, как у схем pydantic"""
+    return to_json([row._asdict() for row in rows])
+
+
+def json_rows_response(rows: Sequence[Row], response: Optional[Response] = None) -> Response:
+    """Готовый ответ из строк без ORM-объектов и повторной валидации через response_model.
+
+    Возвращенный Response FastAPI отдает как есть, поэтому заголовки, выставленные
+    зависимостями на параметре response (ETag и т.п.), переносятся сюда.
+    """
+    fast = Response(rows_to_json(rows), media_type=JSON_MEDIA_TYPE)
+    if response is not None:
+        fast.headers.raw.extend(response.headers.raw)
+    return fast
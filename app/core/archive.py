@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.archive_store import archive_file_path, list_archive_files, remove_archive_file, write_archive_file
+from app.core.config import ARCHIVE_AFTER_MONTHS, ARCHIVE_CHUNK, ARCHIVE_HOUR
+from app.crud import subscription_archive as archive_crud
+from app.db.session import Session, engine
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_try_advisory_lock: архивацию выполняет один процесс из всех воркеров
+ARCHIVE_LOCK_KEY = 0x61726368697665
+
+# DROP опустевшей секции ждет запросы к subscriptions; не дождались — удалим в следующий раз
+DROP_PARTITION_LOCK_TIMEOUT = "5s"
+
+# Пауза перед повтором, если архивация упала
+ARCHIVE_RETRY_DELAY = 300
+
+
+def archive_cutoff(today: date, months: int) -> date:
+    """Первое число месяца, с которого выдачи остаются в базе"""
+    month_index = today.year * 12 + today.month - 1 - months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+async def _remove_orphans(session: AsyncSession, library_id: int, month: date) -> None:
+    """Удалить файлы, не попавшие в каталог архива (сбой между записью файла и коммитом)"""
+    known = await archive_crud.get_archive_paths(session, library_id, month)
+    await session.commit()
+    for path in await asyncio.to_thread(list_archive_files, library_id, month):
+        if path not in known:
+            logger.warning("Removing orphaned archive file %s", path)
+            await asyncio.to_thread(remove_archive_file, path)
+
+
+async def _drop_partition_if_empty(conn: AsyncConnection, month: date) -> bool:
+    """Удалить секцию месяца, если в ней не осталось выдач (открытые выдачи ее сохраняют)"""
+    partition = f"subscriptions_{month:%Y_%m}"
+    try:
+        if not await conn.scalar(select(func.to_regclass(partition).is_not(None))):
+            return False
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{DROP_PARTITION_LOCK_TIMEOUT}'"))
+        # Блокировка DROP берется до проверки: выдача задним числом не попадет в удаляемую секцию
+        await conn.execute(text("LOCK TABLE subscriptions IN ACCESS EXCLUSIVE MODE"))
+        if await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {partition})")):
+            return False
+        await conn.execute(text(f"DROP TABLE {partition}"))
+        await conn.commit()
+        logger.info("Dropped empty partition %s", partition)
+        return True
+    except Exception as e:
+        logger.warning("Could not drop partition %s: %s", partition, e)
+        return False
+    finally:
+        await conn.rollback()
+
+
+async def archive_subscriptions(months: int = ARCHIVE_AFTER_MONTHS) -> Optional[Dict[str, int]]:
+    """Перенести возвращенные выдачи старше months месяцев в файлы архива.
+
+    Каждая часть — отдельная транзакция: файл пишется под блокировкой строк,
+    затем в той же транзакции его строка в subscription_archive_files и DELETE выдач.
+    Возвращает счетчики; None, если архивацию уже выполняет другой процесс.
+    """
+    async with engine.connect() as conn:
+        locked = await conn.scalar(select(func.pg_try_advisory_lock(ARCHIVE_LOCK_KEY)))
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            started = time.perf_counter()
+            totals = {"files": 0, "rows": 0, "bytes": 0, "dropped_partitions": 0}
+            async with Session(bind=conn) as session:
+                groups = await archive_crud.get_archive_months(session, archive_cutoff(date.today(), months))
+                await session.commit()
+                for library_id, month in groups:
+                    await _remove_orphans(session, library_id, month)
+                    while True:
+                        rows = await archive_crud.lock_archive_chunk(session, library_id, month, ARCHIVE_CHUNK)
+                        if not rows:
+                            await session.commit()
+                            break
+                        path = archive_file_path(library_id, month, rows[0].subscription_id, rows[-1].subscription_id)
+                        size = await asyncio.to_thread(write_archive_file, path, [row._mapping for row in rows])
+                        try:
+                            await archive_crud.record_archive_file(session, library_id, month, path, rows, size)
+                            await session.commit()
+                        except Exception:
+                            await session.rollback()
+                            await asyncio.to_thread(remove_archive_file, path)
+                            raise
+                        totals["files"] += 1
+                        totals["rows"] += len(rows)
+                        totals["bytes"] += size
+                        if len(rows) < ARCHIVE_CHUNK:
+                            break
+
+            for month in sorted({month for _, month in groups}):
+                if await _drop_partition_if_empty(conn, month):
+                    totals["dropped_partitions"] += 1
+            logger.info(
+                "Archived %d subscriptions into %d files (%d bytes) in %.2fs",
+                totals["rows"], totals["files"], totals["bytes"], time.perf_counter() - started,
+            )
+            return totals
+        finally:
+            await conn.rollback()
+            await conn.execute(select(func.pg_advisory_unlock(ARCHIVE_LOCK_KEY)))
+            await conn.commit()
+
+
+def _seconds_until_next_run(now: datetime) -> float:
+    next_run = now.replace(hour=ARCHIVE_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def archive_nightly() -> None:
+    """Ежедневная архивация в ARCHIVE_HOUR по местному времени (если ARCHIVE_AFTER_MONTHS > 0)"""
+    while True:
+        await asyncio.sleep(_seconds_until_next_run(datetime.now()))
+        try:
+            await archive_subscriptions()
+        except Exception as e:
+            logger.error("Error archiving subscriptions: %s", e)
+            await asyncio.sleep(ARCHIVE_RETRY_DELAY)
@@ -0,0 +1,98 @@
+import io
+import json
+import os
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import zstandard
+
+from app.core.config import ARCHIVE_DIR
+
+# Колонки subscriptions в архивных файлах (по одному JSON-объекту на строку)
+ARCHIVE_COLUMNS = (
+    "subscription_id", "library_id", "book_id", "reader_id", "issue_date", "return_date",
+    "due_date", "overdue_days", "deposit", "copy_id",
+)
+DATE_COLUMNS = ("issue_date", "return_date", "due_date")
+
+# Холодные данные пишутся раз, читаются редко: сжатие сильнее, чем по умолчанию (3)
+ZSTD_LEVEL = 9
+
+FILE_SUFFIX = ".ndjson.zst"
+# Недописанный файл; такие (и любые файлы без строки в subscription_archive_files) удаляет архивация
+TMP_SUFFIX = ".tmp"
+
+
+def archive_root() -> Path:
+    return Path(ARCHIVE_DIR)
+
+
+def archive_dir(library_id: int, month: date) -> str:
+    """Каталог месяца библиотеки относительно ARCHIVE_DIR"""
+    return f"subscriptions/library_id={library_id}/month={month:%Y-%m}"
+
+
+def archive_file_path(library_id: int, month: date, first_id: int, last_id: int) -> str:
+    return f"{archive_dir(library_id, month)}/{first_id}-{last_id}{FILE_SUFFIX}"
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def write_archive_file(path: str, rows: Iterable[Mapping[str, Any]]) -> int:
+    """Записать строки в файл атомарно (временный файл, fsync, rename); возвращает размер в байтах"""
+    target = archive_root() / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + TMP_SUFFIX)
+    with open(tmp, "wb") as f:
+        with zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f, closefd=False) as writer:
+            for row in rows:
+                line = json.dumps({column: _dump_value(row[column]) for column in ARCHIVE_COLUMNS}, separators=(",", ":"))
+                writer.write(line.encode() + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, target)
+    # Переименование переживет сбой только после fsync каталога
+    dir_fd = os.open(target.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return target.stat().st_size
+
+
+def read_archive_file(path: str, reader_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Строки архивного файла (все или одного читателя) с типами колонок subscriptions"""
+    rows = []
+    with open(archive_root() / path, "rb") as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f)
+        for line in io.TextIOWrapper(reader, encoding="utf-8"):
+            row = json.loads(line)
+            if reader_id is not None and row["reader_id"] != reader_id:
+                continue
+            for column in DATE_COLUMNS:
+                if row[column] is not None:
+                    row[column] = date.fromisoformat(row[column])
+            if row["deposit"] is not None:
+                row["deposit"] = Decimal(row["deposit"])
+            rows.append(row)
+    return rows
+
+
+def remove_archive_file(path: str) -> None:
+    (archive_root() / path).unlink(missing_ok=True)
+
+
+def list_archive_files(library_id: int, month: date) -> List[str]:
+    """Файлы каталога месяца (включая недописанные .tmp) относительно ARCHIVE_DIR"""
+    directory = archive_root() / archive_dir(library_id, month)
+    if not directory.is_dir():
+        return []
+    return [f"{archive_dir(library_id, month)}/{entry.name}" for entry in directory.iterdir() if entry.is_file()]
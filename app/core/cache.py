@@ -0,0 +1,166 @@
+import functools
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import CACHE_ENABLED, CACHE_MAX_ENTRIES
+from app.db.base_class import Base
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """In-memory кэш процесса: TTL на запись и вытеснение LRU по размеру, отдельно по пространствам имен"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: Dict[str, "OrderedDict[str, Tuple[float, Any]]"] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _counters(self, namespace: str) -> Dict[str, int]:
+        return self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0})
+
+    def get(self, namespace: str, key: str) -> Any:
+        entries = self._data.get(namespace)
+        entry = entries.get(key) if entries else None
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del entries[key]
+            self._counters(namespace)["misses"] += 1
+            return _MISSING
+        entries.move_to_end(key)
+        self._counters(namespace)["hits"] += 1
+        return entry[1]
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        entries = self._data.setdefault(namespace, OrderedDict())
+        entries[key] = (time.monotonic() + ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self._counters(namespace)["evictions"] += 1
+
+    def invalidate(self, namespace: str) -> None:
+        self._data.pop(namespace, None)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            namespace: {**counters, "size": len(self._data.get(namespace, ()))}
+            for namespace, counters in self._stats.items()
+        }
+
+
+_backend = LRUTTLCache(CACHE_MAX_ENTRIES)
+
+# Версии таблиц, прочитанные проверкой ETag текущего HTTP-запроса: входят в ключ,
+# поэтому запись в другом процессе (его invalidate сюда не доходит) дает промах,
+# а не старое тело с новым ETag
+_versions: ContextVar[Optional[str]] = ContextVar("cache_versions", default=None)
+
+# Счетчик сбросов по пространствам имен: результат запроса, во время которого был
+# сброс, мог быть прочитан до записи, и в кэш он не кладется
+_generations: Dict[str, int] = {}
+
+
+def set_cache_backend(backend) -> None:
+    """Подменить хранилище (нужны методы get/set/invalidate/stats как у LRUTTLCache)"""
+    global _backend
+    _backend = backend
+
+
+def invalidate(*namespaces: str) -> None:
+    for namespace in namespaces:
+        _generations[namespace] = _generations.get(namespace, 0) + 1
+        _backend.invalidate(namespace)
+
+
+def bind_cache_versions(versions: str) -> None:
+    """Версии таблиц для ключей кэша в рамках текущего запроса"""
+    _versions.set(versions)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return _backend.stats()
+
+
+def _encode_orm(obj: Base) -> dict:
+    # Только колонки: связи и состояние сессии в кэш не попадают
+    return jsonable_encoder({attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs})
+
+
+def _make_key(func: Callable, args: tuple, kwargs: dict) -> str:
+    parts = [func.__module__, func.__qualname__]
+    versions = _versions.get()
+    if versions is not None:
+        parts.append(f"@{versions}")
+    parts.extend(repr(arg) for arg in args if not isinstance(arg, (AsyncSession, Response)))
+    parts.extend(
+        f"{name}={value!r}" for name, value in sorted(kwargs.items())
+        if not isinstance(value, (AsyncSession, Response))
+    )
+    return "|".join(parts)
+
+
+class _RawBody:
+    """Закэшированное тело готового Response (например, быстрой сериализации строк)"""
+
+    def __init__(self, body: bytes, media_type: Optional[str], status_code: int):
+        self.body = body
+        self.media_type = media_type
+        self.status_code = status_code
+
+    def to_response(self, response: Optional[Response]) -> Response:
+        result = Response(self.body, status_code=self.status_code, media_type=self.media_type)
+        if response is not None:
+            result.headers.raw.extend(response.headers.raw)
+        return result
+
+
+def cached(namespace: str, ttl: float):
+    """Кэширование результата async-функции (роута или crud) с учетом аргументов, кроме сессии БД.
+
+    Хранится JSON-совместимое представление результата, а не ORM-объекты;
+    заголовки, выставленные на параметре response (например X-Next-Cursor), восстанавливаются.
+    Если функция вернула готовый Response, хранится его тело.
+    """
+    def decorator(func: Callable):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return await func(*args, **kwargs)
+
+            response: Optional[Response] = kwargs.get("response")
+            key = _make_key(func, args, kwargs)
+            hit = _backend.get(namespace, key)
+            if hit is not _MISSING:
+                value, headers = hit
+                if response is not None:
+                    response.headers.update(headers)
+                if isinstance(value, _RawBody):
+                    return value.to_response(response)
+                return value
+
+            generation = _generations.get(namespace, 0)
+            before = dict(response.headers) if response is not None else {}
+            result = await func(*args, **kwargs)
+            if isinstance(result, Response):
+                value = _RawBody(result.body, result.media_type, result.status_code)
+            else:
+                value = result = jsonable_encoder(result, custom_encoder={Base: _encode_orm})
+            # Только заголовки, выставленные самой функцией (ETag и т.п. считаются заново)
+            headers = {
+                name: header for name, header in (response.headers.items() if response is not None else ())
+                if before.get(name) != header
+            }
+            if _generations.get(namespace, 0) == generation:
+                _backend.set(namespace, key, (value, headers), ttl)
+            return result
+
+        return wrapper
+    return decorator
@@ -6,3 +6,73 @@ load_dotenv()
 # DATABASE_URL = "postgresql+asyncpg://postgres:1@localhost:5432/library"
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Реплики только для чтения (через запятую); пусто — чтение с основного сервера
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# round_robin | least_connections
+REPLICA_BALANCING = os.getenv("REPLICA_BALANCING", "round_robin")
+# Сколько секунд после записи клиент читает с основного сервера (read-your-writes)
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+# Пул соединений и настройки драйвера
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# statement_timeout на сервере, мс (0 — без ограничения)
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
+
+# Сколько секунд ждать базу при старте (проверка с экспоненциальной задержкой)
+DB_STARTUP_TIMEOUT = float(os.getenv("DB_STARTUP_TIMEOUT", "60"))
+# Применять миграции alembic при старте; false — схему обновляет отдельный шаг развертывания
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Запросы дольше этого порога (секунды) пишутся в журнал app.sql.slow; 0 — не писать
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.5"))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Отладка запросов: учет одинаковых SQL в рамках HTTP-запроса (поиск N+1) и заголовок X-Query-Count
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "false").lower() in ("1", "true", "yes")
+# Сколько повторов одного SQL за запрос считать подозрением на N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+# Превышение @query_budget: off | warn | raise (raise — ошибка 500, для тестов)
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+
+# Период обновления материализованной статистики (секунды)
+STATS_REFRESH_INTERVAL = int(os.getenv("STATS_REFRESH_INTERVAL", "60"))
+
+# Ночная отметка просроченных выдач: час запуска (местное время) и размер части
+OVERDUE_FLAG_HOUR = int(os.getenv("OVERDUE_FLAG_HOUR", "2"))
+OVERDUE_FLAG_CHUNK = int(os.getenv("OVERDUE_FLAG_CHUNK", "10000"))
+
+# Обслуживание секций subscriptions: час ежедневного запуска, месяцев с заготовленными секциями вперед
+PARTITION_MAINTENANCE_HOUR = int(os.getenv("PARTITION_MAINTENANCE_HOUR", "3"))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+# Холодный архив возвращенных выдач (сжатые NDJSON-файлы). ARCHIVE_DIR — общий для всех
+# экземпляров приложения каталог; ARCHIVE_AFTER_MONTHS = 0 отключает ночную архивацию
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "0"))
+ARCHIVE_HOUR = int(os.getenv("ARCHIVE_HOUR", "4"))
+ARCHIVE_CHUNK = int(os.getenv("ARCHIVE_CHUNK", "50000"))
+
+# Выдача свободных экземпляров ожидающим броням: период (секунды) и число книг за проход
+HOLD_ALLOCATE_INTERVAL = int(os.getenv("HOLD_ALLOCATE_INTERVAL", "60"))
+HOLD_ALLOCATE_BATCH = int(os.getenv("HOLD_ALLOCATE_BATCH", "500"))
+
+# Кэш ответов в памяти процесса
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_REFERENCE_TTL = float(os.getenv("CACHE_REFERENCE_TTL", "300"))
+CACHE_BOOKS_TTL = float(os.getenv("CACHE_BOOKS_TTL", "30"))
+CACHE_REPORTS_TTL = float(os.getenv("CACHE_REPORTS_TTL", "30"))
+
+# Фоновые задания отчетов
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Задание в статусе running без heartbeat дольше этого срока (секунды) снова попадает в очередь
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "60"))
+# Сколько секунд хранить завершенные задания и их результаты
+JOB_RESULT_RETENTION = int(os.getenv("JOB_RESULT_RETENTION", "86400"))
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from app.core.config import HOLD_ALLOCATE_BATCH, HOLD_ALLOCATE_INTERVAL
+from app.crud import hold as hold_crud
+from app.db.session import Session, engine
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_try_advisory_lock: очереди броней обходит один процесс из всех воркеров
+HOLDS_LOCK_KEY = 0x686F6C6473
+
+
+async def allocate_holds() -> Optional[int]:
+    """Выдать свободные экземпляры ожидающим броням; None, если проход уже выполняет другой процесс"""
+    async with engine.connect() as conn:
+        locked = await conn.scalar(select(func.pg_try_advisory_lock(HOLDS_LOCK_KEY)))
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            async with Session(bind=conn) as session:
+                allocated = await hold_crud.allocate_waiting_holds(session, HOLD_ALLOCATE_BATCH)
+            if allocated:
+                logger.info("Allocated %d available copies to waiting holds", allocated)
+            return allocated
+        finally:
+            await conn.rollback()
+            await conn.execute(select(func.pg_advisory_unlock(HOLDS_LOCK_KEY)))
+            await conn.commit()
+
+
+async def allocate_holds_periodically() -> None:
+    """Периодическая выдача экземпляров, освободившихся не через возврат (поступления, удаление выдач)"""
+    while True:
+        await asyncio.sleep(HOLD_ALLOCATE_INTERVAL)
+        try:
+            await allocate_holds()
+        except Exception as e:
+            logger.error("Error allocating holds: %s", e)
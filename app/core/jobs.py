@@ -0,0 +1,110 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import JOB_POLL_INTERVAL, JOB_RESULT_RETENTION, JOB_STALE_AFTER, JOB_WORKERS
+from app.crud import report_job as report_job_crud
+from app.crud.stats import get_active_subscriptions, get_author_stats, get_book_prices, get_library_stats
+from app.db.session import ReadSession, Session, choose_read_engine
+
+# Отчеты, доступные как фоновые задания: имя -> функция (сессия, **параметры)
+REPORT_JOBS: Dict[str, Callable[..., Awaitable[Any]]] = {
+    "library-stats": get_library_stats,
+    "author-stats": get_author_stats,
+    "active-subscriptions": get_active_subscriptions,
+    "book-prices": get_book_prices,
+}
+
+JOB_CLEANUP_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+_wakeup = asyncio.Event()
+
+
+def check_job_params(report: str, params: Dict[str, Any]) -> None:
+    """TypeError, если параметры не подходят к функции отчета"""
+    inspect.signature(REPORT_JOBS[report]).bind(None, **params)
+
+
+def notify_job_queued() -> None:
+    """Разбудить воркеры процесса, не дожидаясь следующего опроса очереди"""
+    _wakeup.set()
+
+
+async def _wait_for_work() -> None:
+    try:
+        await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+    except asyncio.TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+async def _execute(report: str, params: Dict[str, Any]) -> Any:
+    # Отчеты читают с реплики и не занимают пул основного сервера
+    async with ReadSession(bind=choose_read_engine()) as session:
+        return jsonable_encoder(await REPORT_JOBS[report](session, **params))
+
+
+async def _run_job(job_id: int, report: str, params: Dict[str, Any]) -> None:
+    task = asyncio.create_task(_execute(report, params))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=JOB_POLL_INTERVAL)
+            if done:
+                break
+            async with Session() as session:
+                status = await report_job_crud.heartbeat(session, job_id)
+            if status != report_job_crud.JOB_RUNNING:
+                # Отменено через API: прерываем запрос отчета
+                task.cancel()
+                return
+    except asyncio.CancelledError:
+        # Остановка приложения: задание без heartbeat подхватит другой воркер
+        task.cancel()
+        raise
+
+    async with Session() as session:
+        try:
+            result = task.result()
+        except Exception as e:
+            await report_job_crud.finish_job(session, job_id, report_job_crud.JOB_FAILED, error=str(e))
+        else:
+            await report_job_crud.finish_job(session, job_id, report_job_crud.JOB_DONE, result=result)
+
+
+async def job_worker() -> None:
+    """Цикл воркера: одно задание за раз, число воркеров ограничивает параллельность"""
+    while True:
+        try:
+            async with Session() as session:
+                job = await report_job_crud.claim_job(session, JOB_STALE_AFTER)
+            if job is None:
+                await _wait_for_work()
+                continue
+            await _run_job(*job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Report job worker error: %s", e)
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+async def cleanup_jobs_periodically() -> None:
+    """Удаление результатов старше JOB_RESULT_RETENTION"""
+    while True:
+        await asyncio.sleep(JOB_CLEANUP_INTERVAL)
+        try:
+            async with Session() as session:
+                await report_job_crud.delete_expired_jobs(session, JOB_RESULT_RETENTION)
+        except Exception as e:
+            logger.error("Error deleting expired report jobs: %s", e)
+
+
+def start_job_workers() -> List[asyncio.Task]:
+    tasks = [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    tasks.append(asyncio.create_task(cleanup_jobs_periodically()))
+    return tasks
@@ -0,0 +1,263 @@
+import logging
+import time
+from collections import Counter as StatementCounter
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import N_PLUS_ONE_THRESHOLD, QUERY_DEBUG, SLOW_QUERY_SECONDS
+from app.db.pool import WAIT_BUCKETS, pool_status
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+query_debug_logger = logging.getLogger("app.sql.debug")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Метка route для запросов вне HTTP-обработчиков (фоновые задачи, старт)
+NO_ROUTE = "none"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по корзинам (последняя — +Inf), сумма]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            lines.extend(_histogram_lines(self.name, self.labelnames, labels, self.buckets, counts, total))
+        return lines
+
+
+def _histogram_lines(name, labelnames, labels, buckets, counts, total) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*buckets, "+Inf"), counts):
+        cumulative += count
+        le = f'le="{bound}"'
+        lines.append(f"{name}_bucket{_labels(labelnames, labels, le)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labelnames, labels)} {total}")
+    lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+    return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route", "status"), LATENCY_BUCKETS
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Время выполнения SQL-запроса", ("route",), LATENCY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Число SQL-запросов на один HTTP-запрос", ("route",), QUERY_COUNT_BUCKETS
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total", "SQL-запросы дольше SLOW_QUERY_SECONDS", ("route",)
+)
+DB_QUERY_BUDGET_EXCEEDED = Counter(
+    "db_query_budget_exceeded_total", "HTTP-запросы сверх бюджета @query_budget", ("route",)
+)
+DB_REPEATED_QUERIES = Counter(
+    "db_repeated_queries_total", "HTTP-запросы с повторами одного SQL (QUERY_DEBUG, подозрение на N+1)", ("route",)
+)
+
+METRICS = [
+    REQUEST_DURATION, DB_QUERY_DURATION, DB_QUERIES_PER_REQUEST, DB_SLOW_QUERIES,
+    DB_QUERY_BUDGET_EXCEEDED, DB_REPEATED_QUERIES,
+]
+
+
+def route_label(scope) -> str:
+    # Шаблон пути (/api/books/{book_id}), а не сам путь — чтобы не плодить серии;
+    # для смонтированных приложений (/static) — префикс монтирования
+    return getattr(scope.get("route"), "path", None) or scope.get("root_path") or "unmatched"
+
+
+class RequestStats:
+    """SQL-статистика текущего HTTP-запроса"""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.query_seconds = 0.0
+        # Текст SQL -> число выполнений (только при QUERY_DEBUG)
+        self.statements: Optional[StatementCounter] = StatementCounter() if QUERY_DEBUG else None
+
+    @property
+    def route(self) -> str:
+        # Маршрут известен после роутинга, то есть к моменту первого SQL-запроса обработчика
+        return route_label(self.scope)
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """Одинаковые SQL, выполненные threshold раз и больше: типичный след ленивой загрузки в цикле"""
+        if not self.statements:
+            return {}
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = _request_stats.get()
+    route = stats.route if stats is not None else NO_ROUTE
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        if stats.statements is not None:
+            # Параметры в тексте — плейсхолдеры, поэтому один текст = одна форма запроса
+            stats.statements[statement] += 1
+
+    DB_QUERY_DURATION.observe((route,), elapsed)
+    if SLOW_QUERY_SECONDS and elapsed >= SLOW_QUERY_SECONDS:
+        DB_SLOW_QUERIES.inc((route,))
+        slow_query_logger.warning("%.3fs [%s] %s", elapsed, route, " ".join(statement.split())[:1000])
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Подписать движок на события выполнения SQL (счетчики, длительность, журнал медленных запросов)"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентность по шаблону маршрута и число SQL-запросов на HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _request_stats.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if QUERY_DEBUG:
+                    message["headers"] = [*message.get("headers", []), (b"x-query-count", str(stats.queries).encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            route = stats.route
+            REQUEST_DURATION.observe((scope["method"], route, str(status)), time.perf_counter() - start)
+            DB_QUERIES_PER_REQUEST.observe((route,), stats.queries)
+            _report_repeated_statements(stats, route)
+
+
+def _report_repeated_statements(stats: RequestStats, route: str) -> None:
+    repeated = stats.repeated_statements()
+    if not repeated:
+        return
+    DB_REPEATED_QUERIES.inc((route,))
+    for statement, count in repeated.items():
+        query_debug_logger.warning(
+            "Possible N+1 on %s: %d x %s", route, count, " ".join(statement.split())[:500]
+        )
+
+
+def _pool_lines(pools: Dict[str, object]) -> List[str]:
+    gauges = {
+        "db_pool_size": ("size", "Размер пула"),
+        "db_pool_checked_out": ("checked_out", "Выданные соединения"),
+        "db_pool_overflow": ("overflow", "Соединения сверх pool_size"),
+        "db_pool_occupancy": ("occupancy", "Доля занятых соединений от size + max_overflow"),
+    }
+    counters = {
+        "db_pool_checkouts_total": ("checkouts", "Выдачи соединений"),
+        "db_pool_timeouts_total": ("timeouts", "Таймауты ожидания соединения"),
+    }
+    statuses = {name: pool_status(pool) for name, pool in pools.items()}
+
+    lines = []
+    for metric_type, metrics in (("gauge", gauges), ("counter", counters)):
+        for metric, (key, documentation) in metrics.items():
+            lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {metric_type}"]
+            lines += [f'{metric}{{engine="{name}"}} {status[key]}' for name, status in statuses.items()]
+
+    lines += ["# HELP db_pool_wait_seconds Ожидание свободного соединения", "# TYPE db_pool_wait_seconds histogram"]
+    for name, pool in pools.items():
+        metrics = pool.metrics
+        lines += _histogram_lines(
+            "db_pool_wait_seconds", ("engine",), (name,), WAIT_BUCKETS, metrics.wait_buckets, metrics.wait_sum
+        )
+    return lines
+
+
+def _cache_lines(cache: Dict[str, Dict[str, int]]) -> List[str]:
+    lines = []
+    for key, metric_type in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        metric = f"cache_{key}_total" if metric_type == "counter" else f"cache_{key}"
+        lines += [f"# HELP {metric} Кэш ответов: {key}", f"# TYPE {metric} {metric_type}"]
+        lines += [f'{metric}{{namespace="{namespace}"}} {counters[key]}' for namespace, counters in cache.items()]
+    return lines
+
+
+def render_metrics(pools: Dict[str, object], cache: Dict[str, Dict[str, int]]) -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(_pool_lines(pools))
+    lines.extend(_cache_lines(cache))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from app.core.config import OVERDUE_FLAG_CHUNK, OVERDUE_FLAG_HOUR
+from app.crud import subscription as subscription_crud
+from app.db.session import Session, engine
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_try_advisory_lock: отметку просрочек выполняет один процесс из всех воркеров
+OVERDUE_LOCK_KEY = 0x6F76657264756
+
+# Пауза перед повтором, если отметка упала
+OVERDUE_RETRY_DELAY = 300
+
+
+async def flag_overdue() -> Optional[int]:
+    """Отметить просроченные выдачи; None, если отметку уже выполняет другой процесс"""
+    async with engine.connect() as conn:
+        locked = await conn.scalar(select(func.pg_try_advisory_lock(OVERDUE_LOCK_KEY)))
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            started = time.perf_counter()
+            # Сессия на том же соединении, что держит блокировку
+            async with Session(bind=conn) as session:
+                updated = await subscription_crud.flag_overdue_subscriptions(session, OVERDUE_FLAG_CHUNK)
+            logger.info("Flagged %d overdue subscriptions in %.2fs", updated, time.perf_counter() - started)
+            return updated
+        finally:
+            await conn.rollback()
+            await conn.execute(select(func.pg_advisory_unlock(OVERDUE_LOCK_KEY)))
+            await conn.commit()
+
+
+def _seconds_until_next_run(now: datetime) -> float:
+    next_run = now.replace(hour=OVERDUE_FLAG_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def flag_overdue_nightly() -> None:
+    """Ежедневная отметка просрочек в OVERDUE_FLAG_HOUR по местному времени"""
+    while True:
+        await asyncio.sleep(_seconds_until_next_run(datetime.now()))
+        try:
+            await flag_overdue()
+        except Exception as e:
+            logger.error("Error flagging overdue subscriptions: %s", e)
+            await asyncio.sleep(OVERDUE_RETRY_DELAY)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select, text
+
+from app.core.config import PARTITION_MAINTENANCE_HOUR, PARTITION_MONTHS_AHEAD
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_try_advisory_lock: секции обслуживает один процесс из всех воркеров
+PARTITIONS_LOCK_KEY = 0x7061727473
+
+# CREATE TABLE ... PARTITION OF и LOCK TABLE ждут долгие запросы к subscriptions,
+# а ожидающая блокировка задерживает всех следующих: лучше пропустить запуск
+MAINTENANCE_LOCK_TIMEOUT = "5s"
+
+# Пауза перед повтором, если обслуживание упало
+MAINTENANCE_RETRY_DELAY = 300
+
+
+def _months_ahead(today: date, months: int) -> date:
+    month_index = today.year * 12 + today.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+async def maintain_partitions() -> Optional[Tuple[int, date]]:
+    """Создать секции subscriptions на PARTITION_MONTHS_AHEAD месяцев вперед и поднять open_since.
+
+    Возвращает (число созданных секций, новую границу open_since);
+    None, если обслуживание уже выполняет другой процесс.
+    """
+    async with engine.connect() as conn:
+        locked = await conn.scalar(select(func.pg_try_advisory_lock(PARTITIONS_LOCK_KEY)))
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            today = date.today()
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{MAINTENANCE_LOCK_TIMEOUT}'"))
+            created = await conn.scalar(
+                select(func.create_subscription_partitions(today, _months_ahead(today, PARTITION_MONTHS_AHEAD)))
+            )
+            await conn.commit()
+
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{MAINTENANCE_LOCK_TIMEOUT}'"))
+            open_since = await conn.scalar(select(func.refresh_subscriptions_open_since()))
+            await conn.commit()
+            logger.info("Subscription partitions: %d created, open loans since %s", created, open_since)
+
+            # Заодно — счетчики версий таблиц, созданные процессами при нехватке основных
+            await conn.execute(text(f"SET LOCAL lock_timeout = '{MAINTENANCE_LOCK_TIMEOUT}'"))
+            compacted = await conn.scalar(select(func.compact_table_versions()))
+            await conn.commit()
+            if compacted:
+                logger.info("Table versions: %d overflow counters compacted", compacted)
+            return created, open_since
+        finally:
+            await conn.rollback()
+            await conn.execute(select(func.pg_advisory_unlock(PARTITIONS_LOCK_KEY)))
+            await conn.commit()
+
+
+def _seconds_until_next_run(now: datetime) -> float:
+    next_run = now.replace(hour=PARTITION_MAINTENANCE_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def maintain_partitions_daily() -> None:
+    """Обслуживание секций при старте и ежедневно в PARTITION_MAINTENANCE_HOUR по местному времени"""
+    delay = 0.0
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            await maintain_partitions()
+            delay = _seconds_until_next_run(datetime.now())
+        except Exception as e:
+            logger.error("Error maintaining subscription partitions: %s", e)
+            delay = MAINTENANCE_RETRY_DELAY
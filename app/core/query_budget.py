@@ -0,0 +1,36 @@
+import functools
+import logging
+from typing import Callable
+
+from app.core.config import QUERY_BUDGET_MODE
+from app.core.metrics import DB_QUERY_BUDGET_EXCEEDED, current_request_stats
+
+logger = logging.getLogger("app.sql.budget")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(max_queries: int):
+    """Бюджет SQL-запросов на HTTP-запрос маршрута, включая зависимости (проверка ETag и т.п.).
+
+    Проверяется после обработчика: QUERY_BUDGET_MODE=warn пишет в журнал,
+    raise — отвечает 500, чтобы тест с лишними (например, ленивыми) запросами упал.
+    """
+    def decorator(func: Callable):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            stats = current_request_stats()
+            if QUERY_BUDGET_MODE != "off" and stats is not None and stats.queries > max_queries:
+                DB_QUERY_BUDGET_EXCEEDED.inc((stats.route,))
+                message = f"{stats.route}: {stats.queries} SQL queries, budget {max_queries}"
+                if QUERY_BUDGET_MODE == "raise":
+                    raise QueryBudgetExceeded(message)
+                logger.warning("Query budget exceeded on %s", message)
+            return result
+
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
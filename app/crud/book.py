@@ -1,12 +1,15 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import Select
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.crud.book_copy import add_copies
 from app.models.book import Book
 from app.models.author import Author
 from app.models.topic import Topic
 from app.models.library import Library
-from app.schemas.book import BookCreate, BookDetailed, BooksList
+from app.schemas.book import BookCreate
 
 async def get_books(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Book]:
     result = await db.execute(
@@ -21,19 +24,26 @@ async def get_book(db: AsyncSession, book_id: int) -> Optional[Book]:
     result = await db.execute(
         select(Book)
         .where(Book.book_id == book_id)
-        .options(selectinload(Book.author), selectinload(Book.topic), selectinload(Book.library))
     )
     return result.scalar_one_or_none()
 
 async def create_book(db: AsyncSession, book: BookCreate) -> Book:
-    db_book = Book(**book.dict())
+    data = book.dict()
+    quantity = data.pop("quantity")
+    db_book = Book(**data)
     db.add(db_book)
+    await db.flush()
+    await add_copies(db, {db_book.book_id: quantity})
     await db.commit()
     await db.refresh(db_book)
     return db_book
 
-async def get_books_detailed(db: AsyncSession) -> List[BookDetailed]:
-    result = await db.execute(
+async def add_initial_copies(db: AsyncSession, books: Sequence[Tuple[Dict[str, Any], Row]]) -> None:
+    """Экземпляры книг, вставленных массовой загрузкой: по quantity каждой строки"""
+    await add_copies(db, {key.book_id: data["quantity"] for data, key in books})
+
+def books_detailed_query() -> Select:
+    return (
         select(
             Book.book_id,
             Book.title,
@@ -48,28 +58,16 @@ async def get_books_detailed(db: AsyncSession) -> List[BookDetailed]:
         .join(Topic)
         .join(Library)
     )
-    books_data = result.all()
-    
-    books_detailed = []
-    for book in books_data:
-        books_detailed.append(BookDetailed(
-            book_id=book.book_id,
-            title=book.title,
-            quantity=book.quantity,
-            price=book.price,
-            author_name=book.author_name,
-            topic_name=book.topic_name,
-            library_name=book.library_name
-        ))
-    return books_detailed
 
-async def get_books_list(db: AsyncSession) -> List[BooksList]:
-    result = await db.execute(select(Book.book_id, Book.title, Book.quantity, Book.price))
-    books_data = result.all()
-    
-    return [BooksList(
-        book_id=book.book_id,
-        title=book.title,
-        quantity=book.quantity,
-        price=book.price
-    ) for book in books_data]
\ No newline at end of file
+def books_list_query() -> Select:
+    return select(Book.book_id, Book.title, Book.quantity, Book.price)
+
+async def get_books_detailed(db: AsyncSession) -> Sequence[Row]:
+    """Строки books_detailed_query (поля BookDetailed) без построения моделей"""
+    result = await db.execute(books_detailed_query())
+    return result.all()
+
+async def get_books_list(db: AsyncSession) -> Sequence[Row]:
+    """Строки books_list_query (поля BooksList) без построения моделей"""
+    result = await db.execute(books_list_query())
+    return result.all()
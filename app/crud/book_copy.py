@@ -0,0 +1,168 @@
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Sequence
+
+from sqlalchemy import Integer, Insert, func, insert, literal, select, true, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.book import Book
+from app.models.book_copy import BookCopy
+from app.schemas.book_copy import BookCopiesCreate
+
+COPY_AVAILABLE = "available"
+COPY_ON_LOAN = "on_loan"
+COPY_WITHDRAWN = "withdrawn"
+
+UNIQUE_VIOLATION_SQLSTATE = "23505"
+
+# Литерал в тексте SQL, чтобы общий план prepared statement шел по частичному ix_book_copies_available
+AVAILABLE = literal(COPY_AVAILABLE, literal_execute=True)
+
+# Вызывается в транзакции поступления до коммита: (сессия, book_id) -> число выданных экземпляров
+AfterCopiesAdded = Callable[[AsyncSession, int], Awaitable[Any]]
+
+
+def _insert_copies(counts: Dict[int, int]) -> Insert:
+    """counts[book_id] новых экземпляров каждой книги одним INSERT ... SELECT generate_series:
+    строки порождает сервер, размер запроса не зависит от их числа"""
+    book_ids = sorted(counts)
+    quantities = (
+        func.unnest(
+            literal(book_ids, ARRAY(Integer)),
+            literal([counts[book_id] or 0 for book_id in book_ids], ARRAY(Integer)),
+        )
+        .table_valued("book_id", "quantity")
+        .render_derived()
+    )
+    series = func.generate_series(1, quantities.c.quantity).table_valued("n")
+    return insert(BookCopy).from_select(
+        ["book_id"], select(quantities.c.book_id).select_from(quantities).join(series, true())
+    )
+
+
+async def get_book_copies(
+    db: AsyncSession, book_id: int, status: Optional[str] = None, skip: int = 0, limit: int = 100
+) -> Sequence[Row]:
+    query = select(BookCopy.__table__).where(BookCopy.book_id == book_id)
+    if status is not None:
+        query = query.where(BookCopy.status == status)
+    result = await db.execute(query.order_by(BookCopy.copy_id).offset(skip).limit(limit))
+    return result.all()
+
+async def add_book_copies(
+    db: AsyncSession, book_id: int, copies: BookCopiesCreate, after_insert: Optional[AfterCopiesAdded] = None
+) -> Sequence[Row]:
+    """Добавить экземпляры книги (quantity книги растет на их число при коммите).
+
+    after_insert выполняется в той же транзакции (например, выдача очереди броней);
+    возвращаются экземпляры с их статусом после него.
+    """
+    if await db.scalar(select(Book.book_id).where(Book.book_id == book_id)) is None:
+        raise ValueError("Book not found")
+    try:
+        if copies.barcodes is not None:
+            result = await db.execute(
+                insert(BookCopy).returning(*BookCopy.__table__.c, sort_by_parameter_order=True),
+                [{"book_id": book_id, "barcode": barcode} for barcode in copies.barcodes]
+            )
+        else:
+            # Штрихкоды — значением по умолчанию из book_copies_barcode_seq
+            result = await db.execute(_insert_copies({book_id: copies.count}).returning(*BookCopy.__table__.c))
+        created = sorted(result.all(), key=lambda copy: copy.copy_id)
+        if after_insert is not None and await after_insert(db, book_id):
+            created_result = await db.execute(
+                select(BookCopy.__table__)
+                .where(BookCopy.copy_id.in_([copy.copy_id for copy in created]))
+                .order_by(BookCopy.copy_id)
+            )
+            created = created_result.all()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if getattr(e.orig, "sqlstate", None) == UNIQUE_VIOLATION_SQLSTATE:
+            raise ValueError("Barcode already exists")
+        raise
+    return created
+
+async def withdraw_book_copy(db: AsyncSession, copy_id: int) -> Optional[Row]:
+    """Списать свободный экземпляр; None, если его нет или он выдан"""
+    result = await db.execute(
+        update(BookCopy)
+        .where(BookCopy.copy_id == copy_id, BookCopy.status == AVAILABLE)
+        .values(status=COPY_WITHDRAWN)
+        .returning(*BookCopy.__table__.c)
+    )
+    withdrawn = result.first()
+    await db.commit()
+    return withdrawn
+
+async def get_book_copy(db: AsyncSession, copy_id: int) -> Optional[Row]:
+    result = await db.execute(select(BookCopy.__table__).where(BookCopy.copy_id == copy_id))
+    return result.first()
+
+async def add_copies(db: AsyncSession, counts: Dict[int, int]) -> None:
+    """Поступление counts[book_id] новых экземпляров каждой книги (без коммита)"""
+    if any(counts.values()):
+        await db.execute(_insert_copies(counts))
+
+async def count_available_copies(db: AsyncSession, book_id: int) -> int:
+    """Свободные экземпляры книги с учетом изменений текущей транзакции
+    (Book.available_copies обновляется только при коммите)"""
+    return await db.scalar(
+        select(func.count()).where(BookCopy.book_id == book_id, BookCopy.status == AVAILABLE)
+    )
+
+async def set_available_copies(db: AsyncSession, book_id: int, quantity: int) -> None:
+    """Довести число свободных экземпляров книги до quantity (без коммита).
+
+    Недостающие поступают, лишние списываются, начиная с последних; экземпляры,
+    которые сейчас выдаются параллельно, не трогаются (SKIP LOCKED).
+    """
+    available = await count_available_copies(db, book_id)
+    diff = (quantity or 0) - available
+    if diff > 0:
+        await add_copies(db, {book_id: diff})
+    elif diff < 0:
+        surplus = (
+            select(BookCopy.copy_id)
+            .where(BookCopy.book_id == book_id, BookCopy.status == AVAILABLE)
+            .order_by(BookCopy.copy_id.desc())
+            .limit(-diff)
+            .with_for_update(skip_locked=True)
+        )
+        await db.execute(
+            update(BookCopy)
+            .where(BookCopy.copy_id.in_(surplus.scalar_subquery()), BookCopy.status == AVAILABLE)
+            .values(status=COPY_WITHDRAWN)
+            .execution_options(synchronize_session=False)
+        )
+
+async def lock_available_copies(
+    db: AsyncSession, needed: Dict[int, int], exclude: Collection[int] = ()
+) -> Dict[int, List[int]]:
+    """Заблокировать до needed[book_id] свободных экземпляров каждой книги (SKIP LOCKED).
+
+    Экземпляры, занятые параллельными выдачами, пропускаются без ожидания;
+    выдавать заблокированные экземпляры можно, передав copy_id в INSERT подписки.
+    exclude — экземпляры, уже отведенные вызывающим (свои блокировки SKIP LOCKED не пропускает).
+    """
+    locked = {}
+    for book_id, count in sorted(needed.items()):
+        query = select(BookCopy.copy_id).where(BookCopy.book_id == book_id, BookCopy.status == AVAILABLE)
+        if exclude:
+            query = query.where(BookCopy.copy_id.not_in(exclude))
+        result = await db.execute(
+            query
+            .order_by(BookCopy.copy_id)
+            .limit(count)
+            .with_for_update(skip_locked=True)
+        )
+        locked[book_id] = list(result.scalars().all())
+    return locked
+
+async def has_available_copy(db: AsyncSession, book_id: int) -> bool:
+    result = await db.execute(
+        select(BookCopy.copy_id).where(BookCopy.book_id == book_id, BookCopy.status == AVAILABLE).limit(1)
+    )
+    return result.first() is not None
@@ -0,0 +1,178 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.db.base_class import Base
+
+BULK_BATCH_SIZE = 1000
+
+# Вызывается в транзакции пакета: (данные строки, первичный ключ вставленной строки)
+AfterInsert = Callable[[AsyncSession, List[Tuple[Dict[str, Any], Row]]], Awaitable[None]]
+
+
+class BulkReport:
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def error(self, row_number: int, errors: Sequence[str]) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": list(errors)})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _db_error(e: DBAPIError) -> str:
+    """Текст ошибки базы (без имени класса исключения драйвера)"""
+    return getattr(e.orig.__cause__, "message", None) or str(e.orig)
+
+
+async def _insert(
+    db: AsyncSession,
+    batch: List[Tuple[int, Dict[str, Any]]],
+    model: Type[Base],
+    conflict_columns: Sequence[str],
+    after_insert: Optional[AfterInsert],
+) -> Tuple[int, int]:
+    """Вставить строки и выполнить after_insert; возвращает (вставлено, пропущено дубликатов)"""
+    # Поля схемы, которых нет в таблице (например, quantity книги), обрабатывает after_insert
+    columns = model.__table__.c
+    primary_key = list(model.__table__.primary_key.columns)
+    rows = [{name: value for name, value in data.items() if name in columns} for _, data in batch]
+    if conflict_columns:
+        stmt = insert(model).values(rows).on_conflict_do_nothing(index_elements=conflict_columns)
+        result = await db.execute(stmt.returning(*(columns[name] for name in conflict_columns), *primary_key))
+        inserted_keys = {tuple(row[:len(conflict_columns)]): row for row in result.all()}
+        inserted = []
+        for row_number, data in batch:
+            key = inserted_keys.get(tuple(data[name] for name in conflict_columns))
+            if key is not None:
+                inserted.append((data, key))
+    else:
+        result = await db.execute(insert(model.__table__).returning(*primary_key, sort_by_parameter_order=True), rows)
+        inserted = [(data, key) for (_, data), key in zip(batch, result.all())]
+    if after_insert is not None and inserted:
+        await after_insert(db, inserted)
+    return len(inserted), len(batch) - len(inserted)
+
+
+async def _flush(
+    db: AsyncSession,
+    batch: List[Tuple[int, Dict[str, Any]]],
+    model: Type[Base],
+    conflict_columns: Sequence[str],
+    foreign_keys: Dict[str, InstrumentedAttribute],
+    report: BulkReport,
+    after_insert: Optional[AfterInsert] = None,
+) -> None:
+    # Проверяем внешние ключи заранее, чтобы одна строка не откатывала весь пакет
+    for column, target in foreign_keys.items():
+        ids = {data[column] for _, data in batch}
+        result = await db.execute(select(target).where(target.in_(ids)))
+        existing = set(result.scalars().all())
+        valid = []
+        for row_number, data in batch:
+            if data[column] in existing:
+                valid.append((row_number, data))
+            else:
+                report.error(row_number, [f"{column}: {data[column]} not found"])
+        batch = valid
+
+    if not batch:
+        return
+
+    # Пакет — в точке сохранения: отказ базы (длина строки, переполнение Numeric, CHECK)
+    # откатывает только его, и строки пакета вставляются по одной, чтобы найти виноватые
+    try:
+        async with db.begin_nested():
+            inserted, skipped = await _insert(db, batch, model, conflict_columns, after_insert)
+    except DBAPIError as e:
+        if e.connection_invalidated:
+            raise
+        inserted = skipped = 0
+        for row_number, data in batch:
+            try:
+                async with db.begin_nested():
+                    row_inserted, row_skipped = await _insert(db, [(row_number, data)], model, conflict_columns, after_insert)
+            except DBAPIError as row_error:
+                if row_error.connection_invalidated:
+                    raise
+                report.error(row_number, [_db_error(row_error)])
+                continue
+            inserted += row_inserted
+            skipped += row_skipped
+    report.inserted += inserted
+    report.skipped += skipped
+    await db.commit()
+
+
+async def bulk_import(
+    db: AsyncSession,
+    records: AsyncIterator[Tuple[int, Any]],
+    schema: Type[BaseModel],
+    model: Type[Base],
+    conflict_columns: Sequence[str] = (),
+    foreign_keys: Optional[Dict[str, InstrumentedAttribute]] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+    max_errors: int = 1000,
+    after_insert: Optional[AfterInsert] = None,
+) -> Dict[str, Any]:
+    """Пакетная валидация схемой *Create и вставка multi-row INSERT ... ON CONFLICT DO NOTHING.
+
+    Каждый пакет фиксируется отдельно; в памяти держится не больше одного пакета.
+    Строки-дубликаты по conflict_columns пропускаются и попадают в skipped,
+    строки, которые отвергла база, — в errors (остальные строки пакета вставляются).
+    after_insert получает вставленные строки пакета до его коммита.
+    """
+    report = BulkReport(max_errors)
+    foreign_keys = foreign_keys or {}
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    batch_keys = set()
+
+    async for row_number, record in records:
+        if isinstance(record, Exception):
+            report.error(row_number, [str(record)])
+            continue
+        try:
+            data = schema(**record).dict()
+        except ValidationError as e:
+            report.error(row_number, [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()])
+            continue
+        except (TypeError, ValueError) as e:
+            # Например, null в поле, валидатор которого не ожидает None
+            report.error(row_number, [str(e)])
+            continue
+
+        if conflict_columns:
+            key = tuple(data[name] for name in conflict_columns)
+            if None not in key:
+                if key in batch_keys:
+                    report.skipped += 1
+                    continue
+                batch_keys.add(key)
+
+        batch.append((row_number, data))
+        if len(batch) >= batch_size:
+            await _flush(db, batch, model, conflict_columns, foreign_keys, report, after_insert)
+            batch, batch_keys = [], set()
+
+    if batch:
+        await _flush(db, batch, model, conflict_columns, foreign_keys, report, after_insert)
+    return report.as_dict()
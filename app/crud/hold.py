@@ -0,0 +1,199 @@
+from typing import Collection, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, insert, literal, select, tuple_, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.crud.book_copy import AVAILABLE, has_available_copy
+from app.models.book import Book
+from app.models.book_copy import BookCopy
+from app.models.hold import Hold
+from app.models.subscription import Subscription
+from app.schemas.hold import HoldCreate
+
+HOLD_WAITING = "waiting"
+HOLD_FULFILLED = "fulfilled"
+HOLD_CANCELLED = "cancelled"
+
+BOOK_UNAVAILABLE_SQLSTATE = "LB001"
+FOREIGN_KEY_VIOLATION_SQLSTATE = "23503"
+UNIQUE_VIOLATION_SQLSTATE = "23505"
+
+# Значение подставляется в текст SQL: с параметром планировщик не сопоставит условие
+# с частичными индексами очереди (WHERE status = 'waiting') в общем плане prepared statement
+WAITING = literal(HOLD_WAITING, literal_execute=True)
+
+
+def _position():
+    """Место в очереди: ожидающие той же книги, вставшие не позже (диапазон по ix_holds_queue)"""
+    ahead = aliased(Hold)
+    position = (
+        select(func.count())
+        .where(
+            ahead.book_id == Hold.book_id,
+            ahead.status == WAITING,
+            tuple_(ahead.created_at, ahead.hold_id) <= tuple_(Hold.created_at, Hold.hold_id)
+        )
+        .scalar_subquery()
+    )
+    return case((Hold.status == WAITING, position)).label("position")
+
+def _holds_with_position():
+    return select(Hold.__table__, _position())
+
+async def get_hold(db: AsyncSession, hold_id: int) -> Optional[Row]:
+    result = await db.execute(_holds_with_position().where(Hold.hold_id == hold_id))
+    return result.first()
+
+async def get_reader_holds(db: AsyncSession, reader_id: int, waiting_only: bool = True) -> Sequence[Row]:
+    query = _holds_with_position().where(Hold.reader_id == reader_id)
+    if waiting_only:
+        query = query.where(Hold.status == WAITING)
+    result = await db.execute(query.order_by(Hold.created_at, Hold.hold_id))
+    return result.all()
+
+async def get_book_queue(db: AsyncSession, book_id: int, skip: int = 0, limit: int = 100) -> Sequence[Row]:
+    """Очередь книги по порядку; позиции — нумерацией в том же проходе по индексу"""
+    position = func.row_number().over(order_by=(Hold.created_at, Hold.hold_id)).label("position")
+    result = await db.execute(
+        select(Hold.__table__, position)
+        .where(Hold.book_id == book_id, Hold.status == WAITING)
+        .order_by(Hold.created_at, Hold.hold_id)
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.all()
+
+async def get_queue_heads(db: AsyncSession, book_ids: Collection[int]) -> Dict[int, Row]:
+    """Первые ожидающие брони книг: {book_id: (hold_id, reader_id)} для книг с очередью"""
+    if not book_ids:
+        return {}
+    result = await db.execute(
+        select(Hold.book_id, Hold.hold_id, Hold.reader_id)
+        .where(Hold.book_id.in_(book_ids), Hold.status == WAITING)
+        .order_by(Hold.book_id, Hold.created_at, Hold.hold_id)
+        .distinct(Hold.book_id)
+    )
+    return {row.book_id: row for row in result.all()}
+
+async def fulfill_hold(db: AsyncSession, hold_id: int, subscription_id: int) -> None:
+    """Отметить бронь выданной по подписке (без коммита); уже выданную или отмененную не трогает"""
+    await db.execute(
+        update(Hold)
+        .where(Hold.hold_id == hold_id, Hold.status == WAITING)
+        .values(status=HOLD_FULFILLED, fulfilled_at=func.now(), subscription_id=subscription_id)
+    )
+
+async def create_hold(db: AsyncSession, hold: HoldCreate) -> Row:
+    """Поставить читателя в очередь на книгу.
+
+    Если свободный экземпляр уже есть, бронь сразу выдается тем же запросом
+    (очередь могла быть пуста, а экземпляр — освободиться между проверкой и бронью).
+    """
+    library_id = await db.scalar(select(Book.library_id).where(Book.book_id == hold.book_id))
+    if library_id is None:
+        raise ValueError("Book not found")
+
+    try:
+        result = await db.execute(
+            insert(Hold)
+            .values(book_id=hold.book_id, reader_id=hold.reader_id, library_id=library_id)
+            .returning(Hold.hold_id)
+        )
+        hold_id = result.scalar_one()
+        if await has_available_copy(db, hold.book_id):
+            await allocate_next_hold(db, hold.book_id)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        sqlstate = getattr(e.orig, "sqlstate", None)
+        if sqlstate == UNIQUE_VIOLATION_SQLSTATE:
+            raise ValueError("Reader is already waiting for this book")
+        if sqlstate == FOREIGN_KEY_VIOLATION_SQLSTATE:
+            raise ValueError("Reader not found")
+        raise
+    return await get_hold(db, hold_id)
+
+async def cancel_hold(db: AsyncSession, hold_id: int) -> Optional[Row]:
+    """Выйти из очереди; None, если ожидающей брони нет"""
+    result = await db.execute(
+        update(Hold)
+        .where(Hold.hold_id == hold_id, Hold.status == WAITING)
+        .values(status=HOLD_CANCELLED)
+        .returning(Hold.hold_id)
+    )
+    cancelled = result.scalar_one_or_none()
+    await db.commit()
+    if cancelled is None:
+        return None
+    return await get_hold(db, hold_id)
+
+async def allocate_next_hold(db: AsyncSession, book_id: int) -> Optional[Tuple[int, int]]:
+    """Выдать свободный экземпляр первому в очереди (в текущей транзакции, без коммита).
+
+    Возвращает (hold_id, subscription_id) или None, если очередь пуста
+    или свободных экземпляров нет.
+    """
+    next_hold_result = await db.execute(
+        select(Hold.hold_id, Hold.reader_id, Hold.library_id)
+        .where(Hold.book_id == book_id, Hold.status == WAITING)
+        .order_by(Hold.created_at, Hold.hold_id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    next_hold = next_hold_result.first()
+    if next_hold is None:
+        return None
+
+    # Экземпляр берет trg_claim_book_copy; если его успела занять параллельная выдача,
+    # откатывается только точка сохранения, а транзакция возврата продолжается
+    try:
+        async with db.begin_nested():
+            subscription_result = await db.execute(
+                insert(Subscription)
+                .values(library_id=next_hold.library_id, book_id=book_id, reader_id=next_hold.reader_id)
+                .returning(Subscription.subscription_id)
+            )
+            subscription_id = subscription_result.scalar_one()
+    except DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) == BOOK_UNAVAILABLE_SQLSTATE:
+            return None
+        raise
+    await fulfill_hold(db, next_hold.hold_id, subscription_id)
+    return next_hold.hold_id, subscription_id
+
+async def allocate_available_copies(db: AsyncSession, book_id: int) -> int:
+    """Выдать очереди книги свободные экземпляры, пока есть и бронь, и экземпляр
+    (в текущей транзакции, без коммита); возвращает число выдач"""
+    allocated = 0
+    while await allocate_next_hold(db, book_id) is not None:
+        allocated += 1
+    return allocated
+
+async def allocate_waiting_holds(db: AsyncSession, limit: int) -> int:
+    """Выдать свободные экземпляры очередям книг, где есть и бронь, и экземпляр.
+
+    Подбирает экземпляры, освободившиеся не через возврат (новые поступления,
+    удаление выдачи). Каждая книга — отдельная транзакция; возвращает число выдач.
+    """
+    books_result = await db.execute(
+        select(Hold.book_id)
+        .where(
+            Hold.status == WAITING,
+            select(BookCopy.copy_id)
+            .where(BookCopy.book_id == Hold.book_id, BookCopy.status == AVAILABLE)
+            .exists()
+        )
+        .distinct()
+        .limit(limit)
+    )
+    book_ids = books_result.scalars().all()
+    await db.commit()
+
+    allocated_total = 0
+    for book_id in book_ids:
+        allocated_total += await allocate_available_copies(db, book_id)
+        await db.commit()
+    return allocated_total
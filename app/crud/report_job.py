@@ -0,0 +1,97 @@
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from app.models.report_job import ReportJob
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+async def create_job(db: AsyncSession, report: str, params: Dict[str, Any]) -> ReportJob:
+    db_job = ReportJob(report=report, params=params, status=JOB_QUEUED)
+    db.add(db_job)
+    await db.commit()
+    await db.refresh(db_job)
+    return db_job
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[ReportJob]:
+    result = await db.execute(select(ReportJob).where(ReportJob.job_id == job_id))
+    return result.scalar_one_or_none()
+
+async def claim_job(db: AsyncSession, stale_after: int) -> Optional[Tuple[int, str, Dict[str, Any]]]:
+    """Взять следующее задание из очереди (или зависшее без heartbeat); SKIP LOCKED — без ожидания других воркеров"""
+    next_job = (
+        select(ReportJob.job_id)
+        .where(or_(
+            ReportJob.status == JOB_QUEUED,
+            (ReportJob.status == JOB_RUNNING) & (ReportJob.heartbeat_at < func.now() - timedelta(seconds=stale_after))
+        ))
+        .order_by(ReportJob.job_id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(ReportJob)
+        .where(ReportJob.job_id == next_job)
+        .values(status=JOB_RUNNING, started_at=func.now(), heartbeat_at=func.now())
+        .returning(ReportJob.job_id, ReportJob.report, ReportJob.params)
+    )
+    job = result.first()
+    await db.commit()
+    return tuple(job) if job else None
+
+async def heartbeat(db: AsyncSession, job_id: int) -> Optional[str]:
+    """Отметить, что задание выполняется; возвращает текущий статус (cancelled — пора остановиться)"""
+    result = await db.execute(
+        update(ReportJob)
+        .where(ReportJob.job_id == job_id, ReportJob.status == JOB_RUNNING)
+        .values(heartbeat_at=func.now())
+        .returning(ReportJob.status)
+    )
+    status = result.scalar_one_or_none()
+    await db.commit()
+    return status
+
+async def finish_job(db: AsyncSession, job_id: int, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+    """Записать итог; не перезаписывает задание, отмененное во время выполнения"""
+    updated = await db.execute(
+        update(ReportJob)
+        .where(ReportJob.job_id == job_id, ReportJob.status == JOB_RUNNING)
+        .values(status=status, result=result, error=error, finished_at=func.now())
+        .returning(ReportJob.job_id)
+    )
+    finished = updated.scalar_one_or_none() is not None
+    await db.commit()
+    return finished
+
+async def cancel_job(db: AsyncSession, job_id: int) -> Optional[ReportJob]:
+    """Отменить задание в очереди или в работе; None — задание уже завершено или не найдено"""
+    result = await db.execute(
+        update(ReportJob)
+        .where(ReportJob.job_id == job_id, ReportJob.status.in_([JOB_QUEUED, JOB_RUNNING]))
+        .values(status=JOB_CANCELLED, finished_at=func.now())
+        .returning(ReportJob)
+    )
+    db_job = result.scalar_one_or_none()
+    await db.commit()
+    if db_job is not None:
+        await db.refresh(db_job)
+    return db_job
+
+async def delete_expired_jobs(db: AsyncSession, retention: int) -> int:
+    """Удалить завершенные задания старше срока хранения"""
+    result = await db.execute(
+        delete(ReportJob)
+        .where(ReportJob.finished_at < func.now() - timedelta(seconds=retention))
+        .returning(ReportJob.job_id)
+    )
+    deleted = len(result.all())
+    await db.commit()
+    return deleted
@@ -1,8 +1,37 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
 from typing import List, Optional
+from app.core.cache import cached, invalidate
+from app.core.config import CACHE_REPORTS_TTL
 from app.schemas.stats import LibraryStats, AuthorStats, SubscriptionStats
 
+STATS_MATERIALIZED_VIEWS = ["mv_library_stats", "mv_author_stats"]
+
+# Ключ advisory lock, чтобы несколько воркеров не обновляли представления одновременно
+STATS_REFRESH_LOCK_KEY = 7310001
+
+async def refresh_stats_views(db: AsyncSession) -> bool:
+    """Обновить материализованную статистику без блокировки чтения"""
+    result = await db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"),
+        {"key": STATS_REFRESH_LOCK_KEY}
+    )
+    if not result.scalar():
+        await db.rollback()
+        return False
+    
+    for view in STATS_MATERIALIZED_VIEWS:
+        await db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+    await db.execute(
+        text("UPDATE stats_view_refreshes SET refreshed_at = now() WHERE view_name = ANY(:views)"),
+        {"views": STATS_MATERIALIZED_VIEWS}
+    )
+    await db.execute(text("SELECT bump_version('stats')"))
+    await db.commit()
+    invalidate("reports")
+    return True
+
+@cached("reports", CACHE_REPORTS_TTL)
 async def get_library_stats(
     db: AsyncSession, 
     min_books: Optional[int] = 0,
@@ -24,9 +53,11 @@ async def get_library_stats(
         library_name,
         total_books,
         total_copies,
-        total_value
-    FROM vw_library_stats
-    WHERE total_books >= :min_books
+        total_value,
+        r.refreshed_at
+    FROM mv_library_stats
+    CROSS JOIN stats_view_refreshes r
+    WHERE r.view_name = 'mv_library_stats' AND total_books >= :min_books
     ORDER BY {order_clause}
     """
     
@@ -40,9 +71,11 @@ async def get_library_stats(
         library_name=stat.library_name,
         total_books=stat.total_books,
         total_copies=stat.total_copies,
-        total_value=stat.total_value
+        total_value=stat.total_value,
+        refreshed_at=stat.refreshed_at
     ) for stat in stats_data]
 
+@cached("reports", CACHE_REPORTS_TTL)
 async def get_author_stats(
     db: AsyncSession,
     min_books: Optional[int] = 1,
@@ -62,19 +95,20 @@ async def get_author_stats(
     
     query = f"""
     SELECT 
-        a.author_name,
-        a.total_books,
-        a.total_copies,
-        a.avg_price
-    FROM vw_author_stats a
-    JOIN authors auth ON a.author_name = auth.full_name
-    WHERE a.total_books >= :min_books
+        author_name,
+        total_books,
+        total_copies,
+        avg_price,
+        r.refreshed_at
+    FROM mv_author_stats
+    CROSS JOIN stats_view_refreshes r
+    WHERE r.view_name = 'mv_author_stats' AND total_books >= :min_books
     """
     
     params = {"min_books": min_books}
     
     if country:
-        query += " AND auth.country = :country"
+        query += " AND country = :country"
         params["country"] = country
     
     query += f" ORDER BY {order_clause}"
@@ -86,9 +120,11 @@ async def get_author_stats(
         author_name=stat.author_name,
         total_books=stat.total_books,
         total_copies=stat.total_copies,
-        avg_price=stat.avg_price
+        avg_price=stat.avg_price,
+        refreshed_at=stat.refreshed_at
     ) for stat in stats_data]
 
+@cached("reports", CACHE_REPORTS_TTL)
 async def get_active_subscriptions(
     db: AsyncSession,
     library_id: Optional[int] = None,
@@ -138,4 +174,44 @@ async def get_active_subscriptions(
         issue_date=stat.issue_date.isoformat() if stat.issue_date else None,
         return_date=stat.return_date.isoformat() if stat.return_date else None,
         deposit=stat.deposit
-    ) for stat in stats_data]
\ No newline at end of file
+    ) for stat in stats_data]
+
+@cached("reports", CACHE_REPORTS_TTL)
+async def get_book_prices(
+    db: AsyncSession,
+    min_price: Optional[float] = 0,
+    max_price: Optional[float] = 1000,
+    topic_id: Optional[int] = None
+) -> List[dict]:
+    query = """
+    SELECT 
+        l.name as library_name,
+        COUNT(*) as book_count,
+        AVG(b.price) as avg_price,
+        MAX(b.price) as max_price,
+        MIN(b.price) as min_price,
+        SUM(b.available_copies * b.price) as total_value
+    FROM books b
+    JOIN libraries l ON b.library_id = l.library_id
+    WHERE b.price BETWEEN :min_price AND :max_price
+    """
+    
+    params = {"min_price": min_price, "max_price": max_price}
+    
+    if topic_id:
+        query += " AND b.topic_id = :topic_id"
+        params["topic_id"] = topic_id
+    
+    query += " GROUP BY l.library_id, l.name HAVING COUNT(*) > 0 ORDER BY total_value DESC"
+    
+    result = await db.execute(text(query), params)
+    rows = result.all()
+    
+    return [{
+        "library_name": row.library_name,
+        "book_count": row.book_count,
+        "avg_price": float(row.avg_price) if row.avg_price else 0,
+        "max_price": float(row.max_price) if row.max_price else 0,
+        "min_price": float(row.min_price) if row.min_price else 0,
+        "total_value": float(row.total_value) if row.total_value else 0
+    } for row in rows]
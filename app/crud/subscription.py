@@ -1,10 +1,39 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, func, insert, select, tuple_, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql import Select
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from app.models.subscription import Subscription
+from typing import Any, Dict, List, Optional, Sequence
+from datetime import date
+from app.crud.book_copy import AVAILABLE, count_available_copies, lock_available_copies
+from app.crud.hold import allocate_next_hold, fulfill_hold, get_queue_heads
+from app.models.subscription import Subscription, SubscriptionsOpenSince
 from app.models.book import Book
-from app.schemas.subscription import SubscriptionCreate, SubscriptionDetailed
+from app.models.book_copy import BookCopy
+from app.models.library import Library
+from app.models.reader import Reader
+from app.schemas.subscription import SubscriptionCreate
+
+# Ошибка триггеров выдачи при нехватке экземпляров
+BOOK_UNAVAILABLE_SQLSTATE = "LB001"
+# Смена месяца выдачи у открытой подписки (перенос между секциями) запрещена триггером
+ISSUE_MONTH_LOCKED_SQLSTATE = "LB002"
+FOREIGN_KEY_VIOLATION_SQLSTATE = "23503"
+
+BOOK_RESERVED = "Book is reserved for readers in the queue"
+
+def open_since():
+    """Нижняя граница issue_date открытых выдач (subscriptions_open_since)"""
+    return select(SubscriptionsOpenSince.open_since).scalar_subquery()
+
+def is_open():
+    """Открытая выдача; условие по open_since отсекает старые секции subscriptions при выполнении"""
+    return and_(Subscription.return_date.is_(None), Subscription.issue_date >= open_since())
+
+def returned_overdue_days():
+    """Итоговая просрочка при возврате сегодня (для UPDATE ... SET overdue_days)"""
+    return func.greatest(func.coalesce(func.current_date() - Subscription.due_date, 0), 0)
 
 async def get_subscriptions(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Subscription]:
     result = await db.execute(
@@ -23,77 +52,301 @@ async def get_subscription(db: AsyncSession, subscription_id: int) -> Optional[S
     result = await db.execute(
         select(Subscription)
         .where(Subscription.subscription_id == subscription_id)
-        .options(
-            selectinload(Subscription.book),
-            selectinload(Subscription.reader),
-            selectinload(Subscription.library)
-        )
     )
     return result.scalar_one_or_none()
 
+def _reserved_for_others(heads: Dict[int, Row], item: SubscriptionCreate) -> bool:
+    """Пока у книги есть очередь броней, без брони книгу получает только первый в очереди"""
+    head = heads.get(item.book_id)
+    return item.return_date is None and head is not None and head.reader_id != item.reader_id
+
 async def create_subscription(db: AsyncSession, subscription: SubscriptionCreate) -> Subscription:
-    # Check book availability
-    book_result = await db.execute(
-        select(Book).where(Book.book_id == subscription.book_id)
-    )
-    book = book_result.scalar_one_or_none()
-    
-    if not book or book.quantity <= 0:
-        raise ValueError("Book not available")
-    
+    heads = await get_queue_heads(db, [subscription.book_id]) if subscription.return_date is None else {}
+    if _reserved_for_others(heads, subscription):
+        raise ValueError(BOOK_RESERVED)
+    # Свободный экземпляр берет триггер trg_claim_book_copy в том же INSERT
     db_subscription = Subscription(**subscription.dict())
     db.add(db_subscription)
-    await db.commit()
+    try:
+        if heads:
+            # Выдача первому в очереди закрывает его бронь
+            await db.flush()
+            await fulfill_hold(db, heads[subscription.book_id].hold_id, db_subscription.subscription_id)
+        await db.commit()
+    except DBAPIError as e:
+        await db.rollback()
+        sqlstate = getattr(e.orig, "sqlstate", None)
+        if sqlstate == BOOK_UNAVAILABLE_SQLSTATE:
+            raise ValueError("Book not available")
+        if sqlstate == FOREIGN_KEY_VIOLATION_SQLSTATE:
+            raise ValueError("Book, reader or library not found")
+        raise
     await db.refresh(db_subscription)
     return db_subscription
 
-async def return_book(db: AsyncSession, subscription_id: int) -> bool:
+async def return_book(db: AsyncSession, subscription_id: int) -> Optional[Dict[str, Any]]:
+    """Вернуть книгу одним условным UPDATE (экземпляр освобождает триггер trg_return_book_copy).
+
+    В той же транзакции экземпляр выдается первому в очереди броней книги.
+    Возвращает book_quantity и allocated_hold ({hold_id, subscription_id} или None);
+    None, если активной подписки нет.
+    """
     result = await db.execute(
-        select(Subscription).where(Subscription.subscription_id == subscription_id)
+        update(Subscription)
+        .where(Subscription.subscription_id == subscription_id, is_open())
+        .values(return_date=func.current_date(), overdue_days=returned_overdue_days())
+        .returning(Subscription.book_id)
+        .execution_options(synchronize_session=False)
     )
-    subscription = result.scalar_one_or_none()
+    book_id = result.scalar_one_or_none()
+    if book_id is None:
+        await db.rollback()
+        return None
     
-    if subscription:
-        # Если книга еще не возвращена, увеличиваем количество
-        if not subscription.return_date:
-            # Получаем книгу и увеличиваем количество
-            book_result = await db.execute(
-                select(Book).where(Book.book_id == subscription.book_id)
-            )
-            book = book_result.scalar_one_or_none()
-            
-            if book:
-                book.quantity += 1
-                print(f"✅ Book quantity increased: {book.title} now has {book.quantity} copies")
-        
-        # Устанавливаем дату возврата
-        from datetime import date
-        subscription.return_date = date.today()
-        
-        await db.commit()
-        return True
-    return False
+    allocated = await allocate_next_hold(db, book_id)
+    # Свободные экземпляры с учетом этого возврата и выдачи по брони
+    quantity = await count_available_copies(db, book_id)
+    await db.commit()
+    return {
+        "book_quantity": quantity,
+        "allocated_hold": {"hold_id": allocated[0], "subscription_id": allocated[1]} if allocated else None,
+    }
 
-async def get_subscriptions_detailed(db: AsyncSession) -> List[SubscriptionDetailed]:
-    result = await db.execute(
-        select(Subscription)
-        .options(
-            selectinload(Subscription.book),
-            selectinload(Subscription.reader),
-            selectinload(Subscription.library)
+async def create_subscriptions_batch(db: AsyncSession, subscriptions: List[SubscriptionCreate]) -> List[dict]:
+    """Выдача списка книг одной транзакцией; результат по каждой позиции в порядке запроса"""
+    results = [{"index": index, "success": False} for index in range(len(subscriptions))]
+    
+    books_result = await db.execute(select(Book.book_id).where(Book.book_id.in_({item.book_id for item in subscriptions})))
+    book_ids = set(books_result.scalars().all())
+    heads = await get_queue_heads(db, {item.book_id for item in subscriptions if item.return_date is None})
+    reserved = {index for index, item in enumerate(subscriptions) if _reserved_for_others(heads, item)}
+    
+    # Явно указанные экземпляры: свободны ли и относятся ли к книге позиции.
+    # Блокируются первыми и по порядку copy_id — единственное ожидание в пакете
+    requested_copies = {
+        item.copy_id for index, item in enumerate(subscriptions)
+        if item.return_date is None and item.copy_id is not None and index not in reserved
+    }
+    requested_free = {}
+    if requested_copies:
+        requested_result = await db.execute(
+            select(BookCopy.copy_id, BookCopy.book_id)
+            .where(BookCopy.copy_id.in_(requested_copies), BookCopy.status == AVAILABLE)
+            .order_by(BookCopy.copy_id)
+            .with_for_update()
         )
+        requested_free = dict(requested_result.all())
+    # Остальным позициям — свой свободный экземпляр (SKIP LOCKED, без ожидания): строки книг
+    # не блокируются, параллельные пакеты с теми же книгами в любом порядке не ждут друг друга
+    needed = {}
+    for index, item in enumerate(subscriptions):
+        if item.return_date is None and item.copy_id is None and item.book_id in book_ids and index not in reserved:
+            needed[item.book_id] = needed.get(item.book_id, 0) + 1
+    free_copies = await lock_available_copies(db, needed, exclude=requested_free)
+    
+    readers_result = await db.execute(
+        select(Reader.reader_id).where(Reader.reader_id.in_({item.reader_id for item in subscriptions}))
     )
-    subscriptions = result.scalars().all()
+    reader_ids = set(readers_result.scalars().all())
+    libraries_result = await db.execute(
+        select(Library.library_id).where(Library.library_id.in_({item.library_id for item in subscriptions}))
+    )
+    library_ids = set(libraries_result.scalars().all())
+    
+    accepted = []
+    for index, item in enumerate(subscriptions):
+        if item.book_id not in book_ids:
+            results[index]["detail"] = "Book not found"
+        elif item.reader_id not in reader_ids:
+            results[index]["detail"] = "Reader not found"
+        elif item.library_id not in library_ids:
+            results[index]["detail"] = "Library not found"
+        elif index in reserved:
+            results[index]["detail"] = BOOK_RESERVED
+        elif item.return_date is not None:
+            accepted.append((index, item.copy_id))
+        elif item.copy_id is not None:
+            if requested_free.get(item.copy_id) != item.book_id:
+                results[index]["detail"] = "Copy not available"
+            else:
+                # Один экземпляр — одной позиции пакета
+                del requested_free[item.copy_id]
+                accepted.append((index, item.copy_id))
+        elif not free_copies[item.book_id]:
+            results[index]["detail"] = "Book not available"
+        else:
+            accepted.append((index, free_copies[item.book_id].pop()))
+    
+    if accepted:
+        # Экземпляры уже заблокированы этой транзакцией; trg_claim_book_copy отмечает их выданными.
+        # Строки по порядку книг и экземпляров, как и блокировки
+        accepted.sort(key=lambda position: (subscriptions[position[0]].book_id, position[1] or 0))
+        rows = []
+        for index, copy_id in accepted:
+            row = subscriptions[index].dict()
+            # Одинаковый набор колонок для multi-row INSERT
+            row["issue_date"] = row["issue_date"] or date.today()
+            row["copy_id"] = copy_id
+            rows.append(row)
+        insert_result = await db.execute(
+            insert(Subscription).returning(Subscription.subscription_id, sort_by_parameter_order=True),
+            rows
+        )
+        for (index, _), subscription_id in zip(accepted, insert_result.scalars().all()):
+            results[index].update(success=True, subscription_id=subscription_id)
+            head = heads.get(subscriptions[index].book_id)
+            if subscriptions[index].return_date is None and head is not None:
+                # Выдача первому в очереди закрывает его бронь (повторная — уже ничего)
+                await fulfill_hold(db, head.hold_id, subscription_id)
     
-    subscriptions_detailed = []
-    for subscription in subscriptions:
-        subscriptions_detailed.append(SubscriptionDetailed(
-            subscription_id=subscription.subscription_id,
-            issue_date=subscription.issue_date,
-            return_date=subscription.return_date,
-            deposit=subscription.deposit,
-            book_title=subscription.book.title,
-            reader_name=subscription.reader.full_name,
-            library_name=subscription.library.name
-        ))
-    return subscriptions_detailed
\ No newline at end of file
+    await db.commit()
+    return results
+
+async def return_books_batch(db: AsyncSession, subscription_ids: List[int]) -> List[dict]:
+    """Возврат списка подписок одним UPDATE в одной транзакции"""
+    ids = set(subscription_ids)
+    
+    # Подписки блокируются по порядку книг, а не в порядке плана UPDATE: параллельные пакеты
+    # с общими подписками и книгами (очереди броней) не ждут друг друга по кругу
+    locked = (
+        select(Subscription.subscription_id)
+        .where(Subscription.subscription_id.in_(ids), is_open())
+        .order_by(Subscription.book_id, Subscription.subscription_id)
+        .with_for_update()
+    )
+    returned_result = await db.execute(
+        update(Subscription)
+        .where(Subscription.subscription_id.in_(locked.scalar_subquery()), is_open())
+        .values(return_date=func.current_date(), overdue_days=returned_overdue_days())
+        .returning(Subscription.subscription_id, Subscription.book_id)
+        .execution_options(synchronize_session=False)
+    )
+    returned_books = dict(returned_result.all())
+    returned = set(returned_books)
+    
+    # Каждый вернувшийся экземпляр — следующему в очереди его книги
+    allocated_holds = {}
+    for returned_id, book_id in sorted(returned_books.items(), key=lambda item: (item[1], item[0])):
+        allocated = await allocate_next_hold(db, book_id)
+        if allocated:
+            allocated_holds[returned_id] = allocated[0]
+    
+    existing = set()
+    if len(returned) < len(ids):
+        existing_result = await db.execute(
+            select(Subscription.subscription_id).where(Subscription.subscription_id.in_(ids - returned))
+        )
+        existing = set(existing_result.scalars().all())
+    await db.commit()
+    
+    results = []
+    seen = set()
+    for index, subscription_id in enumerate(subscription_ids):
+        result = {"index": index, "subscription_id": subscription_id, "success": False}
+        if subscription_id in seen:
+            result["detail"] = "Duplicate in batch"
+        elif subscription_id in returned:
+            result["success"] = True
+            result["allocated_hold_id"] = allocated_holds.get(subscription_id)
+        elif subscription_id in existing:
+            result["detail"] = "Book already returned"
+        else:
+            result["detail"] = "Subscription not found"
+        seen.add(subscription_id)
+        results.append(result)
+    return results
+
+def subscriptions_detailed_query() -> Select:
+    """Те же поля, что у SubscriptionDetailed, одним запросом с JOIN"""
+    return (
+        select(
+            Subscription.subscription_id,
+            Subscription.issue_date,
+            Subscription.return_date,
+            Subscription.due_date,
+            Subscription.deposit,
+            Book.title.label("book_title"),
+            Reader.full_name.label("reader_name"),
+            Library.name.label("library_name")
+        )
+        .select_from(Subscription)
+        .join(Book, Subscription.book_id == Book.book_id)
+        .join(Reader, Subscription.reader_id == Reader.reader_id)
+        .join(Library, Subscription.library_id == Library.library_id)
+    )
+
+async def get_subscriptions_detailed(db: AsyncSession) -> Sequence[Row]:
+    """Строки subscriptions_detailed_query (поля SubscriptionDetailed) без построения моделей"""
+    result = await db.execute(subscriptions_detailed_query())
+    return result.all()
+
+def overdue_subscriptions_query() -> Select:
+    """Открытые выдачи с истекшим сроком (поля SubscriptionOverdue); идет по ix_subscriptions_open_due_date"""
+    return (
+        select(
+            Subscription.subscription_id,
+            Subscription.reader_id,
+            Subscription.issue_date,
+            Subscription.due_date,
+            (func.current_date() - Subscription.due_date).label("days_overdue"),
+            Subscription.deposit,
+            Book.title.label("book_title"),
+            Reader.full_name.label("reader_name"),
+            Library.name.label("library_name")
+        )
+        .select_from(Subscription)
+        .join(Book, Subscription.book_id == Book.book_id)
+        .join(Reader, Subscription.reader_id == Reader.reader_id)
+        .join(Library, Subscription.library_id == Library.library_id)
+        .where(is_open(), Subscription.due_date < func.current_date())
+    )
+
+async def flag_overdue_subscriptions(db: AsyncSession, chunk_size: int) -> int:
+    """Записать overdue_days открытым просроченным выдачам; возвращает число измененных строк.
+
+    Выдачи обходятся по (due_date, subscription_id) частями по chunk_size, каждая часть —
+    отдельная короткая транзакция: блокировки строк не копятся на весь прогон.
+    """
+    updated_total = 0
+    last_key = None
+    while True:
+        chunk_query = (
+            select(Subscription.subscription_id, Subscription.issue_date, Subscription.due_date)
+            .where(is_open(), Subscription.due_date < func.current_date())
+            .order_by(Subscription.due_date, Subscription.subscription_id)
+            .limit(chunk_size)
+        )
+        if last_key is not None:
+            chunk_query = chunk_query.where(tuple_(Subscription.due_date, Subscription.subscription_id) > last_key)
+        chunk = chunk_query.cte("chunk")
+        
+        days_overdue = func.current_date() - chunk.c.due_date
+        updated = (
+            update(Subscription)
+            .where(
+                Subscription.subscription_id == chunk.c.subscription_id,
+                Subscription.issue_date == chunk.c.issue_date,
+                Subscription.overdue_days != days_overdue
+            )
+            .values(overdue_days=days_overdue)
+            .returning(Subscription.subscription_id)
+            .cte("updated")
+        )
+        result = await db.execute(
+            select(
+                chunk.c.due_date,
+                chunk.c.subscription_id,
+                select(func.count()).select_from(updated).scalar_subquery().label("updated"),
+                select(func.count()).select_from(chunk).scalar_subquery().label("size"),
+            )
+            .order_by(chunk.c.due_date.desc(), chunk.c.subscription_id.desc())
+            .limit(1)
+        )
+        last = result.first()
+        await db.commit()
+        if last is None:
+            return updated_total
+        updated_total += last.updated
+        if last.size < chunk_size:
+            return updated_total
+        last_key = (last.due_date, last.subscription_id)
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Date, Integer, any_, bindparam, cast, delete, func, insert, select, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.archive_store import ARCHIVE_COLUMNS, read_archive_file
+from app.models.subscription import Subscription
+from app.models.subscription_archive import SubscriptionArchiveFile
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _month_range(month: date):
+    """Условие по ключу секционирования: запрос идет в одну секцию"""
+    return Subscription.issue_date >= month, Subscription.issue_date < next_month(month)
+
+
+async def get_archive_months(db: AsyncSession, cutoff: date) -> Sequence[Row]:
+    """(library_id, month) с возвращенными выдачами, выданными раньше cutoff"""
+    month = cast(func.date_trunc("month", Subscription.issue_date), Date).label("month")
+    result = await db.execute(
+        select(Subscription.library_id, month)
+        .where(Subscription.return_date.is_not(None), Subscription.issue_date < cutoff)
+        .group_by(Subscription.library_id, month)
+        .order_by(month, Subscription.library_id)
+    )
+    return result.all()
+
+async def lock_archive_chunk(db: AsyncSession, library_id: int, month: date, chunk_size: int) -> Sequence[Row]:
+    """Следующая часть возвращенных выдач библиотеки за месяц; строки блокируются до записи в архив"""
+    result = await db.execute(
+        select(*(Subscription.__table__.c[column] for column in ARCHIVE_COLUMNS))
+        .where(
+            Subscription.library_id == library_id,
+            Subscription.return_date.is_not(None),
+            *_month_range(month)
+        )
+        .order_by(Subscription.subscription_id)
+        .limit(chunk_size)
+        .with_for_update()
+    )
+    return result.all()
+
+async def record_archive_file(
+    db: AsyncSession, library_id: int, month: date, path: str, rows: Sequence[Row], size_bytes: int
+) -> None:
+    """Записать файл в каталог архива и удалить его выдачи из subscriptions (без коммита)"""
+    subscription_ids = [row.subscription_id for row in rows]
+    await db.execute(
+        insert(SubscriptionArchiveFile).values(
+            library_id=library_id,
+            month=month,
+            path=path,
+            row_count=len(rows),
+            first_subscription_id=subscription_ids[0],
+            last_subscription_id=subscription_ids[-1],
+            reader_ids=sorted({row.reader_id for row in rows}),
+            size_bytes=size_bytes,
+        )
+    )
+    # Один параметр-массив вместо IN: в части до ARCHIVE_CHUNK строк
+    await db.execute(
+        delete(Subscription)
+        .where(
+            Subscription.subscription_id == any_(bindparam("subscription_ids", subscription_ids, type_=ARRAY(Integer))),
+            *_month_range(month)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+async def get_archive_paths(db: AsyncSession, library_id: int, month: date) -> Set[str]:
+    result = await db.execute(
+        select(SubscriptionArchiveFile.path)
+        .where(SubscriptionArchiveFile.library_id == library_id, SubscriptionArchiveFile.month == month)
+    )
+    return set(result.scalars().all())
+
+async def get_reader_history(
+    db: AsyncSession,
+    reader_id: int,
+    issued_from: Optional[date] = None,
+    issued_to: Optional[date] = None,
+    before: Optional[Tuple[date, int]] = None,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """История выдач читателя из subscriptions и холодного архива, от новых к старым.
+
+    before — ключ (issue_date, subscription_id) последней строки предыдущей страницы.
+    Архивные файлы читаются по месяцам от новых к старым, пока строк не хватит на страницу:
+    все строки более старых месяцев заведомо старше уже найденных.
+    """
+    hot_query = select(Subscription.__table__).where(Subscription.reader_id == reader_id)
+    files_query = (
+        select(SubscriptionArchiveFile.path, SubscriptionArchiveFile.month)
+        .where(SubscriptionArchiveFile.reader_ids.contains([reader_id]))
+    )
+    if issued_from:
+        hot_query = hot_query.where(Subscription.issue_date >= issued_from)
+        files_query = files_query.where(SubscriptionArchiveFile.month >= issued_from.replace(day=1))
+    if issued_to:
+        hot_query = hot_query.where(Subscription.issue_date <= issued_to)
+        files_query = files_query.where(SubscriptionArchiveFile.month <= issued_to)
+    if before:
+        hot_query = hot_query.where(tuple_(Subscription.issue_date, Subscription.subscription_id) < before)
+        files_query = files_query.where(SubscriptionArchiveFile.month <= before[0])
+
+    hot_result = await db.execute(
+        hot_query.order_by(Subscription.issue_date.desc(), Subscription.subscription_id.desc()).limit(limit)
+    )
+    history = [{**row._mapping, "archived": False} for row in hot_result]
+    # Каталог читается отдельным запросом: если архивация закоммитилась между ними,
+    # строки части уже прочитаны из subscriptions и в файле пропускаются
+    hot_ids = {row["subscription_id"] for row in history}
+    files_result = await db.execute(
+        files_query.order_by(SubscriptionArchiveFile.month.desc(), SubscriptionArchiveFile.path)
+    )
+    files = files_result.all()
+
+    archived_count = 0
+    index = 0
+    while index < len(files) and archived_count < limit:
+        month = files[index].month
+        # Все файлы месяца: порядок строк внутри месяца — по issue_date
+        while index < len(files) and files[index].month == month:
+            rows = await asyncio.to_thread(read_archive_file, files[index].path, reader_id)
+            for row in rows:
+                if issued_from and row["issue_date"] < issued_from:
+                    continue
+                if issued_to and row["issue_date"] > issued_to:
+                    continue
+                if before and (row["issue_date"], row["subscription_id"]) >= before:
+                    continue
+                if row["subscription_id"] in hot_ids:
+                    continue
+                history.append({**row, "archived": True})
+                archived_count += 1
+            index += 1
+
+    history.sort(key=lambda row: (row["issue_date"], row["subscription_id"]), reverse=True)
+    return history[:limit]
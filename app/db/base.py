@@ -1,7 +1,13 @@
 from app.db.base_class import Base
 from app.models.author import Author
 from app.models.book import Book
+from app.models.book_copy import BookCopy
+from app.models.hold import Hold
 from app.models.library import Library
 from app.models.reader import Reader
-from app.models.subscription import Subscription
+from app.models.report_job import ReportJob
+from app.models.stats_view_refresh import StatsViewRefresh
+from app.models.subscription import Subscription, SubscriptionsOpenSince
+from app.models.subscription_archive import SubscriptionArchiveFile
+from app.models.table_version import TableVersion
 from app.models.topic import Topic
\ No newline at end of file
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Optional, Set
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import DB_STARTUP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_DIR = Path(__file__).resolve().parents[2] / "alembic"
+
+# Ключ pg_advisory_lock: миграции выполняет один процесс, остальные ждут его
+MIGRATION_LOCK_KEY = 0x6C6962726172
+
+# Ревизия первой миграции: схема, которую раньше создавал create_all при старте
+BASELINE_REVISION = "a525d14f5b8f"
+
+PROBE_INITIAL_DELAY = 0.1
+PROBE_MAX_DELAY = 5.0
+
+
+def alembic_config() -> Config:
+    # Без alembic.ini: его fileConfig перенастроил бы журналы приложения
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    return config
+
+
+def head_revisions(config: Optional[Config] = None) -> Set[str]:
+    return set(ScriptDirectory.from_config(config or alembic_config()).get_heads())
+
+
+async def wait_for_database(engine: AsyncEngine, timeout: float = DB_STARTUP_TIMEOUT) -> None:
+    """Ждать ответа базы с экспоненциальной задержкой между попытками; по истечении timeout — исключение"""
+    deadline = time.monotonic() + timeout
+    delay = PROBE_INITIAL_DELAY
+    attempt = 1
+    while True:
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return
+        except Exception as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            logger.info("Database is not ready (attempt %d): %s; retrying in %.1fs", attempt, e, min(delay, remaining))
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, PROBE_MAX_DELAY)
+            attempt += 1
+
+
+async def _current_revisions(conn: AsyncConnection) -> Optional[Set[str]]:
+    """Ревизии из alembic_version; None, если alembic еще не применялся"""
+    if not await conn.scalar(text("SELECT to_regclass('alembic_version') IS NOT NULL")):
+        return None
+    return set((await conn.execute(text("SELECT version_num FROM alembic_version"))).scalars())
+
+
+def _upgrade(sync_conn, config: Config, stamp_baseline: bool) -> None:
+    config.attributes["connection"] = sync_conn
+    if stamp_baseline:
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+
+async def migrate_database(engine: AsyncEngine) -> bool:
+    """Довести схему до последней миграции alembic; False, если она уже актуальна.
+
+    Проверка актуальности — один запрос без блокировок, поэтому обычный старт
+    воркера не выполняет DDL. Иначе миграции применяет один процесс под advisory lock.
+    """
+    config = alembic_config()
+    heads = head_revisions(config)
+
+    async with engine.connect() as conn:
+        if await _current_revisions(conn) == heads:
+            return False
+        await conn.commit()
+
+        started = time.perf_counter()
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        await conn.commit()
+        try:
+            # Пока ждали блокировку, миграции мог применить другой процесс
+            current = await _current_revisions(conn)
+            if current == heads:
+                return False
+            # База из create_all без alembic_version: таблицы первой миграции уже есть
+            stamp_baseline = current is None and await conn.scalar(text("SELECT to_regclass('books') IS NOT NULL"))
+            await conn.commit()
+
+            logger.info("Migrating database schema from %s to %s", sorted(current or []) or "empty", sorted(heads))
+            await conn.run_sync(_upgrade, config, bool(stamp_baseline))
+            await conn.commit()
+            logger.info("Database schema migrated in %.2fs", time.perf_counter() - started)
+            return True
+        finally:
+            await conn.rollback()
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            await conn.commit()
@@ -0,0 +1,27 @@
+from typing import Sequence, Tuple
+
+from sqlalchemy import Index, text
+
+
+def search_indexes(table: str, columns: Sequence[str]) -> Tuple[Index, ...]:
+    """Индексы параметра search из миграции ff6f6cc854e1: trigram GIN на каждую колонку
+    и GIN по tsvector (выражение app.api.search.search_document) — для __table_args__ модели"""
+    # Скобки как в выражении, которое возвращает PostgreSQL: иначе autogenerate
+    # считает индекс измененным и пересоздает его
+    document = f"coalesce({columns[0]}, '')"
+    for position, column in enumerate(columns[1:]):
+        left = f"({document})" if position else document
+        document = f"({left} || ' ') || coalesce({column}, '')"
+    return (
+        *(
+            Index(
+                f"ix_{table}_{column}_trgm", column,
+                postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"},
+            )
+            for column in columns
+        ),
+        Index(
+            f"ix_{table}_search_tsv", text(f"to_tsvector('simple'::regconfig, {document})"),
+            postgresql_using="gin",
+        ),
+    )
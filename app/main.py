@@ -1,24 +1,42 @@
 import asyncio
+import logging
 import os
+import time
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import List, Optional
 
-from app.db.session import Session, engine, create_views_and_triggers
-from app.db.base_class import Base
-from app.api.deps import DBSession
+from app.db.migrations import migrate_database, wait_for_database
+from app.db.session import Session, engine, replica_engines
+from app.db.pool import pool_status
+from app.api.deps import DBSession, ReadDBSession
+from app.api.etag import etag_dependency
 from app.api.routes.libraries import router as libraries_router
 from app.api.routes.topics import router as topics_router
 from app.api.routes.authors import router as authors_router
 from app.api.routes.books import router as books_router
+from app.api.routes.book_copies import router as book_copies_router
 from app.api.routes.readers import router as readers_router
 from app.api.routes.subscriptions import router as subscriptions_router
-from app.crud.stats import get_library_stats, get_author_stats, get_active_subscriptions
+from app.api.routes.report_jobs import router as report_jobs_router
+from app.api.routes.holds import router as holds_router
+from app.core.archive import archive_nightly
+from app.core.cache import cache_stats
+from app.core.jobs import start_job_workers
+from app.core.holds import allocate_holds_periodically
+from app.core.overdue import flag_overdue_nightly
+from app.core.partitions import maintain_partitions_daily
+from app.core.config import ARCHIVE_AFTER_MONTHS, LOG_LEVEL, MIGRATE_ON_STARTUP, STATS_REFRESH_INTERVAL
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.crud.stats import get_library_stats, get_author_stats, get_active_subscriptions, get_book_prices, refresh_stats_views
 from app.schemas.stats import LibraryStats, AuthorStats, SubscriptionStats
 
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("app")
+
 app = FastAPI(
     title="Library Management System",
     version="1.0.0",
@@ -26,6 +44,8 @@ app = FastAPI(
     redoc_url="/api/redoc"
 )
 
+app.add_middleware(MetricsMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -34,55 +54,57 @@ app.include_router(libraries_router)
 app.include_router(topics_router)
 app.include_router(authors_router)
 app.include_router(books_router)
+app.include_router(book_copies_router)
 app.include_router(readers_router)
 app.include_router(subscriptions_router)
+app.include_router(report_jobs_router)
+app.include_router(holds_router)
 
 async def init_db():
-    """Initialize database tables, views and triggers"""
-    max_retries = 3
-    for attempt in range(max_retries):
+    """Дождаться базы и, если нужно, применить миграции (таблицы, представления, триггеры)"""
+    started = time.perf_counter()
+    await wait_for_database(engine)
+    if MIGRATE_ON_STARTUP:
+        migrated = await migrate_database(engine)
+        logger.info("Database schema %s", "migrated" if migrated else "is up to date")
+    logger.info("Database ready in %.3fs", time.perf_counter() - started)
+
+async def refresh_stats_periodically():
+    """Периодическое обновление материализованной статистики"""
+    while True:
+        await asyncio.sleep(STATS_REFRESH_INTERVAL)
         try:
-            print(f"🔄 Database initialization attempt {attempt + 1}/{max_retries}")
-            
-            # Создаем таблицы
-            async with engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-            print("✅ Database tables created successfully!")
-            
-            # Ждем немного перед созданием представлений
-            await asyncio.sleep(1)
-            
-            # Создаем представления и триггеры
-            await create_views_and_triggers()
-            
-            print("✅ Database initialization completed successfully!")
-            return
-            
+            async with Session() as session:
+                await refresh_stats_views(session)
         except Exception as e:
-            print(f"❌ Database initialization attempt {attempt + 1} failed: {e}")
-            if attempt < max_retries - 1:
-                print("🔄 Retrying in 3 seconds...")
-                await asyncio.sleep(3)
-            else:
-                print("❌ All database initialization attempts failed")
-                raise
+            logger.error("Error refreshing stats views: %s", e)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
-    print("🚀 Starting Library Management System...")
+    logger.info("Starting Library Management System...")
+    # Без базы и актуальной схемы процесс не стартует: перезапуск оставляем оркестратору
+    await init_db()
+    logger.info("Application started successfully")
     
-    # Wait a bit for database to be ready
-    await asyncio.sleep(5)
-    
-    try:
-        # Initialize database
-        await init_db()
-        print("🎉 Application started successfully!")
-    except Exception as e:
-        print(f"💥 Application startup failed: {e}")
-        # Приложение все равно запускается, но без представлений
-        print("⚠️  Application running without views and triggers")
+    app.state.stats_refresh_task = asyncio.create_task(refresh_stats_periodically())
+    app.state.job_tasks = start_job_workers()
+    app.state.overdue_task = asyncio.create_task(flag_overdue_nightly())
+    app.state.holds_task = asyncio.create_task(allocate_holds_periodically())
+    app.state.partitions_task = asyncio.create_task(maintain_partitions_daily())
+    app.state.archive_task = asyncio.create_task(archive_nightly()) if ARCHIVE_AFTER_MONTHS > 0 else None
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks"""
+    app.state.stats_refresh_task.cancel()
+    app.state.overdue_task.cancel()
+    app.state.holds_task.cancel()
+    app.state.partitions_task.cancel()
+    if app.state.archive_task is not None:
+        app.state.archive_task.cancel()
+    for task in app.state.job_tasks:
+        task.cancel()
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -111,19 +133,39 @@ async def health_check():
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Счетчики попаданий/промахов кэша по пространствам имен"""
+    return cache_stats()
+
+@app.get("/pool/stats")
+async def get_pool_stats():
+    """Занятость пула соединений и время ожидания соединения"""
+    return {
+        "primary": pool_status(engine.pool),
+        "replicas": [pool_status(replica.pool) for replica in replica_engines],
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в формате Prometheus: латентность маршрутов, SQL, пулы соединений, кэш"""
+    pools = {"primary": engine.pool}
+    pools.update({f"replica{i}": replica.pool for i, replica in enumerate(replica_engines)})
+    return PlainTextResponse(render_metrics(pools, cache_stats()), media_type="text/plain; version=0.0.4")
+
 # Report endpoints
-@app.get("/reports/library-stats/", response_model=List[LibraryStats])
+@app.get("/reports/library-stats/", response_model=List[LibraryStats], dependencies=[etag_dependency("stats")])
 async def get_library_stats_report(
-    db: DBSession,
+    db: ReadDBSession,
     min_books: Optional[int] = Query(0, description="Минимальное количество книг"),
     sort_by: Optional[str] = Query("total_books", description="Поле для сортировки")
 ):
     """Отчет по статистике библиотек"""
     return await get_library_stats(db, min_books, sort_by)
 
-@app.get("/reports/author-stats/", response_model=List[AuthorStats])
+@app.get("/reports/author-stats/", response_model=List[AuthorStats], dependencies=[etag_dependency("stats")])
 async def get_author_stats_report(
-    db: DBSession,
+    db: ReadDBSession,
     min_books: Optional[int] = Query(1, description="Минимальное количество книг"),
     country: Optional[str] = Query(None, description="Фильтр по стране"),
     sort_by: Optional[str] = Query("total_books", description="Поле для сортировки")
@@ -131,59 +173,33 @@ async def get_author_stats_report(
     """Отчет по статистике авторов"""
     return await get_author_stats(db, min_books, country, sort_by)
 
-@app.get("/reports/active-subscriptions/", response_model=List[SubscriptionStats])
+@app.get("/reports/active-subscriptions/", response_model=List[SubscriptionStats], dependencies=[etag_dependency("subscriptions", "books", "readers", "libraries")])
 async def get_active_subscriptions_report(
-    db: DBSession,
+    db: ReadDBSession,
     library_id: Optional[int] = Query(None, description="Фильтр по библиотеке"),
     sort_by: Optional[str] = Query("issue_date", description="Поле для сортировки")
 ):
     """Отчет по активным подпискам"""
     return await get_active_subscriptions(db, library_id, sort_by)
 
-@app.get("/reports/book-prices/")
+@app.post("/reports/refresh/")
+async def refresh_reports(db: DBSession):
+    """Принудительное обновление материализованной статистики"""
+    refreshed = await refresh_stats_views(db)
+    return {"refreshed": refreshed}
+
+@app.get("/reports/book-prices/", dependencies=[etag_dependency("books", "libraries")])
 async def get_book_prices_report(
-    db: DBSession,
+    db: ReadDBSession,
     min_price: Optional[float] = Query(0, description="Минимальная цена"),
     max_price: Optional[float] = Query(1000, description="Максимальная цена"),
     topic_id: Optional[int] = Query(None, description="Фильтр по теме")
 ):
     """Отчет по ценам книг с группировкой по библиотекам"""
     try:
-        query = """
-        SELECT 
-            l.name as library_name,
-            COUNT(*) as book_count,
-            AVG(b.price) as avg_price,
-            MAX(b.price) as max_price,
-            MIN(b.price) as min_price,
-            SUM(b.quantity * b.price) as total_value
-        FROM books b
-        JOIN libraries l ON b.library_id = l.library_id
-        WHERE b.price BETWEEN :min_price AND :max_price
-        """
-        
-        params = {"min_price": min_price, "max_price": max_price}
-        
-        if topic_id:
-            query += " AND b.topic_id = :topic_id"
-            params["topic_id"] = topic_id
-        
-        query += " GROUP BY l.library_id, l.name HAVING COUNT(*) > 0 ORDER BY total_value DESC"
-        
-        result = await db.execute(text(query), params)
-        rows = result.all()
-        
-        return [{
-            "library_name": row.library_name,
-            "book_count": row.book_count,
-            "avg_price": float(row.avg_price) if row.avg_price else 0,
-            "max_price": float(row.max_price) if row.max_price else 0,
-            "min_price": float(row.min_price) if row.min_price else 0,
-            "total_value": float(row.total_value) if row.total_value else 0
-        } for row in rows]
-        
+        return await get_book_prices(db, min_price, max_price, topic_id)
     except Exception as e:
-        print(f"❌ Error generating book prices report: {e}")
+        logger.exception("Error generating book prices report: %s", e)
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
 
 
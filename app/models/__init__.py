@@ -2,7 +2,13 @@ from .library import Library
 from .topic import Topic
 from .author import Author
 from .book import Book
+from .book_copy import BookCopy
 from .reader import Reader
-from .subscription import Subscription
+from .subscription import Subscription, SubscriptionsOpenSince
+from .subscription_archive import SubscriptionArchiveFile
+from .report_job import ReportJob
+from .stats_view_refresh import StatsViewRefresh
+from .table_version import TableVersion
+from .hold import Hold
 
-__all__ = ["Library", "Topic", "Author", "Book", "Reader", "Subscription"]
\ No newline at end of file
+__all__ = ["Library", "Topic", "Author", "Book", "BookCopy", "Reader", "Subscription", "SubscriptionsOpenSince", "SubscriptionArchiveFile", "ReportJob", "StatsViewRefresh", "TableVersion", "Hold"]
\ No newline at end of file
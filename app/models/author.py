@@ -2,6 +2,7 @@ from sqlalchemy import Column, Integer, String, Text, Numeric, Date, DateTime, F
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
+from app.db.search_indexes import search_indexes
 
 class Author(Base):
     __tablename__ = "authors"
@@ -11,4 +12,8 @@ class Author(Base):
     birth_year = Column(Integer)
     country = Column(String(100))
     
-    books = relationship("Book", back_populates="author")
\ No newline at end of file
+    books = relationship("Book", back_populates="author")
+    
+    __table_args__ = (
+        *search_indexes('authors', ['full_name', 'country']),
+    )
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, CheckConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, CheckConstraint, Index
+from sqlalchemy.orm import relationship, synonym
 from app.db.base_class import Base
+from app.db.search_indexes import search_indexes
 
 class Book(Base):
     __tablename__ = "books"
@@ -13,7 +14,11 @@ class Book(Base):
     publisher = Column(String(100))
     publish_place = Column(String(100))
     publish_year = Column(Integer)
-    quantity = Column(Integer, default=1)
+    # Число свободных экземпляров. Ведут триггеры book_copies: изменения копятся без блокировки
+    # строки книги и переносятся сюда при коммите (миграция b5d1e8c3a72f). До коммита своих
+    # изменений не отражает. Задается через экземпляры (crud.book_copy.set_available_copies)
+    available_copies = Column(Integer, nullable=False, server_default="0")
+    quantity = synonym("available_copies")
     price = Column(Numeric(10, 2), default=0)
     
     library = relationship("Library", back_populates="books")
@@ -23,6 +28,11 @@ class Book(Base):
     
     __table_args__ = (
         CheckConstraint('publish_year BETWEEN 1500 AND EXTRACT(YEAR FROM CURRENT_DATE)', name='check_publish_year'),
-        CheckConstraint('quantity >= 0', name='check_quantity'),
         CheckConstraint('price >= 0', name='check_price'),
+        CheckConstraint('available_copies >= 0', name='check_available_copies'),
+        Index('ix_books_library_id_book_id', 'library_id', 'book_id'),
+        Index('ix_books_topic_id', 'topic_id'),
+        Index('ix_books_author_id', 'author_id'),
+        Index('ix_books_available_copies_book_id', 'available_copies', 'book_id'),
+        *search_indexes('books', ['title', 'publisher', 'publish_place']),
     )
\ No newline at end of file
@@ -0,0 +1,35 @@
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, DateTime, ForeignKey, Index, Table, text
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+class BookCopy(Base):
+    __tablename__ = "book_copies"
+    
+    copy_id = Column(Integer, primary_key=True, index=True)
+    book_id = Column(Integer, ForeignKey('books.book_id', ondelete='CASCADE'), nullable=False)
+    barcode = Column(
+        String(32), nullable=False,
+        server_default=text("'BC' || lpad(nextval('book_copies_barcode_seq')::text, 10, '0')")
+    )
+    # available | on_loan | withdrawn; Book.available_copies — число available
+    status = Column(String(20), nullable=False, server_default="available")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index('ux_book_copies_barcode', 'barcode', unique=True),
+        Index('ix_book_copies_book_id', 'book_id'),
+        # Свободные экземпляры книги: выдача берет первый незаблокированный
+        Index('ix_book_copies_available', 'book_id', 'copy_id', postgresql_where=text("status = 'available'")),
+    )
+
+# Изменения Book.available_copies в текущих транзакциях: пишут триггеры book_copies,
+# при коммите переносит в books и удаляет apply_book_copy_deltas (миграция b5d1e8c3a72f)
+book_copy_deltas = Table(
+    "book_copy_deltas",
+    Base.metadata,
+    Column("xact_id", BigInteger, nullable=False, server_default=text("txid_current()")),
+    Column("book_id", Integer, nullable=False),
+    Column("delta", Integer, nullable=False),
+    Column("apply", Boolean, nullable=False, server_default="false"),
+    Index("ix_book_copy_deltas_xact_id", "xact_id"),
+)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, text
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+class Hold(Base):
+    __tablename__ = "holds"
+    
+    hold_id = Column(Integer, primary_key=True, index=True)
+    book_id = Column(Integer, ForeignKey('books.book_id', ondelete='CASCADE'), nullable=False)
+    reader_id = Column(Integer, ForeignKey('readers.reader_id', ondelete='CASCADE'), nullable=False)
+    # Библиотека, где будет оформлена выдача (библиотека книги)
+    library_id = Column(Integer, ForeignKey('libraries.library_id', ondelete='CASCADE'), nullable=False)
+    # waiting | fulfilled | cancelled
+    status = Column(String(20), nullable=False, server_default="waiting")
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    fulfilled_at = Column(DateTime(timezone=True))
+    # Выдача, оформленная при возврате книги. Без внешнего ключа: у секционированной subscriptions
+    # уникален только (subscription_id, issue_date); при удалении выдачи ссылку обнуляет trg_unlink_subscription_holds
+    subscription_id = Column(Integer)
+    
+    __table_args__ = (
+        # Очередь книги: следующий в очереди — первая запись индекса
+        Index('ix_holds_queue', 'book_id', 'created_at', 'hold_id', postgresql_where=text("status = 'waiting'")),
+        # Читатель стоит в очереди на книгу не больше одного раза
+        Index('ux_holds_waiting_reader', 'book_id', 'reader_id', unique=True, postgresql_where=text("status = 'waiting'")),
+        Index('ix_holds_reader_id', 'reader_id'),
+        Index('ix_holds_subscription_id', 'subscription_id', postgresql_where=text('subscription_id IS NOT NULL')),
+    )
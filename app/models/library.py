@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, CheckConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
+from app.db.search_indexes import search_indexes
 
 class Library(Base):
     __tablename__ = "libraries"
@@ -11,6 +12,13 @@ class Library(Base):
     address = Column(String(200), nullable=False)
     phone = Column(String(20))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Срок выдачи в днях: due_date новой подписки = issue_date + loan_period_days
+    loan_period_days = Column(Integer, nullable=False, server_default="14")
     
     books = relationship("Book", back_populates="library", cascade="all, delete-orphan")
-    subscriptions = relationship("Subscription", back_populates="library", cascade="all, delete-orphan")
\ No newline at end of file
+    subscriptions = relationship("Subscription", back_populates="library", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        CheckConstraint('loan_period_days > 0', name='check_loan_period_days'),
+        *search_indexes('libraries', ['name', 'address', 'phone']),
+    )
@@ -2,6 +2,7 @@ from sqlalchemy import Column, Integer, String, Text, Numeric, Date, DateTime, F
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
+from app.db.search_indexes import search_indexes
 
 class Reader(Base):
     __tablename__ = "readers"
@@ -12,4 +13,8 @@ class Reader(Base):
     phone = Column(String(20), unique=True, index=True)
     reg_date = Column(Date, server_default=func.current_date())
     
-    subscriptions = relationship("Subscription", back_populates="reader")
\ No newline at end of file
+    subscriptions = relationship("Subscription", back_populates="reader")
+    
+    __table_args__ = (
+        *search_indexes('readers', ['full_name', 'address', 'phone']),
+    )
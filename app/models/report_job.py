@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    
+    job_id = Column(Integer, primary_key=True, index=True)
+    report = Column(String(50), nullable=False)
+    params = Column(JSONB, nullable=False, server_default="{}")
+    # queued | running | done | failed | cancelled
+    status = Column(String(20), nullable=False, server_default="queued")
+    result = Column(JSONB)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        # Выборка очереди воркерами и очистка по сроку хранения
+        Index('ix_report_jobs_status_job_id', 'status', 'job_id'),
+        Index('ix_report_jobs_finished_at', 'finished_at'),
+    )
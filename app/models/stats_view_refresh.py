@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+# Время последнего обновления материализованного представления статистики.
+# Отдельной строкой, а не колонкой now() в mv_*: иначе REFRESH ... CONCURRENTLY
+# каждый раз переписывал бы все строки представления
+class StatsViewRefresh(Base):
+    __tablename__ = "stats_view_refreshes"
+
+    view_name = Column(String(63), primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Date, Numeric, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, Date, Numeric, ForeignKey, CheckConstraint, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
@@ -6,13 +6,21 @@ from app.db.base_class import Base
 class Subscription(Base):
     __tablename__ = "subscriptions"
     
-    subscription_id = Column(Integer, primary_key=True, index=True)
+    # Ключ секционирования обязан входить в первичный ключ; subscription_id по-прежнему уникален (последовательность)
+    subscription_id = Column(Integer, primary_key=True, autoincrement=True)
     library_id = Column(Integer, ForeignKey('libraries.library_id', ondelete='CASCADE'), nullable=False)
     book_id = Column(Integer, ForeignKey('books.book_id', ondelete='CASCADE'), nullable=False)
     reader_id = Column(Integer, ForeignKey('readers.reader_id', ondelete='CASCADE'), nullable=False)
-    issue_date = Column(Date, server_default=func.current_date())
+    issue_date = Column(Date, primary_key=True, nullable=False, server_default=func.current_date())
     return_date = Column(Date)
+    # Заполняет триггер trg_set_due_date по сроку выдачи библиотеки, если не задано явно;
+    # при смене issue_date или library_id пересчитывает trg_update_due_date
+    due_date = Column(Date)
+    # Дней просрочки на момент последнего прогона flag_overdue_subscriptions (или возврата)
+    overdue_days = Column(Integer, nullable=False, server_default="0")
     deposit = Column(Numeric(10, 2), default=0)
+    # Выданный экземпляр; триггер trg_claim_book_copy берет свободный, если не задан
+    copy_id = Column(Integer, ForeignKey('book_copies.copy_id', ondelete='SET NULL'))
     
     library = relationship("Library", back_populates="subscriptions")
     book = relationship("Book", back_populates="subscriptions")
@@ -20,4 +28,29 @@ class Subscription(Base):
     
     __table_args__ = (
         CheckConstraint('deposit >= 0', name='check_deposit'),
-    )
\ No newline at end of file
+        Index('ix_subscriptions_book_id_return_date', 'book_id', 'return_date'),
+        Index('ix_subscriptions_reader_id_return_date', 'reader_id', 'return_date'),
+        Index('ix_subscriptions_library_id_return_date', 'library_id', 'return_date'),
+        # Частичный индекс для активных выдач
+        Index('ix_subscriptions_active', 'library_id', 'issue_date', postgresql_where=text('return_date IS NULL')),
+        Index('ix_subscriptions_copy_id', 'copy_id'),
+        # Открытые выдачи по сроку возврата: список просрочек и ночная отметка идут по этому индексу
+        Index('ix_subscriptions_open_due_date', 'due_date', 'subscription_id', postgresql_where=text('return_date IS NULL')),
+        # Помесячные секции по issue_date; будущие создает app.core.partitions
+        {"postgresql_partition_by": "RANGE (issue_date)"},
+    )
+
+
+# Нижняя граница issue_date открытых выдач (одна строка). Условие issue_date >= open_since
+# в запросах активных выдач отсекает старые секции при выполнении. Триггер
+# trg_subscriptions_open_since опускает границу для выдач задним числом,
+# refresh_subscriptions_open_since() поднимает ее по расписанию
+class SubscriptionsOpenSince(Base):
+    __tablename__ = "subscriptions_open_since"
+    
+    id = Column(Integer, primary_key=True, server_default="1")
+    open_since = Column(Date, nullable=False, server_default=func.current_date())
+    
+    __table_args__ = (
+        CheckConstraint('id = 1', name='check_single_row'),
+    )
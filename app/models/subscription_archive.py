@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Index
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+# Файл холодного архива выдач; строка добавляется в той же транзакции, что удаляет
+# заархивированные выдачи из subscriptions: файлы без строки здесь не читаются
+class SubscriptionArchiveFile(Base):
+    __tablename__ = "subscription_archive_files"
+    
+    file_id = Column(Integer, primary_key=True, index=True)
+    # Без внешних ключей: архив переживает удаление библиотеки
+    library_id = Column(Integer, nullable=False)
+    # Первое число месяца issue_date
+    month = Column(Date, nullable=False)
+    # Относительно ARCHIVE_DIR
+    path = Column(String(512), nullable=False)
+    row_count = Column(Integer, nullable=False)
+    first_subscription_id = Column(Integer, nullable=False)
+    last_subscription_id = Column(Integer, nullable=False)
+    # Читатели в файле: история читателя открывает только его файлы
+    reader_ids = Column(ARRAY(Integer), nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index('ux_subscription_archive_files_path', 'path', unique=True),
+        Index('ix_subscription_archive_files_library_month', 'library_id', 'month'),
+        Index('ix_subscription_archive_files_reader_ids', 'reader_ids', postgresql_using='gin'),
+    )
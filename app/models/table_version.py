@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Integer, BigInteger
+from app.db.base_class import Base
+
+# Версии таблиц для ETag: версия — сумма счетчиков таблицы. Счетчики увеличивает
+# триггер trg_version_<таблица> (раз на оператор) в транзакции записи.
+# shard < 16 — основные счетчики, остальные — счетчики процессов при их нехватке
+# (переносит в основной compact_table_versions при обслуживании)
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(63), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default="0")
@@ -3,6 +3,13 @@ from typing import Optional
 from datetime import datetime
 from decimal import Decimal
 
+from app.schemas.author import Author
+from app.schemas.library import Library
+from app.schemas.topic import Topic
+
+# Экземпляров на книгу за один запрос (создание, PUT, массовая загрузка) — как count в POST /copies
+MAX_BOOK_QUANTITY = 1000
+
 class BookBase(BaseModel):
     title: str
     publisher: Optional[str] = None
@@ -38,6 +45,8 @@ class BookCreate(BaseModel):
     def validate_quantity(cls, v):
         if v < 0:
             raise ValueError('Quantity cannot be negative')
+        if v > MAX_BOOK_QUANTITY:
+            raise ValueError(f'Quantity cannot exceed {MAX_BOOK_QUANTITY}')
         return v
 
     @field_validator('price')
@@ -55,6 +64,12 @@ class Book(BookBase):
     class Config:
         from_attributes = True
 
+class BookExpanded(Book):
+    """Книга со связанными объектами по ?expand=author,topic,library"""
+    author: Optional[Author] = None
+    topic: Optional[Topic] = None
+    library: Optional[Library] = None
+
 class BookDetailed(BaseModel):
     book_id: int
     title: str
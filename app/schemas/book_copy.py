@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+from datetime import datetime
+
+from app.schemas.book import MAX_BOOK_QUANTITY
+
+class BookCopiesCreate(BaseModel):
+    """Новые экземпляры: count со штрихкодами по умолчанию или явный список barcodes"""
+    count: Optional[int] = Field(None, gt=0, le=MAX_BOOK_QUANTITY)
+    barcodes: Optional[List[str]] = Field(None, min_length=1, max_length=MAX_BOOK_QUANTITY)
+    
+    @model_validator(mode='after')
+    def validate_count_or_barcodes(self):
+        if (self.count is None) == (self.barcodes is None):
+            raise ValueError('Exactly one of count or barcodes is required')
+        return self
+
+class BookCopy(BaseModel):
+    copy_id: int
+    book_id: int
+    barcode: str
+    status: str
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
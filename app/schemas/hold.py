@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class HoldCreate(BaseModel):
+    book_id: int
+    reader_id: int
+
+class Hold(BaseModel):
+    hold_id: int
+    book_id: int
+    reader_id: int
+    library_id: int
+    status: str
+    created_at: datetime
+    fulfilled_at: Optional[datetime] = None
+    subscription_id: Optional[int] = None
+    # Место в очереди книги (1 — следующий); только для status == "waiting"
+    position: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
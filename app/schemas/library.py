@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
@@ -6,6 +6,7 @@ class LibraryBase(BaseModel):
     name: str
     address: str
     phone: Optional[str] = None
+    loan_period_days: int = Field(14, gt=0, description="Срок выдачи книг, дней")
 
 class LibraryCreate(LibraryBase):
     pass
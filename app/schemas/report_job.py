@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+class ReportJob(BaseModel):
+    job_id: int
+    report: str
+    params: Dict[str, Any]
+    status: str
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Результат отчета, когда status == "done"
+    result: Optional[Any] = None
+    
+    class Config:
+        from_attributes = True
@@ -1,12 +1,14 @@
 from pydantic import BaseModel
 from typing import Optional
 from decimal import Decimal
+from datetime import datetime
 
 class LibraryStats(BaseModel):
     library_name: str
     total_books: int
     total_copies: int
     total_value: Decimal
+    refreshed_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -16,6 +18,7 @@ class AuthorStats(BaseModel):
     total_books: int
     total_copies: int
     avg_price: Decimal
+    refreshed_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -1,33 +1,75 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import date
 from decimal import Decimal
 
+from app.schemas.book import Book
+from app.schemas.library import Library
+from app.schemas.reader import Reader
+
 class SubscriptionBase(BaseModel):
     library_id: int
     book_id: int
     reader_id: int
     issue_date: Optional[date] = None
     return_date: Optional[date] = None
+    # Не задан — issue_date + срок выдачи библиотеки
+    due_date: Optional[date] = None
     deposit: Decimal = 0
+    # Конкретный экземпляр (выдача по штрихкоду); не задан — любой свободный
+    copy_id: Optional[int] = None
 
 class SubscriptionCreate(SubscriptionBase):
     pass
 
 class Subscription(SubscriptionBase):
     subscription_id: int
+    overdue_days: int = 0
     
     class Config:
         from_attributes = True
 
+class SubscriptionExpanded(Subscription):
+    """Подписка со связанными объектами по ?expand=book,reader,library"""
+    book: Optional[Book] = None
+    reader: Optional[Reader] = None
+    library: Optional[Library] = None
+
 class SubscriptionDetailed(BaseModel):
     subscription_id: int
     issue_date: date
     return_date: Optional[date]
+    due_date: Optional[date] = None
     deposit: Decimal
     book_title: str
     reader_name: str
     library_name: str
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SubscriptionOverdue(BaseModel):
+    subscription_id: int
+    reader_id: int
+    issue_date: date
+    due_date: date
+    days_overdue: int
+    deposit: Decimal
+    book_title: str
+    reader_name: str
+    library_name: str
+
+class SubscriptionHistory(Subscription):
+    """Выдача из истории читателя; archived — из холодного архива"""
+    archived: bool = False
+
+class SubscriptionBatchReturn(BaseModel):
+    subscription_ids: List[int]
+
+class SubscriptionBatchResult(BaseModel):
+    index: int
+    success: bool
+    subscription_id: Optional[int] = None
+    # Бронь, которой при возврате выдан освободившийся экземпляр
+    allocated_hold_id: Optional[int] = None
+    detail: Optional[str] = None
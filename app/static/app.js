@@ -1333,7 +1333,7 @@ class LibraryApp {
         // Fallback для активных подписок
     async generateActiveSubscriptionsFallback() {
         try {
-            const response = await fetch('/api/subscriptions/?active_only=true');
+            const response = await fetch('/api/subscriptions/?active_only=true&expand=book,reader,library');
             if (!response.ok) throw new Error('Failed to fetch subscriptions');
             
             const subscriptions = await response.json();
@@ -1344,15 +1344,10 @@ class LibraryApp {
             
             for (const sub of activeSubs.slice(0, 50)) { // Ограничиваем для производительности
                 try {
-                    const [bookResponse, readerResponse, libraryResponse] = await Promise.all([
-                        fetch(`/api/books/${sub.book_id}`).catch(() => ({ ok: false })),
-                        fetch(`/api/readers/${sub.reader_id}`).catch(() => ({ ok: false })),
-                        fetch(`/api/libraries/${sub.library_id}`).catch(() => ({ ok: false }))
-                    ]);
-                    
-                    const book = bookResponse.ok ? await bookResponse.json() : { title: 'Неизвестно' };
-                    const reader = readerResponse.ok ? await readerResponse.json() : { full_name: 'Неизвестно' };
-                    const library = libraryResponse.ok ? await libraryResponse.json() : { name: 'Неизвестно' };
+                    // Книга, читатель и библиотека уже вложены в ответ (expand)
+                    const book = sub.book || { title: 'Неизвестно' };
+                    const reader = sub.reader || { full_name: 'Неизвестно' };
+                    const library = sub.library || { name: 'Неизвестно' };
                     
                     detailedSubs.push({
                         subscription_id: sub.subscription_id,
@@ -1465,8 +1460,8 @@ class LibraryApp {
         const librarySelect = filtersDiv ? filtersDiv.querySelector('#report-library_id') : null;
         const libraryId = librarySelect ? librarySelect.value : null;
         
-        // Используем рабочий эндпоинт с active_only=true
-        let url = '/api/subscriptions/?active_only=true&limit=100';
+        // Используем рабочий эндпоинт с active_only=true; связанные объекты приходят в том же ответе
+        let url = '/api/subscriptions/?active_only=true&limit=100&expand=book,reader,library';
         
         if (libraryId) {
             url += `&library_id=${libraryId}`;
@@ -1507,52 +1502,6 @@ class LibraryApp {
         }
     }
 
-    // Метод для обогащения данных подписок
-    async enrichSubscriptionData(subscriptions) {
-        const enrichedData = [];
-        
-        for (const sub of subscriptions) {
-            try {
-                console.log(`📝 Processing subscription ${sub.subscription_id}:`, sub);
-                
-                // Получаем детальную информацию параллельно
-                const [book, reader, library] = await Promise.all([
-                    this.fetchItem(`/api/books/${sub.book_id}`, { title: 'Неизвестная книга' }),
-                    this.fetchItem(`/api/readers/${sub.reader_id}`, { full_name: 'Неизвестный читатель' }),
-                    this.fetchItem(`/api/libraries/${sub.library_id}`, { name: 'Неизвестная библиотека' })
-                ]);
-                
-                console.log(`✅ Enriched:`, { book, reader, library });
-                
-                enrichedData.push({
-                    subscription_id: sub.subscription_id,
-                    reader_name: reader.full_name,
-                    book_title: book.title,
-                    library_name: library.name,
-                    issue_date: sub.issue_date,
-                    return_date: sub.return_date,
-                    deposit: sub.deposit || 0
-                });
-                
-            } catch (error) {
-                console.error(`❌ Error enriching subscription ${sub.subscription_id}:`, error);
-                
-                // Добавляем базовую информацию даже если не удалось обогатить
-                enrichedData.push({
-                    subscription_id: sub.subscription_id,
-                    reader_name: 'Ошибка загрузки',
-                    book_title: 'Ошибка загрузки',
-                    library_name: 'Ошибка загрузки',
-                    issue_date: sub.issue_date,
-                    return_date: sub.return_date,
-                    deposit: sub.deposit || 0
-                });
-            }
-        }
-        
-        return enrichedData;
-    }
-
     // Вспомогательный метод для безопасного fetch
     async fetchItem(url, defaultValue = {}) {
         try {
@@ -1668,12 +1617,10 @@ class LibraryApp {
             try {
                 console.log(`📝 Processing subscription ${sub.subscription_id}:`, sub);
                 
-                // Получаем детальную информацию
-                const [book, reader, library] = await Promise.all([
-                    this.fetchItem(`/api/books/${sub.book_id}`, { title: 'Неизвестная книга' }),
-                    this.fetchItem(`/api/readers/${sub.reader_id}`, { full_name: 'Неизвестный читатель' }),
-                    this.fetchItem(`/api/libraries/${sub.library_id}`, { name: 'Неизвестная библиотека' })
-                ]);
+                // Детальная информация вложена в подписку (expand=book,reader,library)
+                const book = sub.book || { title: 'Неизвестная книга' };
+                const reader = sub.reader || { full_name: 'Неизвестный читатель' };
+                const library = sub.library || { name: 'Неизвестная библиотека' };
                 
                 // Определяем статус
                 const status = this.getSubscriptionStatus(sub);
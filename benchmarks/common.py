@@ -0,0 +1,76 @@
+import json
+import logging
+import math
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+
+def database_dsn() -> str:
+    """DATABASE_URL приложения в виде DSN для asyncpg"""
+    from app.core.config import DATABASE_URL
+    return DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def make_client(url: Optional[str] = None, timeout: float = 60) -> httpx.AsyncClient:
+    """Клиент к запущенному серверу (url) или к приложению в этом процессе через ASGI.
+
+    В режиме ASGI startup не выполняется: схема и данные должны быть подготовлены заранее.
+    """
+    # Журнал httpx пишет строку на каждый запрос
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=timeout)
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], duration: float) -> Dict[str, float]:
+    """Латентность в миллисекундах и пропускная способность (запросов в секунду)"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "throughput": len(values) / duration if duration else 0.0,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000 if values else 0.0,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def results_meta(**config: Any) -> Dict[str, Any]:
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": config,
+    }
+
+
+def save_results(path: str, results: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,105 @@
+"""Потоковая выгрузка: число строк, скорость и пиковая память процесса (RSS).
+
+Приложение вызывается напрямую как ASGI с отбрасывающим send: httpx.ASGITransport
+буферизует все тело ответа и исказил бы замер памяти. Только Linux (/proc/self/statm).
+
+python -m benchmarks.export_rss --path /api/books/detailed/export --format ndjson
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict
+
+from benchmarks.common import results_meta, save_results
+
+EXPORT_PATHS = ("/api/books/detailed/export", "/api/books/list/export", "/api/subscriptions/detailed/export")
+
+# Период опроса RSS во время выгрузки, секунд
+RSS_SAMPLE_INTERVAL = 0.05
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    from app.main import app
+
+    state = {"status": None, "bytes": 0, "lines": 0, "peak_rss": rss_bytes()}
+    baseline_rss = state["peak_rss"]
+    done = asyncio.Event()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": args.path, "raw_path": args.path.encode(), "root_path": "",
+        "query_string": f"format={args.format}".encode(), "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            state["bytes"] += len(body)
+            state["lines"] += body.count(b"\n")
+
+    async def sample_rss():
+        while not done.is_set():
+            state["peak_rss"] = max(state["peak_rss"], rss_bytes())
+            await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+    sampler = asyncio.create_task(sample_rss())
+    started = time.perf_counter()
+    try:
+        await app(scope, receive, send)
+    finally:
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+    state["peak_rss"] = max(state["peak_rss"], rss_bytes())
+
+    if state["status"] != 200:
+        raise SystemExit(f"{args.path} returned {state['status']}")
+    # Для CSV первая строка — заголовок
+    rows = state["lines"] - (1 if args.format == "csv" else 0)
+    results = {
+        **results_meta(path=args.path, format=args.format),
+        "rows": rows,
+        "bytes": state["bytes"],
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+        "baseline_rss_mb": baseline_rss / 2 ** 20,
+        "peak_rss_mb": state["peak_rss"] / 2 ** 20,
+        "rss_growth_mb": (state["peak_rss"] - baseline_rss) / 2 ** 20,
+    }
+    print(
+        f"{args.path} ({args.format}): {rows:,} rows, {state['bytes'] / 2 ** 20:.1f} MiB in {elapsed:.1f}s"
+        f" ({results['rows_per_second']:,.0f} rows/s); RSS {results['baseline_rss_mb']:.1f} -> "
+        f"{results['peak_rss_mb']:.1f} MiB (+{results['rss_growth_mb']:.1f})"
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure streaming export throughput and peak RSS")
+    parser.add_argument("--path", choices=EXPORT_PATHS, default="/api/books/detailed/export")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--out", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.out:
+        save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
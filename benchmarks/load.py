@@ -0,0 +1,251 @@
+"""Нагрузочный тест API: смешанные сценарии чтения и записи, p50/p95/p99 и пропускная способность по эндпоинтам.
+
+По умолчанию приложение вызывается в этом процессе через ASGI (httpx.ASGITransport);
+--url направляет нагрузку на запущенный сервер (uvicorn). Данные — benchmarks.seed.
+
+python -m benchmarks.load --scenario mixed --concurrency 32 --duration 60 --out results.json
+python -m benchmarks.load --scenario mixed --baseline results.json
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks.common import load_results, make_client, results_meta, save_results, summarize
+from benchmarks.seed import TITLE_WORDS
+
+# Книги, за которые борются все воркеры сценария checkout-storm
+HOT_BOOKS = 20
+
+# Рост p95 сверх этой доли относительно базового прогона считается регрессией
+REGRESSION_THRESHOLD = 0.2
+
+# Доля ответов 4xx (кроме ожидаемых отказов 400), при которой прогон считается неудачным:
+# неверные пути или данные, а не нагрузка
+MAX_CLIENT_ERROR_SHARE = 0.5
+
+
+@dataclass
+class Context:
+    """Диапазоны идентификаторов в базе и общие для воркеров данные"""
+    max_book_id: int
+    max_reader_id: int
+    max_subscription_id: int
+    hot_books: List[Dict[str, int]]
+    rng: random.Random
+
+
+@dataclass
+class Recorder:
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    # Ожидаемые отказы бизнес-логики (нет экземпляров, книга уже возвращена)
+    rejected: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    # Все ответы 4xx, кроме ожидаемых отказов, в том числе допустимые для шага 404
+    client_errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    async def request(
+        self, client: httpx.AsyncClient, label: str, method: str, url: str, expected=(200,), **kwargs
+    ) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append(time.perf_counter() - start)
+        if response.status_code == 400 and 400 in expected:
+            self.rejected[label] += 1
+            return response
+        if 400 <= response.status_code < 500:
+            self.client_errors[label] += 1
+        if response.status_code not in expected:
+            self.errors[label] += 1
+        return response
+
+
+Step = Callable[[httpx.AsyncClient, Recorder, Context], Awaitable[None]]
+
+
+async def catalog_browse(client: httpx.AsyncClient, rec: Recorder, ctx: Context) -> None:
+    """Лента каталога курсором на несколько страниц, затем карточка книги"""
+    response = await rec.request(client, "GET /api/books/ page 1", "GET", "/api/books/", params={"limit": 50, "expand": "author"})
+    for _ in range(ctx.rng.randint(1, 4)):
+        cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+        if not cursor:
+            break
+        response = await rec.request(client, "GET /api/books/ cursor", "GET", "/api/books/", params={"limit": 50, "cursor": cursor})
+    await rec.request(client, "GET /api/books/{id}", "GET", f"/api/books/{ctx.rng.randint(1, ctx.max_book_id)}", expected=(200, 404))
+
+
+async def search(client: httpx.AsyncClient, rec: Recorder, ctx: Context) -> None:
+    mode = ctx.rng.choice(("contains", "prefix", "fuzzy", "fulltext"))
+    word = ctx.rng.choice(TITLE_WORDS)
+    query = word[:4] if mode == "prefix" else word
+    await rec.request(
+        client, f"GET /api/books/?search ({mode})", "GET", "/api/books/",
+        params={"search": query, "search_mode": mode, "limit": 20},
+    )
+
+
+async def checkout_storm(client: httpx.AsyncClient, rec: Recorder, ctx: Context) -> None:
+    """Выдача одной из немногих популярных книг и возврат: конкуренция за одни и те же строки"""
+    book = ctx.rng.choice(ctx.hot_books)
+    response = await rec.request(
+        client, "POST /api/subscriptions/", "POST", "/api/subscriptions/", expected=(200, 400),
+        json={**book, "reader_id": ctx.rng.randint(1, ctx.max_reader_id)},
+    )
+    if response is not None and response.status_code == 200:
+        subscription_id = response.json()["subscription_id"]
+        await rec.request(
+            client, "POST /api/subscriptions/{id}/return", "POST", f"/api/subscriptions/{subscription_id}/return", expected=(200, 400)
+        )
+
+
+async def report_refresh(client: httpx.AsyncClient, rec: Recorder, ctx: Context) -> None:
+    """Чтение отчетов с редким принудительным обновлением статистики"""
+    if ctx.rng.random() < 0.05:
+        await rec.request(client, "POST /reports/refresh/", "POST", "/reports/refresh/")
+    report = ctx.rng.choice(("library-stats", "author-stats", "active-subscriptions"))
+    await rec.request(client, f"GET /reports/{report}/", "GET", f"/reports/{report}/")
+
+
+async def reader_activity(client: httpx.AsyncClient, rec: Recorder, ctx: Context) -> None:
+    reader_id = ctx.rng.randint(1, ctx.max_reader_id)
+    await rec.request(client, "GET /api/subscriptions/reader/{id}/active", "GET", f"/api/subscriptions/reader/{reader_id}/active")
+    await rec.request(
+        client, "GET /api/subscriptions/{id}", "GET", f"/api/subscriptions/{ctx.rng.randint(1, ctx.max_subscription_id)}",
+        expected=(200, 404),
+    )
+
+
+# Сценарий -> [(шаг, вес)]; mixed примерно повторяет соотношение чтения и записи у живой библиотеки
+SCENARIOS: Dict[str, List[tuple]] = {
+    "catalog-browse": [(catalog_browse, 1)],
+    "search": [(search, 1)],
+    "checkout-storm": [(checkout_storm, 1)],
+    "report-refresh": [(report_refresh, 1)],
+    "mixed": [(catalog_browse, 40), (search, 25), (reader_activity, 20), (checkout_storm, 10), (report_refresh, 5)],
+}
+
+
+async def load_context(seed: int) -> Context:
+    from app.db.session import engine
+
+    async with engine.connect() as conn:
+        max_ids = (await conn.execute(text(
+            "SELECT (SELECT max(book_id) FROM books), (SELECT max(reader_id) FROM readers),"
+            " (SELECT max(subscription_id) FROM subscriptions)"
+        ))).one()
+        hot_books = (await conn.execute(text(
+            "SELECT book_id, library_id FROM books ORDER BY available_copies DESC, book_id LIMIT :n"
+        ), {"n": HOT_BOOKS})).mappings().all()
+    await engine.dispose()
+    if not hot_books or not max_ids[1]:
+        raise SystemExit("Database is empty: run python -m benchmarks.seed first")
+    return Context(
+        max_book_id=max_ids[0], max_reader_id=max_ids[1], max_subscription_id=max_ids[2] or 1,
+        hot_books=[dict(book) for book in hot_books], rng=random.Random(seed),
+    )
+
+
+async def _worker(client: httpx.AsyncClient, rec: Recorder, ctx: Context, steps: List[tuple], deadline: float) -> None:
+    functions = [step for step, _ in steps]
+    weights = [weight for _, weight in steps]
+    while time.perf_counter() < deadline:
+        step = ctx.rng.choices(functions, weights)[0]
+        await step(client, rec, ctx)
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    ctx = await load_context(args.seed)
+    steps = SCENARIOS[args.scenario]
+    rec = Recorder()
+    async with make_client(args.url) as client:
+        if args.warmup:
+            warmup = Recorder()
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(_worker(client, warmup, ctx, steps, deadline) for _ in range(args.concurrency)))
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(_worker(client, rec, ctx, steps, deadline) for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started
+
+    endpoints = {}
+    for label in sorted(rec.latencies):
+        endpoints[label] = {
+            **summarize(rec.latencies[label], duration),
+            "errors": rec.errors[label],
+            "rejected": rec.rejected[label],
+            "client_errors": rec.client_errors[label],
+        }
+    total = summarize([value for values in rec.latencies.values() for value in values], duration)
+    total["errors"] = sum(rec.errors.values())
+    total["client_errors"] = sum(rec.client_errors.values())
+    return {
+        **results_meta(
+            scenario=args.scenario, concurrency=args.concurrency, duration=args.duration,
+            target=args.url or "asgi", seed=args.seed,
+        ),
+        "total": total,
+        "endpoints": endpoints,
+    }
+
+
+def print_results(results: Dict, baseline: Optional[Dict] = None) -> List[str]:
+    """Таблица результатов; при baseline — изменение p95 и список регрессий"""
+    regressions = []
+    base_endpoints = baseline["endpoints"] if baseline else {}
+    print(f"{'endpoint':42} {'count':>8} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>5}  {'p95 vs base':>11}")
+    for label, stats in {**results["endpoints"], "TOTAL": results["total"]}.items():
+        base = base_endpoints.get(label) if label != "TOTAL" else (baseline or {}).get("total")
+        delta = ""
+        if base and base["p95_ms"]:
+            change = stats["p95_ms"] / base["p95_ms"] - 1
+            delta = f"{change:+.1%}"
+            if change > REGRESSION_THRESHOLD:
+                regressions.append(label)
+        print(
+            f"{label:42} {stats['count']:>8} {stats['throughput']:>8.1f} {stats['p50_ms']:>8.1f}"
+            f" {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>5}  {delta:>11}"
+        )
+    if baseline:
+        print(f"\nbaseline: {baseline.get('commit')}  current: {results.get('commit')}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test for the library API")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16, help="Одновременно работающих клиентов")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность замера, секунд")
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев перед замером (кэши, пулы), секунд")
+    parser.add_argument("--url", help="Адрес запущенного сервера; по умолчанию приложение в процессе через ASGI")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    regressions = print_results(results, load_results(args.baseline) if args.baseline else None)
+    if args.out:
+        save_results(args.out, results)
+    total = results["total"]
+    if total["count"] and total["client_errors"] > total["count"] * MAX_CLIENT_ERROR_SHARE:
+        print(f"{total['client_errors']} of {total['count']} responses are 4xx: check the API paths and the seeded data")
+        sys.exit(1)
+    if regressions:
+        print(f"p95 regressions over {REGRESSION_THRESHOLD:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Глубокая пагинация: skip/limit против курсора X-Next-Cursor на одной и той же странице.
+
+Курсор страницы берется из заголовка ответа на предыдущую страницу, затем обе формы
+запрашиваются по --repeat раз. Кэш ответов отключен, чтобы мерить запрос к базе.
+
+python -m benchmarks.pagination --page 1000 --limit 50 --sort-by title
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+os.environ["CACHE_ENABLED"] = "false"
+
+from benchmarks.common import make_client, results_meta, save_results, summarize  # noqa: E402
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+async def _timed(client, params: Dict, repeat: int) -> tuple:
+    latencies: List[float] = []
+    ids = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get("/api/books/", params=params)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        ids = [book["book_id"] for book in response.json()]
+    return latencies, ids
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    base = {"limit": args.limit, "sort_by": args.sort_by, "fields": "book_id,title"}
+    async with make_client(args.url) as client:
+        previous = await client.get("/api/books/", params={**base, "skip": (args.page - 2) * args.limit})
+        previous.raise_for_status()
+        cursor = previous.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            raise SystemExit(f"Page {args.page} does not exist: seed more books")
+
+        offset_latencies, offset_ids = await _timed(client, {**base, "skip": (args.page - 1) * args.limit}, args.repeat)
+        cursor_latencies, cursor_ids = await _timed(client, {**base, "cursor": cursor}, args.repeat)
+
+    offset = summarize(offset_latencies, sum(offset_latencies))
+    keyset = summarize(cursor_latencies, sum(cursor_latencies))
+    print(f"page {args.page} x {args.limit}, sort_by={args.sort_by}, same rows: {offset_ids == cursor_ids}")
+    for name, stats in (("offset", offset), ("cursor", keyset)):
+        print(f"{name:8} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms")
+    if keyset["p50_ms"]:
+        print(f"speedup (p50): {offset['p50_ms'] / keyset['p50_ms']:.1f}x")
+    return {
+        **results_meta(page=args.page, limit=args.limit, sort_by=args.sort_by, repeat=args.repeat, target=args.url or "asgi"),
+        "same_rows": offset_ids == cursor_ids,
+        "offset": offset,
+        "cursor": keyset,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offset vs cursor pagination at a deep page")
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--sort-by", default="title")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--url", help="Адрес запущенного сервера (кэш ответов на нем нужно отключить самостоятельно)")
+    parser.add_argument("--out", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+    if args.page < 2:
+        parser.error("--page must be at least 2")
+
+    results = asyncio.run(run(args))
+    if args.out:
+        save_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Синтетические данные для нагрузочных тестов: COPY пакетами, без ORM и построчных INSERT.
+
+Схема должна уже существовать (миграции / первый запуск приложения).
+На время загрузки пользовательские триггеры таблиц отключаются (нужны права владельца):
+выдачи не занимают экземпляры, версии таблиц не растут.
+Экземпляры (book_copies) создаются после загрузки INSERT ... SELECT: по одному на активную
+выдачу и сгенерированное число свободных на книгу (оно и есть quantity книги).
+
+python -m benchmarks.seed --books 1000000 --subscriptions 10000000 --truncate
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Sequence
+
+import asyncpg
+
+from benchmarks.common import database_dsn
+
+SEED_TABLES = ["libraries", "topics", "authors", "readers", "books", "subscriptions"]
+# Заполняются из уже загруженных таблиц, id — из последовательностей
+DERIVED_TABLES = ["book_copies"]
+
+# Экземпляры активных выдач
+LOANED_COPIES_SQL = [
+    """
+    INSERT INTO book_copies (book_id, barcode, status)
+    SELECT book_id, 'LS' || subscription_id, 'on_loan' FROM subscriptions WHERE return_date IS NULL
+    """,
+    """
+    UPDATE subscriptions s SET copy_id = c.copy_id
+    FROM book_copies c
+    WHERE c.barcode = 'LS' || s.subscription_id AND s.return_date IS NULL
+    """,
+]
+# Свободные экземпляры: $1 — book_id, $2 — их число (quantity книги)
+AVAILABLE_COPIES_SQL = """
+    INSERT INTO book_copies (book_id, barcode, status)
+    SELECT q.book_id, 'LB' || q.book_id || '-' || n, 'available'
+    FROM unnest($1::integer[], $2::integer[]) AS q(book_id, quantity), generate_series(1, q.quantity) AS n
+"""
+
+COPY_BATCH_SIZE = 50000
+
+# Выдачи за последние три года
+SUBSCRIPTION_HISTORY_DAYS = 1095
+
+# Слова названий: по ним же ищет сценарий search нагрузочного теста
+TITLE_WORDS = [
+    "война", "мир", "история", "город", "море", "время", "сад", "ночь", "дорога", "дом",
+    "звезда", "река", "зима", "лето", "сердце", "тень", "книга", "свет", "путь", "остров",
+]
+COUNTRIES = ["Россия", "Франция", "Германия", "Англия", "США", "Испания", "Италия", "Япония"]
+
+
+def _batches(records: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _copy(conn: asyncpg.Connection, table: str, columns: Sequence[str], records: Iterable[tuple]) -> int:
+    started = time.perf_counter()
+    total = 0
+    for batch in _batches(records, COPY_BATCH_SIZE):
+        await conn.copy_records_to_table(table, records=batch, columns=list(columns))
+        total += len(batch)
+    elapsed = time.perf_counter() - started
+    print(f"{table:14} {total:>12,} rows  {elapsed:8.1f}s  {total / max(elapsed, 1e-9):>12,.0f} rows/s")
+    return total
+
+
+def _title(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(TITLE_WORDS).capitalize()} и {rng.choice(TITLE_WORDS)} {i}"
+
+
+async def seed(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    conn = await asyncpg.connect(database_dsn())
+    try:
+        if args.truncate:
+            await conn.execute(f"TRUNCATE {', '.join(SEED_TABLES + DERIVED_TABLES)} RESTART IDENTITY CASCADE")
+        elif await conn.fetchval("SELECT EXISTS (SELECT 1 FROM books) OR EXISTS (SELECT 1 FROM libraries)"):
+            raise SystemExit("Tables are not empty: pass --truncate to replace existing data")
+
+        for table in SEED_TABLES + DERIVED_TABLES:
+            await conn.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+        try:
+            await _copy(conn, "libraries", ("library_id", "name", "address", "phone"), (
+                (i, f"Библиотека {i}", f"ул. Книжная, {i}", f"+7495{i:07d}") for i in range(1, args.libraries + 1)
+            ))
+            await _copy(conn, "topics", ("topic_id", "name", "description"), (
+                (i, f"Тема {i}", None) for i in range(1, args.topics + 1)
+            ))
+            await _copy(conn, "authors", ("author_id", "full_name", "birth_year", "country"), (
+                (i, f"Автор {i}", rng.randint(1800, 1990), rng.choice(COUNTRIES)) for i in range(1, args.authors + 1)
+            ))
+            await _copy(conn, "readers", ("reader_id", "full_name", "address", "phone"), (
+                (i, f"Читатель {i}", None, f"+7900{i:07d}") for i in range(1, args.readers + 1)
+            ))
+            # Выдача оформляется в библиотеке, где хранится книга
+            book_libraries = [rng.randint(1, args.libraries) for _ in range(args.books + 1)]
+            book_quantities = []
+
+            def books():
+                for i in range(1, args.books + 1):
+                    topic_id, author_id = rng.randint(1, args.topics), rng.randint(1, args.authors)
+                    title, publish_year = _title(rng, i), rng.randint(1900, 2024)
+                    book_quantities.append(rng.randint(1, 10))
+                    yield (
+                        i, book_libraries[i], topic_id, author_id, title, f"Издательство {i % 50}", publish_year,
+                        Decimal(rng.randint(100, 500000)) / 100, book_quantities[-1],
+                    )
+
+            await _copy(
+                conn, "books",
+                (
+                    "book_id", "library_id", "topic_id", "author_id", "title", "publisher", "publish_year", "price",
+                    # Триггеры book_copies отключены: счетчик свободных экземпляров — сразу
+                    "available_copies",
+                ),
+                books(),
+            )
+
+            today = date.today()
+            # Помесячные секции на весь диапазон выдач, иначе строки уйдут в subscriptions_default
+            await conn.execute(
+                "SELECT create_subscription_partitions($1, $2)",
+                today - timedelta(days=SUBSCRIPTION_HISTORY_DAYS), today + timedelta(days=92),
+            )
+
+            def subscriptions():
+                for i in range(1, args.subscriptions + 1):
+                    issue_date = today - timedelta(days=rng.randint(0, SUBSCRIPTION_HISTORY_DAYS))
+                    active = rng.random() < args.active_share
+                    return_date = None if active else issue_date + timedelta(days=rng.randint(1, 30))
+                    book_id = rng.randint(1, args.books)
+                    # Триггер trg_set_due_date отключен: срок по умолчанию библиотеки (14 дней)
+                    due_date = issue_date + timedelta(days=14)
+                    overdue_days = max(((return_date or today) - due_date).days, 0)
+                    yield (
+                        i, book_libraries[book_id], book_id, rng.randint(1, args.readers),
+                        issue_date, return_date, due_date, overdue_days, Decimal(rng.randint(0, 50)) * 10,
+                    )
+
+            await _copy(
+                conn, "subscriptions",
+                (
+                    "subscription_id", "library_id", "book_id", "reader_id", "issue_date", "return_date",
+                    "due_date", "overdue_days", "deposit",
+                ),
+                subscriptions(),
+            )
+
+            started = time.perf_counter()
+            for sql in LOANED_COPIES_SQL:
+                await conn.execute(sql)
+            await conn.execute(AVAILABLE_COPIES_SQL, list(range(1, args.books + 1)), book_quantities)
+            copies = await conn.fetchval("SELECT count(*) FROM book_copies")
+            print(f"{'book_copies':14} {copies:>12,} rows  {time.perf_counter() - started:8.1f}s")
+        finally:
+            for table in SEED_TABLES + DERIVED_TABLES:
+                await conn.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+
+        # Явные id в COPY не двигают последовательности
+        for table in SEED_TABLES:
+            pk = f"{table[:-1] if table != 'libraries' else 'library'}_id"
+            await conn.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{pk}'), COALESCE((SELECT max({pk}) FROM {table}), 0) + 1, false)"
+            )
+        # Триггер границы открытых выдач был отключен
+        await conn.execute("SELECT refresh_subscriptions_open_since()")
+        await conn.execute(f"ANALYZE {', '.join(SEED_TABLES + DERIVED_TABLES)}")
+        for view in ("mv_library_stats", "mv_author_stats"):
+            if await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", view):
+                await conn.execute(f"REFRESH MATERIALIZED VIEW {view}")
+                await conn.execute("UPDATE stats_view_refreshes SET refreshed_at = now() WHERE view_name = $1", view)
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed synthetic library data via COPY")
+    parser.add_argument("--libraries", type=int, default=20)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--authors", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=100000)
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--subscriptions", type=int, default=10000000)
+    parser.add_argument("--active-share", type=float, default=0.03, help="Доля невозвращенных выдач")
+    parser.add_argument("--seed", type=int, default=42, help="Seed генератора: одинаковые данные между прогонами")
+    parser.add_argument("--truncate", action="store_true", help="Очистить таблицы перед загрузкой")
+    asyncio.run(seed(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Сериализация подробных списков: модели pydantic + response_model против строк сразу в JSON.
+
+Запуск: python -m benchmarks.serialization --rows 50000
+База данных не нужна: строки синтетические, той же формы, что у запросов эндпоинтов.
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Callable, List, Sequence
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.engine import Row
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+from app.api.serialization import rows_to_json
+from app.schemas.book import BookDetailed, BooksList
+from app.schemas.subscription import SubscriptionDetailed
+
+
+def _rows(columns: List[str], values: Callable[[int], tuple], count: int) -> Sequence[Row]:
+    return IteratorResult(SimpleResultMetaData(columns), (values(i) for i in range(count))).all()
+
+
+def books_detailed_rows(count: int) -> Sequence[Row]:
+    return _rows(
+        ["book_id", "title", "quantity", "price", "author_name", "topic_name", "library_name"],
+        lambda i: (i, f"Книга {i}", i % 7, Decimal(i % 1000) / 4, f"Автор {i % 500}", f"Тема {i % 40}", f"Библиотека {i % 20}"),
+        count,
+    )
+
+
+def books_list_rows(count: int) -> Sequence[Row]:
+    return _rows(
+        ["book_id", "title", "quantity", "price"],
+        lambda i: (i, f"Книга {i}", i % 7, Decimal(i % 1000) / 4),
+        count,
+    )
+
+
+def subscriptions_detailed_rows(count: int) -> Sequence[Row]:
+    start = date(2020, 1, 1)
+    return _rows(
+        ["subscription_id", "issue_date", "return_date", "deposit", "book_title", "reader_name", "library_name"],
+        lambda i: (
+            i, start + timedelta(days=i % 1500), None if i % 3 else start + timedelta(days=i % 1500 + 14),
+            Decimal(i % 300), f"Книга {i % 100000}", f"Читатель {i % 20000}", f"Библиотека {i % 20}",
+        ),
+        count,
+    )
+
+
+def serialize_before(rows: Sequence[Row], schema: type[BaseModel]) -> bytes:
+    # Как было: модель на строку в crud, затем проверка и сериализация response_model
+    models = [schema(**row._asdict()) for row in rows]
+    adapter = TypeAdapter(List[schema])
+    content = adapter.dump_python(adapter.validate_python(models, from_attributes=True), mode="json")
+    return JSONResponse(content).body
+
+
+def serialize_after(rows: Sequence[Row], schema: type[BaseModel]) -> bytes:
+    return rows_to_json(rows)
+
+
+ENDPOINTS = {
+    "/api/books/detailed/": (books_detailed_rows, BookDetailed),
+    "/api/books/list/": (books_list_rows, BooksList),
+    "/api/subscriptions/detailed/": (subscriptions_detailed_rows, SubscriptionDetailed),
+}
+
+
+def _rows_per_second(serialize: Callable, rows: Sequence[Row], schema: type[BaseModel], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize(rows, schema)
+        best = min(best, time.perf_counter() - started)
+    return len(rows) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':32} {'before, rows/s':>16} {'after, rows/s':>16} {'speedup':>8}")
+    for endpoint, (make_rows, schema) in ENDPOINTS.items():
+        rows = make_rows(args.rows)
+        before = _rows_per_second(serialize_before, rows, schema, args.repeat)
+        after = _rows_per_second(serialize_after, rows, schema, args.repeat)
+        print(f"{endpoint:32} {before:16,.0f} {after:16,.0f} {after / before:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Интеграционные тесты на PostgreSQL.
+
+TEST_DATABASE_URL — отдельная база: схема обновляется миграциями, таблицы очищаются
+и заполняются benchmarks.seed. Без TEST_DATABASE_URL тесты пропускаются.
+
+TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/library_test python -m pytest -q
+"""
+import argparse
+import asyncio
+import os
+from typing import Any, Awaitable, List, Tuple
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+if TEST_DATABASE_URL:
+    # До импорта app: настройки читаются при импорте app.core.config
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ["MIGRATE_ON_STARTUP"] = "false"
+    os.environ["QUERY_BUDGET_MODE"] = "off"
+
+# Объем тестовых данных: планы запросов должны строиться по статистике заполненных таблиц
+SEED_SIZES = {
+    "libraries": 20,
+    "topics": 50,
+    "authors": 2000,
+    "readers": 5000,
+    "books": 20000,
+    "subscriptions": 100000,
+}
+
+
+def pytest_report_header(config) -> str:
+    if not TEST_DATABASE_URL:
+        return "TEST_DATABASE_URL is not set: integration tests are skipped"
+    return f"test database: {TEST_DATABASE_URL.rsplit('@', 1)[-1]}"
+
+
+def pytest_collection_modifyitems(config, items) -> None:
+    if TEST_DATABASE_URL:
+        return
+    skip = pytest.mark.skip(reason="TEST_DATABASE_URL is not set")
+    for item in items:
+        item.add_marker(skip)
+
+
+def run(coro: Awaitable) -> Any:
+    """Выполнить корутину в новом цикле событий; соединения пула закрываются в том же цикле"""
+    from app.db.session import engine
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def _prepare_database() -> None:
+    from app.db.migrations import migrate_database, wait_for_database
+    from app.db.session import engine
+    from benchmarks.seed import seed
+
+    await wait_for_database(engine)
+    await migrate_database(engine)
+    await seed(argparse.Namespace(**SEED_SIZES, active_share=0.03, seed=42, truncate=True))
+
+
+@pytest.fixture(scope="session")
+def database() -> None:
+    """Мигрированная база с тестовыми данными (одна на весь прогон)"""
+    run(_prepare_database())
+
+
+@pytest.fixture
+def captured_sql():
+    """Запросы приложения к базе за время теста: [(SQL, параметры)]"""
+    from sqlalchemy import event
+
+    from app.db.session import engine
+
+    statements: List[Tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def api_client():
+    """Клиент к приложению в этом процессе через ASGI (startup не выполняется)"""
+    from benchmarks.common import make_client
+    return make_client()
@@ -0,0 +1,284 @@
+"""Параллельные выдачи одной книги через API: экземпляр не выдается дважды, книга не уходит
+в минус, а шторм выдач проходит во много раз быстрее тех же выдач по одному.
+
+Запросы идут в приложение через ASGI; у каждого своя сессия и свое соединение из пула,
+открытого заранее, — к базе через прокси с задержкой DB_LATENCY.
+Параллельность ограничена max_connections сервера.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+import httpx
+import pytest
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from conftest import api_client, run
+
+PARALLEL_CHECKOUTS = 300
+COPIES = 50
+# Соединения, которые оставляем серверу и остальным клиентам
+RESERVED_CONNECTIONS = 10
+
+# Задержка пакета в одну сторону между приложением и базой (как у сервера на другой машине)
+DB_LATENCY = 0.04
+SERIAL_CHECKOUTS = 10
+# Во сколько раз шторм выдач должен обгонять те же выдачи по одному. Выдачи в очереди
+# на блокировке строки держат ее минимум круг обмена каждая: шторм обгонит последовательные
+# выдачи не больше, чем во столько раз, сколько кругов обмена на выдачу (около 7).
+# Параллельные выдачи разных экземпляров задержки перекрывают
+MIN_SPEEDUP = 12
+
+HOT_BOOK_TITLE = "Нарасхват"
+
+
+async def _parallelism() -> int:
+    from benchmarks.common import database_dsn
+
+    conn = await asyncpg.connect(database_dsn())
+    try:
+        max_connections = int(await conn.fetchval("SHOW max_connections"))
+        in_use = await conn.fetchval("SELECT count(*) FROM pg_stat_activity")
+    finally:
+        await conn.close()
+    return min(PARALLEL_CHECKOUTS, max_connections - in_use - RESERVED_CONNECTIONS)
+
+
+async def _create_hot_books(count: int, copies: int = COPIES) -> List[Dict[str, int]]:
+    """Книги с copies свободными экземплярами"""
+    from benchmarks.common import database_dsn
+
+    conn = await asyncpg.connect(database_dsn())
+    try:
+        books = []
+        async with conn.transaction():
+            for _ in range(count):
+                book = await conn.fetchrow(
+                    "INSERT INTO books (library_id, topic_id, author_id, title, price)"
+                    " VALUES (1, 1, 1, $1, 100) RETURNING book_id, library_id",
+                    HOT_BOOK_TITLE,
+                )
+                await conn.execute(
+                    "INSERT INTO book_copies (book_id) SELECT $1 FROM generate_series(1, $2)", book["book_id"], copies
+                )
+                books.append(dict(book))
+        return books
+    finally:
+        await conn.close()
+
+
+async def _book_state(book_id: int) -> Dict[str, int]:
+    from benchmarks.common import database_dsn
+
+    conn = await asyncpg.connect(database_dsn())
+    try:
+        return dict(await conn.fetchrow(
+            """
+            SELECT
+                count(*) FILTER (WHERE c.status = 'available') AS available,
+                count(*) FILTER (WHERE c.status = 'on_loan') AS on_loan,
+                (SELECT count(*) FROM subscriptions s WHERE s.book_id = $1 AND s.return_date IS NULL) AS open_loans,
+                (SELECT count(DISTINCT s.copy_id) FROM subscriptions s WHERE s.book_id = $1 AND s.return_date IS NULL)
+                    AS loaned_copies
+            FROM book_copies c
+            WHERE c.book_id = $1
+            """,
+            book_id,
+        ))
+    finally:
+        await conn.close()
+
+
+class _LatencyProxy:
+    """TCP-прокси к серверу базы: пакеты в обе стороны задерживаются на latency, порядок сохраняется"""
+
+    def __init__(self, host: str, port: int, latency: float):
+        self.host, self.port, self.latency = host, port, latency
+        self.server: Optional[asyncio.Server] = None
+
+    async def start(self) -> int:
+        """Запустить прокси; его порт"""
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    def close(self) -> None:
+        self.server.close()
+
+    async def _handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        server_reader, server_writer = await asyncio.open_connection(self.host, self.port)
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer), self._pipe(server_reader, client_writer),
+            return_exceptions=True,
+        )
+
+    async def _pipe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                await asyncio.sleep(due - loop.time())
+                if not data:
+                    writer.close()
+                    return
+                writer.write(data)
+                await writer.drain()
+
+        delivery = asyncio.create_task(deliver())
+        try:
+            while data := await reader.read(65536):
+                queue.put_nowait((loop.time() + self.latency, data))
+        except ConnectionError:
+            pass
+        queue.put_nowait((loop.time() + self.latency, b""))
+        await delivery
+
+
+@asynccontextmanager
+async def _api(connections: int) -> AsyncIterator[httpx.AsyncClient]:
+    """Клиент к приложению; сессии запросов — из отдельного пула на connections соединений,
+    открытых заранее, к базе через _LatencyProxy"""
+    from app.api.deps import get_db
+    from app.core.config import DATABASE_URL
+    from app.main import app
+
+    url = make_url(DATABASE_URL)
+    proxy = _LatencyProxy(url.host or "localhost", url.port or 5432, DB_LATENCY)
+    engine = create_async_engine(url.set(host="127.0.0.1", port=await proxy.start()), pool_size=connections, max_overflow=0)
+    Sessions = sessionmaker(bind=engine, class_=AsyncSession)
+
+    async def get_test_db():
+        async with Sessions() as session:
+            yield session
+
+    opened = await asyncio.gather(*(engine.connect() for _ in range(connections)))
+    for connection in opened:
+        await connection.close()
+    app.dependency_overrides[get_db] = get_test_db
+    try:
+        async with api_client() as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        # Пул закрывает соединения по одному: без задержки
+        proxy.latency = 0
+        await engine.dispose()
+        proxy.close()
+
+
+async def _requests(
+    client: httpx.AsyncClient, count: int, request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    parallel: bool = True,
+) -> Tuple[List[httpx.Response], float]:
+    """request(клиент, номер) count раз — все сразу или по одному; (ответы, секунды)"""
+    started = time.perf_counter()
+    if parallel:
+        responses = list(await asyncio.gather(*(request(client, number) for number in range(count))))
+    else:
+        responses = [await request(client, number) for number in range(count)]
+    return responses, time.perf_counter() - started
+
+
+def _issued(responses: List[httpx.Response]) -> List[int]:
+    """id выданных подписок; остальные запросы должны получить отказ «нет свободных экземпляров»"""
+    rejected = {(r.status_code, r.json()["detail"]) for r in responses if r.status_code != 200}
+    assert rejected <= {(400, "Book not available")}, rejected
+    return [r.json()["subscription_id"] for r in responses if r.status_code == 200]
+
+
+@pytest.fixture(scope="module")
+def parallelism(database) -> int:
+    count = run(_parallelism())
+    if count <= COPIES:
+        pytest.skip(f"max_connections allows only {count} parallel checkouts")
+    return count
+
+
+def _checkout(book: Dict[str, int]) -> Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]:
+    def request(client: httpx.AsyncClient, number: int) -> Awaitable[httpx.Response]:
+        return client.post("/api/subscriptions/", json={
+            "library_id": book["library_id"], "book_id": book["book_id"], "reader_id": number + 1,
+        })
+    return request
+
+
+def test_parallel_checkouts_do_not_oversell(parallelism):
+    [book] = run(_create_hot_books(1))
+
+    async def storm():
+        async with _api(parallelism) as client:
+            return await _requests(client, parallelism, _checkout(book))
+
+    responses, _ = run(storm())
+    issued = _issued(responses)
+    assert len(issued) == COPIES
+    assert run(_book_state(book["book_id"])) == {
+        "available": 0, "on_loan": COPIES, "open_loans": COPIES, "loaned_copies": COPIES,
+    }
+
+    async def give_back():
+        async with _api(COPIES) as client:
+            return await _requests(
+                client, COPIES, lambda client, number: client.post(f"/api/subscriptions/{issued[number]}/return")
+            )
+
+    returned, _ = run(give_back())
+    assert [r.status_code for r in returned] == [200] * COPIES, [r.text for r in returned if r.status_code != 200]
+    assert run(_book_state(book["book_id"])) == {
+        "available": COPIES, "on_loan": 0, "open_loans": 0, "loaned_copies": 0,
+    }
+
+
+def test_parallel_checkouts_throughput(parallelism):
+    # Экземпляров хватает всем: каждый запрос шторма — успешная выдача той же книги
+    warmup_book, serial_book, book = run(_create_hot_books(3, copies=parallelism))
+
+    async def measure():
+        async with _api(parallelism) as client:
+            # Первый шторм готовит запросы на всех соединениях пула и в замер не входит
+            await _requests(client, parallelism, _checkout(warmup_book))
+            serial = await _requests(client, SERIAL_CHECKOUTS, _checkout(serial_book), parallel=False)
+            return serial, await _requests(client, parallelism, _checkout(book))
+
+    (serial, serial_elapsed), (responses, elapsed) = run(measure())
+    assert len(_issued(serial)) == SERIAL_CHECKOUTS
+    assert len(_issued(responses)) == parallelism
+    serial_rate, rate = SERIAL_CHECKOUTS / serial_elapsed, parallelism / elapsed
+    assert rate >= MIN_SPEEDUP * serial_rate, (
+        f"{parallelism} parallel checkouts: {rate:.0f}/s, serial: {serial_rate:.1f}/s"
+    )
+
+
+def test_parallel_batches_in_opposite_order_do_not_deadlock(parallelism):
+    books = run(_create_hot_books(2))
+    # Каждый пакет берет по экземпляру обеих книг; половина пакетов — в обратном порядке
+    batches = min(parallelism, COPIES)
+
+    def checkout_batch(client: httpx.AsyncClient, number: int) -> Awaitable[httpx.Response]:
+        ordered = books if number % 2 else books[::-1]
+        return client.post("/api/subscriptions/batch", json=[
+            {
+                "library_id": book["library_id"], "book_id": book["book_id"], "reader_id": number + 1,
+                "issue_date": date.today().isoformat(),
+            }
+            for book in ordered
+        ])
+
+    async def storm():
+        async with _api(batches) as client:
+            return await _requests(client, batches, checkout_batch)
+
+    responses, _ = run(storm())
+    failed = [r.text for r in responses if r.status_code != 200]
+    assert not failed, failed
+    assert all(item["success"] for r in responses for item in r.json())
+    for book in books:
+        assert run(_book_state(book["book_id"])) == {
+            "available": COPIES - batches, "on_loan": batches, "open_loans": batches, "loaned_copies": batches,
+        }
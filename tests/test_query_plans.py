@@ -0,0 +1,123 @@
+"""Планы запросов списков: фильтры и соединения идут по индексам миграции 89f48cc347aa.
+
+Запрос берется тот, что приложение отправило в базу при вызове эндпоинта,
+и выполняется с EXPLAIN на тех же параметрах.
+"""
+import json
+from typing import Any, Dict, Iterator, List, Set
+
+import asyncpg
+import pytest
+
+from conftest import api_client, run
+
+# Небольшой филиал со своей темой: фильтр по нему выбирает единицы строк из тысяч.
+# По крупной библиотеке планировщик вправе идти по первичному ключу и отбросить лишнее
+SMALL = "small"
+
+# (путь, параметры, таблица отфильтрованного запроса, ожидаемый индекс)
+CASES = [
+    ("/api/books/", {"library_id": SMALL}, "books", "ix_books_library_id_book_id"),
+    ("/api/books/", {"topic_id": SMALL}, "books", "ix_books_topic_id"),
+    ("/api/books/", {"author_id": 3, "expand": "author,topic"}, "books", "ix_books_author_id"),
+    ("/api/subscriptions/", {"book_id": 3}, "subscriptions", "ix_subscriptions_book_id_return_date"),
+    ("/api/subscriptions/", {"reader_id": 3, "expand": "book"}, "subscriptions", "ix_subscriptions_reader_id_return_date"),
+    ("/api/subscriptions/reader/3/active", {}, "subscriptions", "ix_subscriptions_reader_id_return_date"),
+    ("/api/subscriptions/active/", {"library_id": 3}, "subscriptions", "ix_subscriptions_active"),
+    ("/reports/book-prices/", {"topic_id": 3}, "books", "ix_books_topic_id"),
+]
+
+SMALL_BRANCH_BOOKS = 3
+
+# Секция (таблица или индекс) -> секционированный родитель
+PARENTS_SQL = """
+SELECT child.relname, parent.relname
+FROM pg_inherits
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+"""
+# Пустые таблицы (будущие секции): полный просмотр в них ничего не стоит
+EMPTY_TABLES_SQL = "SELECT relname FROM pg_class WHERE relkind = 'r' AND relpages = 0"
+
+
+def _plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _mentions(statement: str, table: str) -> bool:
+    return f"FROM {table} " in statement or f"FROM {table}\n" in statement or f"JOIN {table} " in statement
+
+
+async def _explain(statements: List[tuple], table: str) -> List[Dict[str, Any]]:
+    """Узлы планов всех SELECT приложения, читающих table"""
+    from benchmarks.common import database_dsn
+
+    conn = await asyncpg.connect(database_dsn())
+    try:
+        parents = dict(await conn.fetch(PARENTS_SQL))
+        empty = {row[0] for row in await conn.fetch(EMPTY_TABLES_SQL)}
+        nodes = []
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith("SELECT") or not _mentions(statement, table):
+                continue
+            plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {statement}", *(parameters or ())))
+            for node in _plan_nodes(plan[0]["Plan"]):
+                if node.get("Relation Name") in empty:
+                    continue
+                if "Index Name" in node:
+                    node["Index Name"] = parents.get(node["Index Name"], node["Index Name"])
+                if "Relation Name" in node:
+                    node["Relation Name"] = parents.get(node["Relation Name"], node["Relation Name"])
+                nodes.append(node)
+        return nodes
+    finally:
+        await conn.close()
+
+
+async def _create_small_branch() -> Dict[str, int]:
+    """Филиал и тема с несколькими книгами; добавлены после ANALYZE, как новые строки в живой базе"""
+    from benchmarks.common import database_dsn
+
+    conn = await asyncpg.connect(database_dsn())
+    try:
+        async with conn.transaction():
+            library_id = await conn.fetchval(
+                "INSERT INTO libraries (name, address) VALUES ('Филиал', 'ул. Малая, 1') RETURNING library_id"
+            )
+            topic_id = await conn.fetchval("INSERT INTO topics (name) VALUES ('Краеведение') RETURNING topic_id")
+            await conn.executemany(
+                "INSERT INTO books (library_id, topic_id, author_id, title, price) VALUES ($1, $2, 1, $3, 100)",
+                [(library_id, topic_id, f"Краеведение {i}") for i in range(SMALL_BRANCH_BOOKS)],
+            )
+        return {"library_id": library_id, "topic_id": topic_id}
+    finally:
+        await conn.close()
+
+
+@pytest.fixture(scope="module")
+def small_branch(database) -> Dict[str, int]:
+    return run(_create_small_branch())
+
+
+async def _request(path: str, params: Dict[str, Any]) -> int:
+    async with api_client() as client:
+        response = await client.get(path, params=params)
+    return response.status_code
+
+
+@pytest.mark.parametrize("path, params, table, index", CASES)
+def test_list_query_uses_index(small_branch, captured_sql, path, params, table, index):
+    params = {name: small_branch[name] if value == SMALL else value for name, value in params.items()}
+    assert run(_request(path, params)) == 200
+    nodes = run(_explain(captured_sql, table))
+    assert nodes, f"{path} sent no SELECT over {table}"
+
+    used: Set[str] = {node["Index Name"] for node in nodes if "Index Name" in node}
+    assert index in used, f"{path} {params}: {index} not used, plan indexes: {sorted(used)}"
+    seq_scans = {
+        node["Relation Name"] for node in nodes
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] == table
+    }
+    assert not seq_scans, f"{path} {params}: sequential scan on {sorted(seq_scans)}"